@@ -1,52 +1,106 @@
 import asyncio
+import json
+import math
+import os
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
-from app.models import ExplainRequest, ExplainResponse, ContextObject
-from typing import List
-from app.services.rag import RAGService
-from app.services.integrations import IntegrationService
-from app.services.data_processing import process_slack_data, process_jira_data
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 
+# Service modules read their configuration at import time
 load_dotenv()
 
+from app.models import BatchExplainRequest, ContextRequest, ExplainRequest, ExplainResponse, ContextObject
+from typing import List
+from app.services.rag import RAGService
+from app.services.integrations import IntegrationService
+from app.services.sources import load_sources
+from app.services.sync import SyncEngine, store_state
+from app.services.code_index import CODE_INDEX_ROOT
+from app.services import metrics
+from app.services.llm_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, Overloaded, scheduler as llm_scheduler
+from app.services.leader import CONTEXTSYNC_ROLE, GENERATION_POLL_SECONDS, LeaderLock, bump_generation, watch_generation
+from app.services import snapshots
+
 rag_service = None
 integration_service = None
-
-# Config from .env or hardcoded for now (should move to env)
-SLACK_CHANNEL_ID = "C0AECA17DM0"
-JIRA_JQL = "resolution = Unresolved ORDER BY created DESC"
+sync_engine = None
+# Only the process holding this lock syncs and writes; the others serve queries read-only
+leader_lock = LeaderLock()
+# Manual and background syncs share cursors, so they must not overlap (publishes and index swaps take it too)
+sync_lock = asyncio.Lock()
+# Leader: whether the working store holds writes not yet published, and when it last published
+index_dirty = False
+last_published = 0.0
+# A replaced RAGService stays open at least this long, for requests that picked it up just before the swap
+RETIRE_GRACE_SECONDS = 5
 
 async def sync_data():
     """Fetches and ingests real-time data."""
+    global index_dirty
     try:
         print("Syncing real-time data...")
-        if not integration_service or not rag_service:
+        if not leader_lock.held:
+            return {"status": "skipped", "message": "This worker is a read-only replica; the sync leader runs syncs"}
+        if not sync_engine:
             print("Services not ready, skipping sync.")
             return {"status": "skipped", "message": "Services not ready"}
 
-        # Fetch Data
-        slack_msgs = integration_service.fetch_channel_history(SLACK_CHANNEL_ID, limit=10)
-        jira_tickets = integration_service.search_jira_tickets(JIRA_JQL, limit=10)
-        
-        # Process & Ingest
-        new_docs = []
-        if slack_msgs:
-            new_docs.extend(process_slack_data(slack_msgs, SLACK_CHANNEL_ID))
-        if jira_tickets:
-            new_docs.extend(process_jira_data(jira_tickets))
-        
-        if new_docs:
-            rag_service.add_documents(new_docs)
-            print(f"Synced {len(new_docs)} items.")
-            return {"status": "success", "items_synced": len(new_docs)}
-        
-        return {"status": "success", "items_synced": 0}
+        # Fetch only what changed since the last cursor, then ingest the delta
+        async with sync_lock:
+            with metrics.span("sync"):
+                result = await sync_engine.run()
+            # New or changed discussions can change which code they relate to
+            written, deleted = result.pop("written_ids"), result.pop("deleted_ids")
+            code_stats = await refresh_code_index(written, deleted)
+            if written or deleted or code_stats.get("units_indexed") or code_stats.get("files_removed"):
+                index_dirty = True
+            await publish_index()
+        metrics.SYNC_RUNS.inc(status="success")
+        metrics.SYNC_ITEMS.inc(result["items_fetched"], kind="items_fetched")
+        metrics.SYNC_ITEMS.inc(result["chunks_written"], kind="chunks_written")
+        metrics.SYNC_ITEMS.inc(result["chunks_deleted"], kind="chunks_deleted")
+        print(f"Synced {result['items_fetched']} items ({result['chunks_written']} new or changed chunks, "
+              f"{result['chunks_deleted']} stale removed, {result['chunks_per_second']:.1f} chunks/s).")
+        return {"status": "success", "items_synced": result["items_fetched"], **result}
         
     except Exception as e:
+        metrics.SYNC_RUNS.inc(status="error")
         print(f"Error in sync: {e}")
         return {"status": "error", "message": str(e)}
 
+async def refresh_code_index(written_chunks=(), deleted_chunks=()) -> dict:
+    """Re-indexes changed workspace files; relinks the code units the changed discussion chunks affect."""
+    if not CODE_INDEX_ROOT or not rag_service or not rag_service.code_index:
+        return {}
+    try:
+        with metrics.span("code_index"):
+            return await asyncio.to_thread(rag_service.code_index.refresh, CODE_INDEX_ROOT, written_chunks, deleted_chunks)
+    except Exception as e:
+        print(f"Error refreshing code index: {e}")
+        return {}
+
+async def publish_index(force: bool = False):
+    """Leader: snapshots the working store into a new generation for the readers (under sync_lock).
+
+    Each publish copies the whole store, so it runs at most every INDEX_PUBLISH_SECONDS.
+    """
+    global index_dirty, last_published
+    if not index_dirty or (not force and time.monotonic() - last_published < snapshots.INDEX_PUBLISH_SECONDS):
+        return
+    with metrics.span("publish"):
+        name = await asyncio.to_thread(snapshots.publish, rag_service.db_path, kind="sync")
+    if name is None:
+        # A rebuild or rollback went live meanwhile; the generation watcher moves us onto it
+        print("Another index generation went live; not publishing the working store over it.")
+        return
+    index_dirty, last_published = False, time.monotonic()
+    # Tell query workers to open the new generation
+    bump_generation()
+    print(f"Published index generation {name}.")
+
 async def background_sync():
     """Polls Slack and Jira for new data every 60 seconds."""
     print("Starting background sync loop...")
@@ -54,22 +108,148 @@ async def background_sync():
         await sync_data()
         await asyncio.sleep(60)
 
+def build_service(read_only: bool) -> RAGService:
+    """A warmed-up RAGService on the live generation (readers) or the leader's working store."""
+    service = RAGService(db_path=None if read_only else snapshots.working_copy(), read_only=read_only)
+    # Load the index before the first request rather than during it
+    service.warm_up()
+    return service
+
+async def retire_service(service: RAGService):
+    """Closes a replaced RAGService once the requests still running on it have finished."""
+    await asyncio.sleep(RETIRE_GRACE_SECONDS)
+    while service.users:
+        await asyncio.sleep(1)
+    await asyncio.to_thread(service.close)
+    if not service.read_only and rag_service and not rag_service.read_only:
+        # The superseded working store is no longer open anywhere
+        await asyncio.to_thread(snapshots.prune_working, rag_service.db_path)
+
+async def swap_service(read_only: bool) -> bool:
+    """Opens the index in a complete new RAGService and swaps it in with one assignment.
+
+    Requests already running finish on the old instance, which is closed once
+    they have; no request ever sees a half-reloaded service. The leader calls
+    this under sync_lock, so no sync is writing through the old one.
+    """
+    global rag_service
+    service = await asyncio.to_thread(build_service, read_only)
+    if service.db is None:
+        await asyncio.to_thread(service.close)
+        print(f"Worker {os.getpid()} could not open the index, still serving {rag_service.db_path if rag_service else 'nothing'}.")
+        return False
+    old, rag_service = rag_service, service
+    if sync_engine:
+        # Cursors belong to the store: after adopting a rebuild, sync on from where it left off
+        sync_engine.rag_service, sync_engine.state = service, store_state(service.db_path)
+    if old:
+        asyncio.create_task(retire_service(old))
+    return True
+
+async def become_leader():
+    """Turns this process into the sync leader (writable working store plus the sync engine), then syncs forever."""
+    global integration_service, sync_engine, index_dirty
+    async with sync_lock:
+        if rag_service.read_only:
+            # Readers serve a promoted generation; the leader writes to its own working store
+            await swap_service(read_only=False)
+        integration_service = IntegrationService()
+        sync_engine = SyncEngine(
+            integration_service,
+            rag_service,
+            # Sources come from sources.json (or SOURCES_FILE)
+            load_sources(),
+            state=store_state(rag_service.db_path)
+        )
+        snapshots.prune_working(rag_service.db_path)
+        if snapshots.current_generation() is None:
+            # Readers only open promoted generations: give them one to start from
+            index_dirty = True
+            await publish_index(force=True)
+    print(f"Worker {os.getpid()} is the sync leader.")
+    await background_sync()
+
+async def reload_index(generation: int):
+    global index_dirty
+    if leader_lock.held:
+        async with sync_lock:
+            if snapshots.working_base(rag_service.db_path) == snapshots.current_generation():
+                # Our own publish
+                return
+            # A rebuild or rollback promoted another generation: sync on top of it from now on.
+            # Unpublished writes are dropped, but its cursors make the next sync fetch them again.
+            if not await swap_service(read_only=False):
+                return
+            index_dirty = False
+    else:
+        if rag_service.db_path == snapshots.resolve_db_path():
+            return
+        if not await swap_service(read_only=True):
+            return
+    print(f"Worker {os.getpid()} loaded index generation {generation} ({rag_service.db_path}).")
+
+async def await_leadership():
+    """Readers in auto mode take over syncing if the leader process goes away."""
+    while not leader_lock.try_acquire():
+        await asyncio.sleep(GENERATION_POLL_SECONDS)
+    await become_leader()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global rag_service, integration_service
-    rag_service = RAGService()
-    integration_service = IntegrationService()
-    
-    # Start background task
-    task = asyncio.create_task(background_sync())
+    global rag_service
+    # With `uvicorn --workers N` every worker runs this; only one may sync
+    if CONTEXTSYNC_ROLE == "leader" and not leader_lock.try_acquire():
+        raise RuntimeError(f"CONTEXTSYNC_ROLE=leader but another process holds {leader_lock.path}")
+    is_leader = CONTEXTSYNC_ROLE == "leader" or (CONTEXTSYNC_ROLE == "auto" and leader_lock.try_acquire())
+    # Readers open the live generation, the leader its working store; either is loaded before the first request
+    rag_service = await asyncio.to_thread(build_service, not is_leader)
+
+    # Every process follows generation bumps: readers reload, the leader switches after rebuilds
+    tasks = [asyncio.create_task(watch_generation(reload_index))]
+    if is_leader:
+        tasks.append(asyncio.create_task(become_leader()))
+    else:
+        print(f"Worker {os.getpid()} serving read-only queries.")
+        if CONTEXTSYNC_ROLE == "auto":
+            tasks.append(asyncio.create_task(await_leadership()))
     
     yield
     
     # Clean up
-    task.cancel()
+    for task in tasks:
+        task.cancel()
+    leader_lock.release()
 
 app = FastAPI(title="ContextSync Backend", lifespan=lifespan)
 
+metrics.REGISTRY.add_collector(metrics.cache_collector(lambda: rag_service.cache_stats() if rag_service else {}))
+metrics.REGISTRY.add_collector(llm_scheduler.collect)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """LLM queue past its wait budget: fail fast and tell the client when to come back."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Records request latency; with SERVER_TIMING_ENABLED also returns per-stage spans as Server-Timing."""
+    timings = metrics.start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    # For streaming responses this is time to first byte: headers go out before generation
+    elapsed = time.perf_counter() - start
+    # Route template, so /metrics isn't split by path parameters
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    metrics.REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=str(response.status_code))
+    if metrics.SERVER_TIMING_ENABLED:
+        timings.append(("total", elapsed))
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings)
+    return response
+
 @app.get("/")
 async def root():
     return {"message": "ContextSync Context Engine is Running"}
@@ -79,21 +259,118 @@ async def explain_code(request: ExplainRequest):
     if not rag_service:
         raise HTTPException(status_code=503, detail="RAG Service not initialized")
         
-    markdown_response = await rag_service.explain_code(
-        request.code_snippet, 
-        request.file_path, 
-        request.line_numbers
-    )
+    with rag_service.in_use() as service:
+        markdown_response = await service.explain_code(
+            request.code_snippet, 
+            request.file_path, 
+            request.line_numbers,
+            request.filters
+        )
     
     return ExplainResponse(markdown=markdown_response)
 
+# Stop proxies from buffering streams and defeating time-to-first-byte
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@app.post("/explain/stream")
+async def explain_code_stream(request: ExplainRequest):
+    """Streams the explanation as server-sent events: `sources`, then `token`s, then `done`."""
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG Service not initialized")
+    # Once the stream starts the status is sent, so shed before it does
+    llm_scheduler.admit(PRIORITY_INTERACTIVE)
+    # The instance this request started on, even if a reload swaps in another mid-stream
+    service = rag_service
+
+    async def event_stream():
+        try:
+            with service.in_use():
+                async for event, data in service.astream_explain(
+                    request.code_snippet,
+                    request.file_path,
+                    request.line_numbers,
+                    request.filters
+                ):
+                    yield _sse(event, data)
+        except Overloaded as e:
+            yield _sse("error", {"message": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            print(f"Error while streaming explanation: {e}")
+            yield _sse("error", {"message": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+def _batch_stream(results):
+    """SSE stream of `result` events ({index, ...}) as each snippet completes, then `done`."""
+    async def event_stream():
+        count = 0
+        try:
+            async for payload in results:
+                count += 1
+                yield _sse("result", payload)
+        except Overloaded as e:
+            yield _sse("error", {"message": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            print(f"Error in batch request: {e}")
+            yield _sse("error", {"message": str(e)})
+        yield _sse("done", {"completed": count})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/explain/batch")
+async def explain_code_batch(request: BatchExplainRequest):
+    """Explains many snippets at once (e.g. every hunk of a PR), streaming results as they finish."""
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG Service not initialized")
+    llm_scheduler.admit(PRIORITY_INTERACTIVE)
+    service = rag_service
+
+    async def results():
+        with service.in_use():
+            async for index, markdown in service.explain_many(request.items):
+                yield {"index": index, "markdown": markdown}
+
+    return _batch_stream(results())
+
+@app.post("/context/retrieve/batch")
+async def retrieve_context_batch(request: BatchExplainRequest):
+    """Context cards for many snippets; context shared between snippets is summarized once."""
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG Service not initialized")
+    llm_scheduler.admit(PRIORITY_BACKGROUND)
+    service = rag_service
+
+    async def results():
+        with service.in_use():
+            async for index, objects in service.get_context_objects_many(request.items):
+                yield {"index": index, "context": objects}
+
+    return _batch_stream(results())
+
 @app.post("/context/retrieve", response_model=List[ContextObject])
-async def retrieve_context(request: ExplainRequest):
+async def retrieve_context(request: ContextRequest):
     """Returns structured context objects for the IDE."""
     if not rag_service:
         raise HTTPException(status_code=503, detail="RAG Service not initialized")
     
-    return await rag_service.get_context_objects(request.code_snippet)
+    with rag_service.in_use() as service:
+        return await service.get_context_objects(request.code_snippet, request.file_path, request.line_numbers,
+                                                 request.filters, summarize=request.summarize)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the embedding, answer and summary caches."""
+    if not rag_service:
+        raise HTTPException(status_code=503, detail="RAG Service not initialized")
+    return rag_service.cache_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage latencies, request latencies, LLM/token counters and cache stats in Prometheus text format."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/context/ingest")
 async def ingest_webhook(request: Request):
@@ -1,10 +1,29 @@
 from pydantic import BaseModel
 from typing import List, Optional
 
+class RetrievalFilters(BaseModel):
+    sources: Optional[List[str]] = None # "slack" and/or "jira"
+    channels: Optional[List[str]] = None # Slack channel IDs
+    since: Optional[float] = None # epoch seconds (message time / ticket update)
+    until: Optional[float] = None
+    statuses: Optional[List[str]] = None # Jira statuses, e.g. ["Open", "In Progress"]
+
+    def is_empty(self) -> bool:
+        return not (self.sources or self.channels or self.statuses) and self.since is None and self.until is None
+
 class ExplainRequest(BaseModel):
     code_snippet: str
     file_path: str
     line_numbers: str
+    filters: Optional[RetrievalFilters] = None
+
+class ContextRequest(ExplainRequest):
+    # False: retrieval only (no LLM calls); cards carry stored summaries where there are any
+    summarize: bool = True
+
+class BatchExplainRequest(BaseModel):
+    # e.g. every changed hunk in a PR
+    items: List[ExplainRequest]
 
 class ExplainResponse(BaseModel):
     markdown: str
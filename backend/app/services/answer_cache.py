@@ -0,0 +1,202 @@
+import hashlib
+import io
+import math
+import os
+import re
+import textwrap
+import time
+import tokenize
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Cosine similarity for near-duplicate snippet matching; unset disables the mode
+ANSWER_CACHE_SIMILARITY = os.environ.get("ANSWER_CACHE_SIMILARITY")
+
+# Languages whose comments are `//` and `/* */`; everything else but Python keeps its comments
+_C_STYLE_EXTENSIONS = {".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".go", ".java", ".js", ".jsx", ".kt",
+                       ".mjs", ".rs", ".scala", ".swift", ".ts", ".tsx"}
+_INLINE_SPACE_RE = re.compile(r"[ \t]+")
+
+
+def _lines(code: str) -> str:
+    # Trailing whitespace, blank lines and the snippet's own indentation only
+    return "\n".join(line.rstrip() for line in textwrap.dedent(code).splitlines() if line.strip())
+
+
+def _normalize_python(code: str) -> Optional[str]:
+    # Tokens, so `#` inside strings and the `//` operator survive; None if the snippet doesn't tokenize
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(textwrap.dedent(code)).readline))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+    out = []
+    for token in tokens:
+        if token.type == tokenize.NEWLINE:
+            out.append("\n")
+        elif token.type == tokenize.INDENT:
+            out.append("<indent>")
+        elif token.type == tokenize.DEDENT:
+            out.append("<dedent>")
+        elif token.type not in (tokenize.COMMENT, tokenize.NL, tokenize.ENDMARKER):
+            out.append(token.string)
+    return " ".join(out).replace(" \n ", "\n").strip()
+
+
+def _normalize_c_style(code: str) -> str:
+    # Skips over string literals (one line each, except template strings) so `"https://..."` is not a comment
+    out, text, i, n = [], [], 0, len(code)
+    while i < n:
+        ch = code[i]
+        if ch in "\"'`":
+            end = i + 1
+            while end < n and code[end] != ch and (ch == "`" or code[end] != "\n"):
+                end += 2 if code[end] == "\\" else 1
+            out.append(_INLINE_SPACE_RE.sub(" ", "".join(text)))
+            out.append(code[i:end + 1])
+            text = []
+            i = end + 1
+        elif code.startswith("//", i):
+            newline = code.find("\n", i)
+            i = n if newline < 0 else newline
+        elif code.startswith("/*", i):
+            close = code.find("*/", i + 2)
+            i = n if close < 0 else close + 2
+            text.append(" ")
+        else:
+            text.append(ch)
+            i += 1
+    out.append(_INLINE_SPACE_RE.sub(" ", "".join(text)))
+    return _lines("".join(out))
+
+
+def normalize_snippet(code: str, file_path: str = None) -> str:
+    """Drops comments and cosmetic whitespace so cosmetic edits share a key; the language comes from `file_path`."""
+    extension = os.path.splitext(file_path or "")[1].lower()
+    if extension in (".py", ".pyi"):
+        normalized = _normalize_python(code)
+        if normalized is not None:
+            return normalized
+    elif extension in _C_STYLE_EXTENSIONS:
+        return _normalize_c_style(code)
+    return _lines(code)
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class _Entry:
+    __slots__ = ("answer", "chunk_ids", "context_key", "vector", "expires_at")
+
+    def __init__(self, answer, chunk_ids, context_key, vector, expires_at):
+        self.answer = answer
+        self.chunk_ids = chunk_ids
+        self.context_key = context_key
+        self.vector = vector
+        self.expires_at = expires_at
+
+
+class AnswerCache:
+    """TTL + LRU cache of /explain answers keyed by normalized snippet and retrieved chunk IDs.
+
+    Lookups happen after retrieval, so a write that changes which chunks a
+    snippet retrieves also changes its key and naturally misses. Rewrites of a
+    chunk that keep its ID are handled by `invalidate_chunks`.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 similarity_threshold: Optional[float] = None):
+        if similarity_threshold is None and ANSWER_CACHE_SIMILARITY:
+            similarity_threshold = float(ANSWER_CACHE_SIMILARITY)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # context key -> entry keys, so near-duplicate search only scans entries with the same context
+        self._by_context = {}
+
+    @property
+    def near_duplicates_enabled(self) -> bool:
+        return self.similarity_threshold is not None
+
+    @staticmethod
+    def _context_key(chunk_ids: Iterable[str]) -> str:
+        return hashlib.sha256(",".join(sorted(chunk_ids)).encode()).hexdigest()
+
+    def _key(self, snippet: str, context_key: str, file_path: str = None) -> str:
+        return hashlib.sha256(f"{normalize_snippet(snippet, file_path)}\x00{context_key}".encode()).hexdigest()
+
+    def get(self, snippet: str, chunk_ids: List[str], snippet_vector: List[float] = None,
+            file_path: str = None) -> Optional[str]:
+        context_key = self._context_key(chunk_ids)
+        key = self._key(snippet, context_key, file_path)
+        entry = self._live_entry(key)
+
+        if entry is None and self.near_duplicates_enabled and snippet_vector is not None:
+            best_key, best_score = None, self.similarity_threshold
+            for candidate_key in list(self._by_context.get(context_key, ())):
+                candidate = self._live_entry(candidate_key)
+                if candidate is not None and candidate.vector is not None:
+                    score = _cosine(snippet_vector, candidate.vector)
+                    if score >= best_score:
+                        best_key, best_score = candidate_key, score
+            if best_key is not None:
+                key, entry = best_key, self._entries[best_key]
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.answer
+
+    def put(self, snippet: str, chunk_ids: List[str], answer: str, snippet_vector: List[float] = None,
+            file_path: str = None):
+        context_key = self._context_key(chunk_ids)
+        key = self._key(snippet, context_key, file_path)
+        self._remove(key)
+        self._entries[key] = _Entry(answer, frozenset(chunk_ids), context_key, snippet_vector,
+                                    time.monotonic() + self.ttl_seconds)
+        self._by_context.setdefault(context_key, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """Drops answers built from any of the given chunks; returns how many were dropped."""
+        changed = set(chunk_ids)
+        stale = [key for key, entry in self._entries.items() if entry.chunk_ids & changed]
+        for key in stale:
+            self._remove(key)
+        return len(stale)
+
+    def _live_entry(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_context.get(entry.context_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_context[entry.context_key]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
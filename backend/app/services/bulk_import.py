@@ -0,0 +1,381 @@
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import ijson
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.data_processing import parse_jira_time, process_jira_data, process_slack_data, process_slack_thread
+from app.services.rag import CHUNK_OVERLAP, CHUNK_SIZE, split_documents
+from app.services.sync import SyncState
+
+# Checkpoints live inside the store they describe, so they travel with (and are dropped with) its data
+IMPORT_STATE_FILE = "bulk_import_state.json"
+# Processes splitting documents into chunks
+BULK_IMPORT_WORKERS = int(os.environ.get("BULK_IMPORT_WORKERS", str(os.cpu_count() or 4)))
+# Documents per split/embed/write batch (and per checkpoint)
+BULK_IMPORT_BATCH_SIZE = int(os.environ.get("BULK_IMPORT_BATCH_SIZE", "500"))
+
+# Jira CSV exports use the instance's display format, e.g. `10/Nov/23 9:15 AM`
+_JIRA_CSV_TIME_FORMATS = ("%d/%b/%y %I:%M %p", "%d/%b/%Y %I:%M %p", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S")
+
+# (source key, fingerprint, documents in a deterministic order)
+Source = Tuple[str, str, Iterable[Document]]
+
+
+def _fingerprint(path: str) -> str:
+    # A re-exported file at the same path must not resume from the old file's offset
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def _json_items(open_fn: Callable[[], io.BufferedIOBase], prefix: str = None) -> Iterator[dict]:
+    """Items of a JSON array (or of `{"issues": [...]}`), streamed so multi-GB exports never load whole."""
+    if prefix is None:
+        with open_fn() as f:
+            head = f.read(4096).lstrip()
+        prefix = "item" if head[:1] == b"[" else "issues.item"
+    with open_fn() as f:
+        # use_float keeps numbers JSON-serializable (ijson defaults to Decimal)
+        yield from ijson.items(f, prefix, use_float=True)
+
+
+def _ndjson_items(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _csv_items(path: str) -> Iterator[dict]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def _epoch_of(value: str) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parse_jira_time(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        parsed = None
+        for fmt in _JIRA_CSV_TIME_FORMATS:
+            try:
+                parsed = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _jira_time(value: str) -> Optional[str]:
+    """Any export's timestamp in the REST format process_jira_data expects."""
+    epoch = _epoch_of(value)
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000%z")
+
+
+def _adf_text(node) -> str:
+    """Plain text of an Atlassian Document Format description (Jira Cloud REST v3)."""
+    if isinstance(node, str):
+        return node
+    if not isinstance(node, dict):
+        return ""
+    if node.get("type") == "text":
+        return node.get("text", "")
+    parts = [_adf_text(child) for child in node.get("content", [])]
+    separator = "\n" if node.get("type") in ("doc", "bulletList", "orderedList") else ""
+    return separator.join(part for part in parts if part)
+
+
+def normalize_jira_issue(issue: dict) -> Optional[dict]:
+    """REST/JSON export, CSV row or flat (mock) issue -> the dict process_jira_data takes."""
+    if "fields" in issue:
+        fields = issue["fields"] or {}
+        person = fields.get("creator") or fields.get("reporter") or {}
+        ticket = {
+            "key": issue.get("key"),
+            "summary": fields.get("summary"),
+            "description": _adf_text(fields.get("description")) if fields.get("description") else None,
+            "status": (fields.get("status") or {}).get("name"),
+            "creator": person.get("displayName"),
+            "updated": fields.get("updated"),
+        }
+    elif "Issue key" in issue:
+        ticket = {
+            "key": issue.get("Issue key"),
+            "summary": issue.get("Summary"),
+            "description": issue.get("Description") or None,
+            "status": issue.get("Status"),
+            "creator": issue.get("Creator") or issue.get("Reporter"),
+            "updated": issue.get("Updated"),
+        }
+    else:
+        ticket = {
+            "key": issue.get("key") or issue.get("id"),
+            "summary": issue.get("summary") or issue.get("title"),
+            "description": issue.get("description"),
+            "status": issue.get("status"),
+            "creator": issue.get("creator") or issue.get("reporter"),
+            "updated": issue.get("updated"),
+        }
+    if not ticket["key"]:
+        return None
+    ticket["summary"] = ticket["summary"] or ""
+    ticket["updated"] = _jira_time(ticket["updated"])
+    return ticket
+
+
+def _flat_slack_documents(records: Iterable[dict]) -> Iterator[Document]:
+    """The flat `{timestamp, user, channel, message}` schema of data/mock_slack.json."""
+    for record in records:
+        epoch = _epoch_of(record.get("timestamp"))
+        if epoch is None or not record.get("message"):
+            continue
+        msg = {"ts": f"{epoch:.6f}", "user": record.get("user"), "text": record["message"]}
+        yield from process_slack_data([msg], (record.get("channel") or "unknown").lstrip("#"))
+
+
+def _jira_documents(records: Iterable[dict]) -> Iterator[Document]:
+    for record in records:
+        ticket = normalize_jira_issue(record)
+        if ticket:
+            yield from process_jira_data([ticket])
+
+
+def _file_documents(path: str) -> Iterator[Document]:
+    """Documents from a single export file; the schema is detected from the first record."""
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        records = _csv_items(path)
+    elif lower.endswith((".ndjson", ".jsonl")):
+        records = _ndjson_items(path)
+    else:
+        records = _json_items(lambda: open(path, "rb"))
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return
+    chained = _chain(first, records)
+    if "message" in first and "channel" in first:
+        yield from _flat_slack_documents(chained)
+    else:
+        yield from _jira_documents(chained)
+
+
+def _chain(first, rest: Iterator) -> Iterator:
+    yield first
+    yield from rest
+
+
+class _SlackExport:
+    """A Slack workspace export (directory or .zip): channels.json plus `<channel>/<YYYY-MM-DD>.json` day files."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+        if self._zip is not None:
+            names = self._zip.namelist()
+            # Exports are sometimes zipped with a top-level folder
+            root = next((n[:-len("channels.json")] for n in names if n.endswith("channels.json")), "")
+            self._root = root
+            self._names = [n for n in names if n.startswith(root)]
+        else:
+            self._root = path
+
+    @staticmethod
+    def detect(path: str) -> bool:
+        if os.path.isdir(path):
+            return os.path.exists(os.path.join(path, "channels.json"))
+        return zipfile.is_zipfile(path) and any(n.endswith("channels.json") for n in zipfile.ZipFile(path).namelist())
+
+    def _opener(self, relative: str) -> Callable[[], io.BufferedIOBase]:
+        if self._zip is not None:
+            return lambda: self._zip.open(self._root + relative)
+        return lambda: open(os.path.join(self._root, relative), "rb")
+
+    def channels(self) -> List[dict]:
+        return list(_json_items(self._opener("channels.json"), "item"))
+
+    def day_files(self, channel_name: str) -> List[str]:
+        if self._zip is not None:
+            prefix = f"{self._root}{channel_name}/"
+            files = [n[len(self._root):] for n in self._names if n.startswith(prefix) and n.endswith(".json")]
+        else:
+            directory = os.path.join(self._root, channel_name)
+            files = [f"{channel_name}/{n}" for n in os.listdir(directory) if n.endswith(".json")] if os.path.isdir(directory) else []
+        # Day files are named YYYY-MM-DD.json, so name order is time order
+        return sorted(files)
+
+    def channel_documents(self, channel_id: str, channel_name: str) -> Iterator[Document]:
+        """Standalone messages as they stream past; threads once the channel's replies are all seen."""
+        threads = {}
+        for relative in self.day_files(channel_name):
+            for msg in _json_items(self._opener(relative), "item"):
+                if "text" not in msg or msg.get("subtype") in ("channel_join", "channel_leave"):
+                    continue
+                thread_ts = msg.get("thread_ts")
+                if thread_ts:
+                    # Replies can land in later day files than their parent
+                    threads.setdefault(thread_ts, []).append(msg)
+                else:
+                    yield from process_slack_data([msg], channel_id)
+
+        for thread_ts in sorted(threads, key=float):
+            messages = threads[thread_ts]
+            parent = next((m for m in messages if m.get("ts") == thread_ts), None)
+            replies = sorted((m for m in messages if m.get("ts") != thread_ts), key=lambda m: float(m["ts"]))
+            if parent is None:
+                # Parent deleted before the export: keep the replies as plain messages
+                yield from process_slack_data(replies, channel_id)
+            elif not replies:
+                yield from process_slack_data([parent], channel_id)
+            else:
+                parent = {**parent, "latest_reply": replies[-1]["ts"]}
+                yield process_slack_thread([parent] + replies, channel_id)
+
+    def sources(self) -> List[Source]:
+        fingerprint = _fingerprint(self.path) if self._zip is not None else None
+        sources = []
+        for channel in self.channels():
+            channel_id, name = channel.get("id") or channel["name"], channel["name"]
+            if fingerprint is None:
+                directory = os.path.join(self._root, name)
+                mtimes = [os.stat(os.path.join(self._root, f)).st_mtime for f in self.day_files(name)] or [0]
+                channel_fingerprint = f"{len(mtimes)}:{int(max(mtimes))}" if os.path.isdir(directory) else "0"
+            else:
+                channel_fingerprint = fingerprint
+            key = f"slack-export:{os.path.abspath(self.path)}:{channel_id}"
+            sources.append((key, channel_fingerprint, self.channel_documents(channel_id, name)))
+        return sources
+
+
+def discover_sources(path: str) -> List[Source]:
+    """Importable sources under `path`: a Slack export (dir/zip) or Jira/Slack export files."""
+    if _SlackExport.detect(path):
+        return _SlackExport(path).sources()
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.join(dirpath, name)
+            for dirpath, _, names in os.walk(path)
+            for name in names if name.lower().endswith((".json", ".ndjson", ".jsonl", ".csv"))
+        )
+    else:
+        files = [path]
+    return [(f"file:{os.path.abspath(f)}", _fingerprint(f), _file_documents(f)) for f in files]
+
+
+_splitter = None
+
+
+def _split_batch(documents: List[Document]) -> dict:
+    """Process-pool entry point; each worker keeps its own splitter."""
+    global _splitter
+    if _splitter is None:
+        _splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return split_documents(documents, _splitter)
+
+
+def _batches(documents: Iterable[Document], size: int) -> Iterator[List[Document]]:
+    batch = []
+    for doc in documents:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BulkImporter:
+    """Imports export files straight into the store, bypassing the rate-limited APIs.
+
+    Documents stream off disk in batches. Splitting runs in a process pool a
+    few batches ahead of the embed/write loop, and after every written batch
+    the source's checkpoint (documents done) is saved, so a rerun skips what
+    an interrupted import already wrote.
+    """
+
+    def __init__(self, rag_service, state: SyncState = None, workers: int = BULK_IMPORT_WORKERS,
+                 batch_size: int = BULK_IMPORT_BATCH_SIZE, fresh: bool = False):
+        self.rag_service = rag_service
+        self.state = state or SyncState(os.path.join(rag_service.db_path, IMPORT_STATE_FILE))
+        self.workers = workers
+        self.batch_size = batch_size
+        self.fresh = fresh
+
+    def run(self, paths: List[str]) -> dict:
+        stats = {"items_imported": 0, "items_skipped": 0, "chunks_written": 0, "chunks_deleted": 0, "sources": 0}
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for path in paths:
+                for key, fingerprint, documents in discover_sources(path):
+                    self._import_source(pool, key, fingerprint, documents, stats)
+                    stats["sources"] += 1
+        stats["seconds"] = time.perf_counter() - started
+        stats["chunks_per_second"] = stats["chunks_written"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    def _checkpoint(self, key: str, fingerprint: str, done: int, complete: bool):
+        self.state.set(key, {"fingerprint": fingerprint, "done": done, "complete": complete})
+        self.state.save()
+
+    def _import_source(self, pool, key: str, fingerprint: str, documents: Iterable[Document], stats: dict):
+        checkpoint = self.state.get(key) or {}
+        if self.fresh or checkpoint.get("fingerprint") != fingerprint:
+            checkpoint = {}
+        if checkpoint.get("complete"):
+            print(f"Skipping {key}: already imported.")
+            return
+        skip = done = checkpoint.get("done", 0)
+        if skip:
+            print(f"Resuming {key} after {skip} documents.")
+
+        documents = iter(documents)
+        # Source order is deterministic, so resuming just means dropping the first `done` documents
+        for _ in range(skip):
+            if next(documents, None) is None:
+                break
+        stats["items_skipped"] += skip
+
+        in_flight = deque()
+
+        def drain_one():
+            nonlocal done
+            batch, future = in_flight.popleft()
+            ids, chunks, stale_ids = self.rag_service.prepare_chunks(batch, split=future.result())
+            if chunks or stale_ids:
+                vectors = self.rag_service.embed_chunks(chunks) if chunks else []
+                self.rag_service.write_chunks(ids, chunks, vectors, stale_ids)
+            done += len(batch)
+            stats["items_imported"] += len(batch)
+            stats["chunks_written"] += len(ids)
+            stats["chunks_deleted"] += len(stale_ids)
+            self._checkpoint(key, fingerprint, done, complete=False)
+            print(f"  {key}: {done} documents")
+
+        for batch in _batches(documents, self.batch_size):
+            in_flight.append((batch, pool.submit(_split_batch, batch)))
+            # Bounded read-ahead: parsing/splitting stays a few batches ahead of embedding
+            if len(in_flight) > self.workers * 2:
+                drain_one()
+        while in_flight:
+            drain_one()
+        self._checkpoint(key, fingerprint, done, complete=True)
@@ -0,0 +1,314 @@
+import ast
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.services.answer_cache import normalize_snippet
+
+# Workspace to index; empty disables code indexing
+CODE_INDEX_ROOT = os.environ.get("CODE_INDEX_ROOT", "")
+CODE_INDEX_WORKERS = int(os.environ.get("CODE_INDEX_WORKERS", str(os.cpu_count() or 2)))
+# Discussion chunks linked to each code unit
+CODE_LINK_K = int(os.environ.get("CODE_LINK_K", "5"))
+# After a sync, units among a new chunk's this-many nearest are relinked (plus units linked to changed chunks)
+CODE_RELINK_NEIGHBOURS = int(os.environ.get("CODE_RELINK_NEIGHBOURS", "20"))
+# Embedding models cap input length; long functions are embedded by their head
+CODE_UNIT_MAX_CHARS = 4000
+
+SKIP_DIRS = {".git", ".hg", ".venv", "venv", "env", "node_modules", "__pycache__", "chroma_db", "build", "dist", "out"}
+
+
+def _unit(rel_path: str, qualname: str, kind: str, node, text: str) -> dict:
+    return {
+        "id": f"{rel_path}::{qualname}",
+        "file": rel_path,
+        "qualname": qualname,
+        "kind": kind,
+        "start_line": node.lineno,
+        "end_line": node.end_lineno,
+        "text": text,
+    }
+
+
+def parse_file(args: Tuple[str, str]) -> Tuple[str, List[dict]]:
+    """Splits a Python file into function/method/class units. Runs in a worker process."""
+    path, rel_path = args
+    try:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        tree = ast.parse(source, filename=path)
+    except (OSError, SyntaxError, UnicodeDecodeError, ValueError) as e:
+        print(f"Skipping {rel_path}: {e}")
+        return rel_path, []
+
+    lines = source.splitlines()
+    units = []
+
+    def visit(body, prefix: str):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                qualname = f"{prefix}{node.name}"
+                kind = "method" if prefix else "function"
+                units.append(_unit(rel_path, qualname, kind, node, ast.get_source_segment(source, node) or ""))
+            elif isinstance(node, ast.ClassDef):
+                qualname = f"{prefix}{node.name}"
+                # The class unit is its outline; each method is a unit of its own
+                outline = [lines[node.lineno - 1]]
+                docstring = ast.get_docstring(node)
+                if docstring:
+                    outline.append(f'    """{docstring}"""')
+                outline.extend(
+                    lines[child.lineno - 1] for child in node.body
+                    if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+                )
+                units.append(_unit(rel_path, qualname, "class", node, "\n".join(outline)))
+                visit(node.body, f"{qualname}.")
+
+    visit(tree.body, "")
+    return rel_path, units
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class CodeIndex:
+    """Function/class-level index of a Python workspace, linked to Slack/Jira chunks.
+
+    Units are embedded into their own Chroma collection. Each unit's nearest
+    discussion chunks are precomputed into a link table, so explaining a known
+    symbol is an index lookup rather than a fresh semantic search.
+    """
+
+    def __init__(self, path: str, collection, rag_service):
+        self.path = path
+        # Chroma collection holding the code-unit vectors
+        self.collection = collection
+        self.rag_service = rag_service
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime REAL NOT NULL, hash TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS units (id TEXT PRIMARY KEY, file TEXT NOT NULL, qualname TEXT NOT NULL, "
+            "kind TEXT NOT NULL, start_line INTEGER NOT NULL, end_line INTEGER NOT NULL, text TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_units_file ON units(file)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS links (unit_id TEXT NOT NULL, chunk_id TEXT NOT NULL, score REAL NOT NULL, "
+            "PRIMARY KEY (unit_id, chunk_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_links_chunk ON links(chunk_id)")
+        self._conn.commit()
+
+    def clear(self, collection):
+        """Forgets every unit (e.g. after the embedding model changed); the next refresh re-indexes all files."""
+        with self._lock:
+            for table in ("files", "units", "links"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.commit()
+        self.collection = collection
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM units").fetchone()[0]
+
+    def _changed_files(self, root: str) -> Tuple[List[tuple], List[str]]:
+        """Returns ((abs, rel, mtime, hash) for files whose content changed, rel paths that disappeared)."""
+        with self._lock:
+            known = {path: (mtime, digest) for path, mtime, digest in self._conn.execute("SELECT path, mtime, hash FROM files")}
+        seen, changed, touched = set(), [], []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+            for filename in filenames:
+                if not filename.endswith(".py"):
+                    continue
+                abs_path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(abs_path, root).replace(os.sep, "/")
+                seen.add(rel_path)
+                mtime = os.path.getmtime(abs_path)
+                if rel_path in known and known[rel_path][0] == mtime:
+                    continue
+                digest = _file_hash(abs_path)
+                if rel_path in known and known[rel_path][1] == digest:
+                    # Touched but not edited (checkout, formatter no-op)
+                    touched.append((mtime, rel_path))
+                    continue
+                changed.append((abs_path, rel_path, mtime, digest))
+        if touched:
+            with self._lock:
+                self._conn.executemany("UPDATE files SET mtime = ? WHERE path = ?", touched)
+                self._conn.commit()
+        return changed, [path for path in known if path not in seen]
+
+    def refresh(self, root: str, written_chunks=(), deleted_chunks=()) -> dict:
+        """Incrementally re-indexes `root`: only files whose content changed are parsed and embedded.
+
+        Units whose discussion links the given written/deleted Slack/Jira
+        chunks may have changed (see `affected_units`) are relinked too.
+        """
+        changed, removed = self._changed_files(root)
+        units = []
+        if changed:
+            # ast parsing is CPU-bound and holds the GIL, so it fans out to processes
+            with ProcessPoolExecutor(max_workers=CODE_INDEX_WORKERS) as pool:
+                for _, file_units in pool.map(parse_file, [(abs_path, rel) for abs_path, rel, _, _ in changed], chunksize=16):
+                    units.extend(file_units)
+            # Redefinitions (e.g. property setters) share a qualname; the last one wins
+            units = list({unit["id"]: unit for unit in units}.values())
+
+        docs = [
+            Document(
+                page_content=f"{unit['kind']} {unit['qualname']} ({unit['file']})\n{unit['text']}"[:CODE_UNIT_MAX_CHARS],
+                metadata={"source": "code", "file": unit["file"], "qualname": unit["qualname"], "kind": unit["kind"]},
+            )
+            for unit in units
+        ]
+        # Embed before recording file versions, so a failed run retries these files next time
+        vectors = self.rag_service.embed_chunks(docs) if docs else []
+
+        versions = {rel: (mtime, digest) for _, rel, mtime, digest in changed}
+        stale = self._replace_files(versions, removed, units)
+        if stale:
+            self.collection.delete(ids=stale)
+        if units:
+            ids = [unit["id"] for unit in units]
+            self.collection.upsert(
+                ids=ids, embeddings=vectors,
+                documents=[doc.page_content for doc in docs], metadatas=[doc.metadata for doc in docs]
+            )
+            self._link(ids, docs, vectors)
+
+        relinked = 0
+        if written_chunks or deleted_chunks:
+            relinked = self.relink(self.affected_units(written_chunks, deleted_chunks), exclude={unit["id"] for unit in units})
+        stats = {"files_changed": len(changed), "files_removed": len(removed), "units_indexed": len(units), "units_relinked": relinked}
+        print(f"Code index refreshed: {stats}")
+        return stats
+
+    def _replace_files(self, versions: Dict[str, tuple], removed: List[str], units: List[dict]) -> List[str]:
+        """Swaps the units of changed/removed files for the freshly parsed ones; returns IDs that went away."""
+        new_ids = {unit["id"] for unit in units}
+        with self._lock:
+            old_ids = []
+            for rel_path in list(versions) + removed:
+                old_ids.extend(row[0] for row in self._conn.execute("SELECT id FROM units WHERE file = ?", (rel_path,)))
+                self._conn.execute("DELETE FROM units WHERE file = ?", (rel_path,))
+                if rel_path in versions:
+                    mtime, digest = versions[rel_path]
+                    self._conn.execute("INSERT OR REPLACE INTO files (path, mtime, hash) VALUES (?, ?, ?)", (rel_path, mtime, digest))
+                else:
+                    self._conn.execute("DELETE FROM files WHERE path = ?", (rel_path,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO units (id, file, qualname, kind, start_line, end_line, text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(u["id"], u["file"], u["qualname"], u["kind"], u["start_line"], u["end_line"], u["text"]) for u in units],
+            )
+            stale = [unit_id for unit_id in old_ids if unit_id not in new_ids]
+            self._conn.executemany("DELETE FROM links WHERE unit_id = ?", [(unit_id,) for unit_id in stale])
+            self._conn.commit()
+        return stale
+
+    def _link(self, ids: List[str], docs: List[Document], vectors: List[List[float]]):
+        """Stores each unit's nearest discussion chunks, reusing the unit's own vector as the query."""
+        rows = []
+        for unit_id, doc, vector in zip(ids, docs, vectors):
+            scored = self.rag_service.retrieve_with_scores(doc.page_content, k=CODE_LINK_K, query_vector=vector)
+            rows.extend((unit_id, chunk.id, score) for chunk, score in scored)
+        with self._lock:
+            self._conn.executemany("DELETE FROM links WHERE unit_id = ?", [(unit_id,) for unit_id in ids])
+            self._conn.executemany("INSERT OR REPLACE INTO links (unit_id, chunk_id, score) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def affected_units(self, written_chunks, deleted_chunks, page_size: int = 500) -> Optional[List[str]]:
+        """Units whose links changed chunks may alter: those linked to them, and those near a written one.
+
+        None (relink everything) when there are more changed chunks than units,
+        since then the reverse searches would cost more than a full relink.
+        """
+        changed = list(written_chunks) + list(deleted_chunks)
+        unit_count = self.count()
+        if len(changed) > unit_count:
+            return None
+        affected = set()
+        with self._lock:
+            for start in range(0, len(changed), page_size):
+                page = changed[start:start + page_size]
+                affected.update(row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT unit_id FROM links WHERE chunk_id IN ({','.join('?' * len(page))})", page))
+        written = list(written_chunks)
+        for start in range(0, len(written), page_size):
+            stored = self.rag_service.store.get(ids=written[start:start + page_size], include=["embeddings"])
+            vectors = [list(vector) for vector in stored["embeddings"]]
+            if vectors:
+                hits = self.collection.query(query_embeddings=vectors, n_results=min(CODE_RELINK_NEIGHBOURS, unit_count))
+                affected.update(unit_id for ids in hits["ids"] for unit_id in ids)
+        return sorted(affected)
+
+    def relink(self, unit_ids: Optional[List[str]] = None, exclude=frozenset(), page_size: int = 500) -> int:
+        """Recomputes links for the given units (default: every indexed unit) from their stored vectors (no re-embedding)."""
+        if unit_ids is None:
+            with self._lock:
+                unit_ids = [row[0] for row in self._conn.execute("SELECT id FROM units")]
+        unit_ids = [unit_id for unit_id in unit_ids if unit_id not in exclude]
+        for start in range(0, len(unit_ids), page_size):
+            stored = self.collection.get(ids=unit_ids[start:start + page_size], include=["documents", "embeddings"])
+            docs = [Document(page_content=text) for text in stored["documents"]]
+            self._link(stored["ids"], docs, [list(vector) for vector in stored["embeddings"]])
+        return len(unit_ids)
+
+    def find_unit(self, code_snippet: str, file_path: str, line_numbers: str) -> Optional[dict]:
+        """The smallest indexed unit enclosing the selection, if the selection still matches its text."""
+        try:
+            first, _, last = line_numbers.partition("-")
+            start_line, end_line = int(first), int(last or first)
+        except ValueError:
+            return None
+        path = file_path.replace("\\", "/")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, file, qualname, start_line, end_line, text FROM units "
+                "WHERE start_line <= ? AND end_line >= ? AND ? LIKE '%' || file "
+                "ORDER BY end_line - start_line ASC",
+                (start_line, end_line, path),
+            ).fetchall()
+        snippet = normalize_snippet(code_snippet)
+        for unit_id, rel_path, qualname, unit_start, unit_end, text in rows:
+            # Whole path segments only, and the editor buffer must not have drifted from the index
+            if (path == rel_path or path.endswith("/" + rel_path)) and snippet and snippet in normalize_snippet(text):
+                return {"id": unit_id, "file": rel_path, "qualname": qualname, "start_line": unit_start, "end_line": unit_end}
+        return None
+
+    def links_for(self, unit_id: str) -> List[Tuple[str, float]]:
+        """(chunk_id, relevance) pairs linked to a unit, best first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chunk_id, score FROM links WHERE unit_id = ? ORDER BY score DESC", (unit_id,)
+            ).fetchall()
+
+    def files_for_chunks(self, chunk_ids: List[str], limit: int = 5) -> Dict[str, List[str]]:
+        """Code units linked to each discussion chunk, as `file::qualname`, strongest link first."""
+        if not chunk_ids:
+            return {}
+        placeholders = ",".join("?" * len(chunk_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT links.chunk_id, units.file, units.qualname FROM links JOIN units ON units.id = links.unit_id "
+                f"WHERE links.chunk_id IN ({placeholders}) ORDER BY links.score DESC",
+                list(chunk_ids),
+            ).fetchall()
+        related = {}
+        for chunk_id, rel_path, qualname in rows:
+            files = related.setdefault(chunk_id, [])
+            if len(files) < limit:
+                files.append(f"{rel_path}::{qualname}")
+        return related
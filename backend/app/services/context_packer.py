@@ -0,0 +1,102 @@
+import os
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))
+# Don't bother appending a truncated block smaller than this
+MIN_BLOCK_TOKENS = 40
+# Longest prefix/suffix overlap we look for when stitching neighbouring chunks (splitter overlap is 100 chars)
+MAX_OVERLAP_CHARS = 200
+TRUNCATION_MARKER = " …"
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # tiktoken fetches its BPE file on first use; offline we fall back to an estimate
+            print(f"tiktoken unavailable ({e}), estimating tokens from length.")
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to at most max_tokens, the " …" marker included."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    # Reserve the marker's own tokens so the result still fits the budget
+    budget = max(max_tokens - count_tokens(TRUNCATION_MARKER), 0)
+    encoding = _get_encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text)[:budget]) + TRUNCATION_MARKER
+    return text[:budget * 4] + TRUNCATION_MARKER
+
+
+def _group_key(doc: Document) -> tuple:
+    """Chunks of the same Slack thread / Jira ticket belong in one block."""
+    meta = doc.metadata
+    if meta.get("source") == "jira" and meta.get("id"):
+        return ("jira", meta["id"])
+    if meta.get("source") == "slack":
+        return ("slack", meta.get("channel"), meta.get("thread_ts") or meta.get("timestamp"))
+    return ("doc", doc.id or doc.page_content)
+
+
+def _stitch(first: str, second: str) -> str:
+    """Joins two chunks, dropping the text they share at the seam."""
+    if second in first:
+        return first
+    if first in second:
+        return second
+    for size in range(min(MAX_OVERLAP_CHARS, len(first), len(second)), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+def pack_context(scored: List[Tuple[Document, float]], budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Builds the prompt context from scored chunks within a token budget.
+
+    Overlapping chunks of the same thread/ticket are merged into one block,
+    blocks are added best-score first, and when the budget runs out the
+    lowest-scored content is truncated or dropped.
+    """
+    groups = {}
+    for position, (doc, score) in enumerate(scored):
+        group = groups.setdefault(_group_key(doc), {"chunks": [], "score": score, "source": doc.metadata.get("source", "unknown")})
+        group["chunks"].append((doc.metadata.get("chunk_index", position), doc.page_content))
+        group["score"] = max(group["score"], score)
+
+    blocks = []
+    for group in groups.values():
+        text = ""
+        for _, chunk in sorted(group["chunks"], key=lambda item: item[0]):
+            text = _stitch(text, chunk) if text else chunk
+        blocks.append((group["score"], f"--- SOURCE: {group['source']} ---\n{text}"))
+    blocks.sort(key=lambda block: block[0], reverse=True)
+
+    packed, used = [], 0
+    for _, block in blocks:
+        tokens = count_tokens(block)
+        if used + tokens <= budget:
+            packed.append(block)
+            used += tokens
+            continue
+        remaining = budget - used
+        if remaining >= MIN_BLOCK_TOKENS:
+            packed.append(truncate_to_tokens(block, remaining))
+        break
+    return "\n\n".join(packed)
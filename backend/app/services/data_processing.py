@@ -1,6 +1,16 @@
 
+import json
+from datetime import datetime
 from langchain_core.documents import Document
 
+def parse_jira_time(value: str) -> float:
+    """Parses Jira's `2023-11-10T09:15:00.000+0000` into epoch seconds."""
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z").timestamp()
+
+def _epoch(ts):
+    # Slack ts strings are epoch seconds; float metadata enables range filters
+    return float(ts) if ts else None
+
 def process_slack_data(data, channel_id):
     """Converts Slack messages into documents with metadata."""
     documents = []
@@ -16,11 +26,41 @@ def process_slack_data(data, channel_id):
             "user": msg.get('user'),
             "channel": channel_id,
             "timestamp": msg.get('ts'),
+            "timestamp_epoch": _epoch(msg.get('ts')),
+            # Stable per-message ID; a message that later grows a thread is replaced by the thread document
+            "source_id": f"{channel_id}:{msg.get('ts')}",
             "url": f"https://slack.com/archives/{channel_id}/p{msg.get('ts').replace('.', '')}" if msg.get('ts') else None
         }
         documents.append(Document(page_content=content, metadata=meta))
     return documents
 
+def process_slack_thread(messages, channel_id):
+    """Assembles a Slack thread (parent first, then replies) into a single document."""
+    parent = messages[0]
+    lines = [f"Date: {parent.get('ts')} | Author: {parent.get('user')} | Channel: {channel_id}\nMessage: {parent.get('text')}"]
+    replies = []
+    for reply in messages[1:]:
+        if "text" not in reply:
+            continue
+        lines.append(f"Reply: {reply.get('ts')} | Author: {reply.get('user')}\n{reply.get('text')}")
+        replies.append({"ts": reply.get("ts"), "user": reply.get("user")})
+
+    meta = {
+        "source": "slack",
+        "user": parent.get('user'),
+        "channel": channel_id,
+        "timestamp": parent.get('ts'),
+        "timestamp_epoch": _epoch(parent.get('ts')),
+        "thread_ts": parent.get('ts'),
+        "source_id": f"{channel_id}:{parent.get('ts')}",
+        "reply_count": len(replies),
+        "latest_reply": parent.get('latest_reply'),
+        # Chroma metadata must be scalar, so per-reply details are stored as JSON
+        "replies": json.dumps(replies),
+        "url": f"https://slack.com/archives/{channel_id}/p{parent.get('ts').replace('.', '')}" if parent.get('ts') else None
+    }
+    return Document(page_content="\n\n".join(lines), metadata=meta)
+
 def process_jira_data(data):
     """Converts Jira tickets into documents with metadata."""
     documents = []
@@ -30,9 +70,12 @@ def process_jira_data(data):
         meta = {
             "source": "jira",
             "id": ticket['key'],
+            "source_id": ticket['key'],
             "title": ticket['summary'],
             "status": ticket['status'],
-            "creator": ticket['creator']
+            "creator": ticket['creator'],
+            "updated": ticket.get('updated'),
+            "timestamp_epoch": parse_jira_time(ticket['updated']) if ticket.get('updated') else None
         }
         documents.append(Document(page_content=content, metadata=meta))
     return documents
@@ -0,0 +1,169 @@
+import hashlib
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+
+# Shared by ingest.py and the live service so both reuse each other's vectors
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CACHE_PATH = os.path.join(BACKEND_ROOT, "embedding_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of a chunk's text, used as the cache key."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Disk-backed LRU store of embedding vectors keyed by (model name, content hash)."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        # WAL lets the ingest script and the server read/write the same file concurrently
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "last_access REAL NOT NULL, PRIMARY KEY (model, hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_lru ON embeddings(last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Returns cached vectors for the given hashes and refreshes their LRU position."""
+        found = {}
+        if not hashes:
+            return found
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for h, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[h] = vec.tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND hash = ?",
+                    [(now, model, h) for h in found],
+                )
+                self._conn.commit()
+
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        """Stores vectors and evicts least-recently-used entries beyond max_entries."""
+        if not vectors:
+            return
+        with self._lock:
+            now = time.time()
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                [(model, h, array("f", vec).tobytes(), now) for h, vec in vectors.items()],
+            )
+            self._size += max(cursor.rowcount, 0)
+            self._conn.commit()
+            if self._size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """Drops the oldest entries down to 90% of capacity to amortize eviction cost."""
+        # Other processes may have written too, so recount before trimming
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._size - int(self.max_entries * 0.9)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+            (excess,),
+        )
+        self._conn.commit()
+        self._size -= excess
+        self.evictions += excess
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only calls the underlying model for unseen text."""
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache: EmbeddingCache):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache = cache
+
+    def _embed(self, namespace: str, texts: List[str], embed_fn) -> List[List[float]]:
+        hashes = [content_hash(t) for t in texts]
+        cached = self.cache.get_many(namespace, hashes)
+
+        # Embed each unseen text once, even if it repeats within the batch
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = text
+        if missing:
+            new_vectors = embed_fn(list(missing.values()))
+            fresh = dict(zip(missing.keys(), new_vectors))
+            self.cache.put_many(namespace, fresh)
+            cached.update(fresh)
+
+        return [cached[h] for h in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(self.model_name, texts, self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Batched embed_query: uncached queries go to the model in one call where it allows."""
+        # Query and document embeddings may differ (task type), so keep them apart
+        return self._embed(f"{self.model_name}:query", texts, self._embed_query_batch)
+
+    def _embed_query_batch(self, texts: List[str]) -> List[List[float]]:
+        if hasattr(self.underlying, "embed_queries"):
+            return self.underlying.embed_queries(texts)
+        if len(texts) > 1 and "task_type" in inspect.signature(self.underlying.embed_documents).parameters:
+            # e.g. Gemini: the batch endpoint with the same task type embed_query uses
+            return self.underlying.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+        return [self.underlying.embed_query(t) for t in texts]
+
+
+def build_cached_embeddings(underlying: Embeddings, model_name: str, path: str = DEFAULT_CACHE_PATH) -> CachedEmbeddings:
+    """Wraps an embedding model with the shared on-disk cache."""
+    return CachedEmbeddings(underlying, model_name, EmbeddingCache(path))
@@ -0,0 +1,107 @@
+import hashlib
+import math
+import os
+import threading
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from app.services.embedding_cache import build_cached_embeddings
+
+# google | local | hashing
+EMBEDDING_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "google").lower()
+GOOGLE_EMBEDDING_MODEL = os.environ.get("GOOGLE_EMBEDDING_MODEL", "models/gemini-embedding-001")
+LOCAL_EMBEDDING_MODEL = os.environ.get("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# torch or onnx (onnx needs sentence-transformers[onnx])
+LOCAL_EMBEDDING_BACKEND = os.environ.get("LOCAL_EMBEDDING_BACKEND", "torch")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+# Intra-op threads for local encoding; 0 keeps the library default
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+HASHING_EMBEDDING_DIM = int(os.environ.get("HASHING_EMBEDDING_DIM", "256"))
+
+
+class LocalEmbeddings(Embeddings):
+    """Small sentence-transformers model on CPU; each batch is encoded into one NumPy array."""
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 threads: int = EMBEDDING_THREADS, backend: str = LOCAL_EMBEDDING_BACKEND):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("EMBEDDING_PROVIDER=local requires `pip install sentence-transformers`") from e
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        kwargs = {"backend": backend} if backend != "torch" else {}
+        self.model = SentenceTransformer(model_name, device="cpu", **kwargs)
+        self.batch_size = batch_size
+        # The model already fans out over EMBEDDING_THREADS; concurrent callers would only oversubscribe the CPU
+        self._lock = threading.Lock()
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        with self._lock:
+            vectors = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts)
+
+
+class HashingEmbeddings(Embeddings):
+    """Dependency-free bag-of-hashed-tokens embedder for offline runs and tests."""
+
+    def __init__(self, dim: int = HASHING_EMBEDDING_DIM):
+        self.dim = dim
+
+    def _vector(self, text: str) -> List[float]:
+        # Texts sharing words land near each other, which is enough to exercise retrieval
+        vec = [0.0] * self.dim
+        for token in text.lower().split():
+            digest = hashlib.md5(token.encode()).digest()
+            vec[int.from_bytes(digest[:4], "little") % self.dim] += 1.0 if digest[4] % 2 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+def embedding_model_name(provider: str = EMBEDDING_PROVIDER) -> str:
+    """Identifies the model behind a provider; also the embedding cache namespace."""
+    if provider == "google":
+        return GOOGLE_EMBEDDING_MODEL
+    if provider == "local":
+        return f"local:{LOCAL_EMBEDDING_MODEL}"
+    if provider == "hashing":
+        return f"hashing:{HASHING_EMBEDDING_DIM}"
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER '{provider}' (expected google, local or hashing)")
+
+
+def build_embeddings(provider: str = EMBEDDING_PROVIDER) -> Embeddings:
+    """Returns the configured embedding model, wrapped in the on-disk cache where it pays off."""
+    model_name = embedding_model_name(provider)
+    if provider == "hashing":
+        # Cheaper to recompute than to look up
+        return HashingEmbeddings()
+    if provider == "local":
+        return build_cached_embeddings(LocalEmbeddings(), model_name)
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return build_cached_embeddings(GoogleGenerativeAIEmbeddings(model=GOOGLE_EMBEDDING_MODEL), model_name)
@@ -0,0 +1,155 @@
+import json
+import os
+import re
+from typing import List, Optional, Tuple
+
+from app.models import RetrievalFilters
+
+# Metadata fields that get their own pre-filtered Chroma collection per value ("" disables partitions)
+RETRIEVAL_PARTITIONS = [f.strip() for f in os.environ.get("RETRIEVAL_PARTITIONS", "").split(",") if f.strip()]
+PARTITION_PREFIX = "part"
+
+KNOWN_SOURCES = ("slack", "jira")
+
+
+def _all_of(clauses: List[dict]) -> Optional[dict]:
+    # Chroma wants $and/$or with at least two operands
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _any_of(clauses: List[dict]) -> Optional[dict]:
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _source_clauses(filters: RetrievalFilters) -> List[Tuple[str, List[dict]]]:
+    """Per allowed source, the conditions its chunks must meet."""
+    clauses = []
+    for source in filters.sources or KNOWN_SOURCES:
+        conditions = [{"source": source}]
+        if filters.since is not None:
+            conditions.append({"timestamp_epoch": {"$gte": filters.since}})
+        if filters.until is not None:
+            conditions.append({"timestamp_epoch": {"$lte": filters.until}})
+        # Channel and status only narrow the source they belong to
+        if source == "slack" and filters.channels:
+            conditions.append({"channel": {"$in": list(filters.channels)}})
+        if source == "jira" and filters.statuses:
+            conditions.append({"status": {"$in": list(filters.statuses)}})
+        clauses.append((source, conditions))
+    return clauses
+
+
+def to_where(filters: Optional[RetrievalFilters]) -> Optional[dict]:
+    """Translates request filters into a Chroma `where` clause (None = no filtering)."""
+    if filters is None or filters.is_empty():
+        return None
+    return _any_of([_all_of(conditions) for _, conditions in _source_clauses(filters)])
+
+
+def _condition_sql(field: str, condition, metadata_column: str) -> Tuple[str, list]:
+    column = f"json_extract({metadata_column}, '$.{field}')"
+    if not isinstance(condition, dict):
+        return f"{column} = ?", [condition]
+    (operator, value), = condition.items()
+    if operator == "$in":
+        return f"{column} IN ({','.join('?' * len(value))})", list(value)
+    sql_operator = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}[operator]
+    return f"{column} {sql_operator} ?", [value]
+
+
+def where_to_sql(where: Optional[dict], column: str = "chunks.metadata") -> Tuple[str, list]:
+    """The same `where` tree as a SQL condition over a JSON metadata column (the lexical index's by default)."""
+    if not where:
+        return "1", []
+    parts, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            joined = []
+            for clause in value:
+                sql, clause_params = where_to_sql(clause, column)
+                joined.append(f"({sql})")
+                params.extend(clause_params)
+            parts.append(f" {'AND' if key == '$and' else 'OR'} ".join(joined))
+        else:
+            sql, clause_params = _condition_sql(key, value, column)
+            parts.append(sql)
+            params.extend(clause_params)
+    return " AND ".join(parts), params
+
+
+def matches(where: Optional[dict], metadata: dict) -> bool:
+    """Evaluates a `where` tree against one chunk's metadata in Python."""
+    if not where:
+        return True
+    for key, value in where.items():
+        if key == "$and":
+            if not all(matches(clause, metadata) for clause in value):
+                return False
+        elif key == "$or":
+            if not any(matches(clause, metadata) for clause in value):
+                return False
+        else:
+            actual = metadata.get(key)
+            operator, expected = next(iter(value.items())) if isinstance(value, dict) else ("$eq", value)
+            if operator == "$in":
+                ok = actual in expected
+            elif operator == "$eq":
+                ok = actual == expected
+            elif operator == "$ne":
+                ok = actual != expected
+            elif actual is None:
+                ok = False
+            else:
+                ok = {"$gt": actual > expected, "$gte": actual >= expected,
+                      "$lt": actual < expected, "$lte": actual <= expected}[operator]
+            if not ok:
+                return False
+    return True
+
+
+def partition_name(field: str, value: str) -> str:
+    # Chroma collection names: 3-63 chars of [A-Za-z0-9._-], alphanumeric at both ends
+    safe = re.sub(r"[^A-Za-z0-9_-]", "-", str(value))
+    return f"{PARTITION_PREFIX}_{field}_{safe}"[:63].rstrip("-_")
+
+
+def partitions_for(metadata: dict) -> List[str]:
+    """Partition collections a chunk is copied into."""
+    names = []
+    for field in RETRIEVAL_PARTITIONS:
+        value = metadata.get(field)
+        if value:
+            names.append(partition_name(field, value))
+    return names
+
+
+def route(filters: Optional[RetrievalFilters]) -> Optional[List[str]]:
+    """Partitions that together hold every chunk the filters can match, or None to search the main collection.
+
+    The most selective partition wins: a channel filter routes Slack to its
+    channel partitions, otherwise each allowed source goes to its source
+    partition.
+    """
+    if filters is None or filters.is_empty():
+        return None
+    if not filters.channels and set(filters.sources or KNOWN_SOURCES) >= set(KNOWN_SOURCES):
+        # Partitions would cover the whole corpus anyway
+        return None
+    names = []
+    for source, _ in _source_clauses(filters):
+        if source == "slack" and filters.channels and "channel" in RETRIEVAL_PARTITIONS:
+            names.extend(partition_name("channel", channel) for channel in filters.channels)
+        elif "source" in RETRIEVAL_PARTITIONS:
+            names.append(partition_name("source", source))
+        else:
+            return None
+    return names
+
+
+def filter_key(filters: Optional[RetrievalFilters]) -> str:
+    """Canonical form of the filters, for deduplicating requests that share them."""
+    return json.dumps(to_where(filters), sort_keys=True)
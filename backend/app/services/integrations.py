@@ -1,16 +1,26 @@
 
 import os
+import random
+import re
+import time
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 from jira import JIRA
 
+# Retries for rate-limited (HTTP 429) Slack calls
+SLACK_MAX_RETRIES = int(os.environ.get("SLACK_MAX_RETRIES", "5"))
+
 class IntegrationService:
-    def __init__(self):
+    def __init__(self, slack_client=None, jira=None):
+        # Clients can be injected (the benchmarks pass local fakes)
         # Slack Initialization
         self.slack_token = os.environ.get("SLACK_BOT_TOKEN")
-        self.slack_client = WebClient(token=self.slack_token)
+        self.slack_client = slack_client or WebClient(token=self.slack_token)
         
         # Jira Initialization
+        if jira is not None:
+            self.jira = jira
+            return
         jira_domain = os.environ.get("JIRA_DOMAIN")
         jira_email = os.environ.get("JIRA_EMAIL")
         jira_token = os.environ.get("JIRA_API_TOKEN")
@@ -30,15 +40,42 @@ class IntegrationService:
             self.jira = None
             print("Warning: Jira credentials missing.")
 
-    def get_slack_thread(self, channel_id: str, thread_ts: str):
-        """Fetches the last 5 messages from a Slack thread."""
+    def _call_slack(self, method, throttle=None, **kwargs):
+        """Calls a Slack Web API method, backing off and retrying when rate limited."""
+        for attempt in range(SLACK_MAX_RETRIES + 1):
+            if throttle:
+                throttle()
+            try:
+                return method(**kwargs)
+            except SlackApiError as e:
+                if e.response.status_code != 429 or attempt == SLACK_MAX_RETRIES:
+                    raise
+                # Honour Retry-After; otherwise exponential backoff with jitter
+                retry_after = e.response.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after else min(2 ** attempt, 30)
+                time.sleep(delay + random.uniform(0, 1))
+
+    def get_slack_thread(self, channel_id: str, thread_ts: str, throttle=None):
+        """Fetches every message in a Slack thread, parent first."""
         try:
-            result = self.slack_client.conversations_replies(
-                channel=channel_id,
-                ts=thread_ts,
-                limit=5
-            )
-            return result.get("messages", [])
+            messages = []
+            cursor = None
+            while True:
+                result = self._call_slack(
+                    self.slack_client.conversations_replies,
+                    throttle=throttle,
+                    channel=channel_id,
+                    ts=thread_ts,
+                    limit=200,
+                    cursor=cursor
+                )
+                # Every page repeats the parent message, so keep only the ones not seen yet
+                seen = {m.get("ts") for m in messages}
+                messages.extend(m for m in result.get("messages", []) if m.get("ts") not in seen)
+                cursor = (result.get("response_metadata") or {}).get("next_cursor")
+                if not result.get("has_more") or not cursor:
+                    break
+            return messages
         except SlackApiError as e:
             print(f"Slack API Error: {e}")
             return []
@@ -70,32 +107,84 @@ class IntegrationService:
             print(f"Slack API Error: {e}")
             return []
 
-    def fetch_channel_history(self, channel_id: str, limit=50):
-        """Fetches recent messages from a channel."""
+    def fetch_channel_history(self, channel_id: str, limit=50, oldest: str = None, throttle=None):
+        """Fetches recent messages from a channel.
+
+        Without `oldest` this returns a single page of the newest messages. With
+        `oldest` it pages through everything posted after that ts, oldest first.
+        `throttle`, if given, is called before every API request.
+        """
         try:
-            result = self.slack_client.conversations_history(
-                channel=channel_id,
-                limit=limit
-            )
-            return result.get("messages", [])
+            if oldest is None:
+                result = self._call_slack(
+                    self.slack_client.conversations_history,
+                    throttle=throttle,
+                    channel=channel_id,
+                    limit=limit
+                )
+                return result.get("messages", [])
+
+            messages = []
+            cursor = None
+            while True:
+                result = self._call_slack(
+                    self.slack_client.conversations_history,
+                    throttle=throttle,
+                    channel=channel_id,
+                    limit=limit,
+                    oldest=oldest,
+                    cursor=cursor
+                )
+                messages.extend(result.get("messages", []))
+                cursor = (result.get("response_metadata") or {}).get("next_cursor")
+                if not result.get("has_more") or not cursor:
+                    break
+            return sorted(messages, key=lambda m: float(m.get("ts", 0)))
         except SlackApiError as e:
             print(f"Slack API Error: {e}")
             return []
 
-    def search_jira_tickets(self, jql: str, limit=50):
-        """Searches for Jira tickets using JQL."""
+    def search_jira_tickets(self, jql: str, limit=50, updated_within_minutes: int = None, throttle=None):
+        """Searches for Jira tickets using JQL.
+
+        With `updated_within_minutes` only tickets updated in that window are
+        returned, paging through all of them oldest-update first.
+        `throttle`, if given, is called before every API request.
+        """
         if not self.jira:
             return []
+        throttle = throttle or (lambda: None)
         try:
-            # fields='summary,description,status,creator,created'
-            issues = self.jira.search_issues(jql, maxResults=limit)
-            return [{
-                "key": i.key,
-                "summary": i.fields.summary,
-                "description": i.fields.description,
-                "status": i.fields.status.name,
-                "creator": i.fields.creator.displayName
-            } for i in issues]
+            if updated_within_minutes is None:
+                throttle()
+                # fields='summary,description,status,creator,created'
+                issues = self.jira.search_issues(jql, maxResults=limit)
+                return [self._ticket_to_dict(i) for i in issues]
+
+            # Relative dates are evaluated server-side, so the account's timezone doesn't matter
+            base_jql = re.sub(r"\s+ORDER\s+BY\s+.*$", "", jql, flags=re.IGNORECASE | re.DOTALL).strip()
+            delta_jql = f"({base_jql}) AND updated >= -{int(updated_within_minutes)}m ORDER BY updated ASC"
+
+            tickets = []
+            start_at = 0
+            while True:
+                throttle()
+                issues = self.jira.search_issues(delta_jql, startAt=start_at, maxResults=limit)
+                tickets.extend(self._ticket_to_dict(i) for i in issues)
+                start_at += len(issues)
+                if not issues or start_at >= issues.total:
+                    break
+            return tickets
         except Exception as e:
             print(f"Jira API Error: {e}")
             return []
+
+    def _ticket_to_dict(self, issue):
+        return {
+            "key": issue.key,
+            "summary": issue.fields.summary,
+            "description": issue.fields.description,
+            "status": issue.fields.status.name,
+            "creator": issue.fields.creator.displayName,
+            "updated": issue.fields.updated
+        }
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no flock, so every process runs as a single-process leader
+    fcntl = None
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# auto (first process to grab the lock syncs, the rest serve queries), leader or reader
+CONTEXTSYNC_ROLE = os.environ.get("CONTEXTSYNC_ROLE", "auto").lower()
+LEADER_LOCK_FILE = os.environ.get("LEADER_LOCK_FILE") or os.path.join(BACKEND_ROOT, "sync_leader.lock")
+# Bumped by the leader after every write; readers reload their index handles when it changes
+INDEX_GENERATION_FILE = os.environ.get("INDEX_GENERATION_FILE") or os.path.join(BACKEND_ROOT, "index_generation.json")
+GENERATION_POLL_SECONDS = float(os.environ.get("GENERATION_POLL_SECONDS", "5"))
+
+
+class LeaderLock:
+    """Exclusive advisory lock on a file, held for as long as this process is the sync leader.
+
+    The OS drops the lock when the holder exits (even on a crash), so a
+    waiting reader can take over without stale-lease bookkeeping.
+    """
+
+    def __init__(self, path: str = LEADER_LOCK_FILE):
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # Holder's PID, for whoever wonders which worker is syncing
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
+
+
+def read_generation(path: str = INDEX_GENERATION_FILE) -> int:
+    try:
+        with open(path) as f:
+            return int(json.load(f).get("generation", 0))
+    except (OSError, ValueError):
+        return 0
+
+
+def bump_generation(path: str = INDEX_GENERATION_FILE) -> int:
+    """Announces a new index generation to readers (write-then-rename, so they never see a torn file)."""
+    generation = read_generation(path) + 1
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"generation": generation, "updated_at": time.time(), "pid": os.getpid()}, f)
+    os.replace(tmp_path, path)
+    return generation
+
+
+async def watch_generation(on_change: Callable[[int], Awaitable[None]], path: str = INDEX_GENERATION_FILE,
+                           interval: float = GENERATION_POLL_SECONDS, start: Optional[int] = None):
+    """Polls the generation file and awaits `on_change(generation)` whenever it moves."""
+    current = read_generation(path) if start is None else start
+    while True:
+        await asyncio.sleep(interval)
+        generation = read_generation(path)
+        if generation != current:
+            current = generation
+            try:
+                await on_change(generation)
+            except Exception as e:
+                print(f"Failed to load index generation {generation}: {e}")
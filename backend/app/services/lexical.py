@@ -0,0 +1,140 @@
+import json
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.services.filters import where_to_sql
+
+# Noise that shows up in nearly every snippet and says nothing about intent
+STOP_WORDS = {
+    "and", "as", "assert", "async", "await", "break", "class", "continue", "def", "del", "elif", "else",
+    "except", "false", "finally", "for", "from", "if", "import", "in", "is", "lambda", "none", "not", "or",
+    "pass", "raise", "return", "self", "true", "try", "while", "with", "yield", "the", "to", "of", "a", "an",
+    "it", "on", "be", "this", "that", "we", "str", "int", "float", "bool", "dict", "list", "print",
+}
+
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def split_identifier(word: str) -> List[str]:
+    """Splits snake_case and camelCase identifiers into lowercase parts."""
+    parts = []
+    for piece in word.split("_"):
+        parts.extend(p.lower() for p in _CAMEL_RE.findall(piece))
+    return parts
+
+
+def tokenize(text: str) -> List[str]:
+    """Code-aware tokens: each identifier as a whole plus its snake/camel parts.
+
+    Whole identifiers are emitted with underscores removed (`idempotency_key`
+    -> `idempotencykey`) so an exact identifier match outscores documents
+    that merely mention "idempotency" and "key" separately.
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        parts = split_identifier(word)
+        whole = "".join(parts)
+        if len(parts) > 1 and whole not in STOP_WORDS:
+            tokens.append(whole)
+        tokens.extend(p for p in parts if len(p) > 1 and p not in STOP_WORDS)
+    return tokens
+
+
+class LexicalIndex:
+    """Incremental BM25 index over chunk text, backed by SQLite FTS5."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "rowid INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        # Pre-tokenized text; unicode61 then just splits on the spaces we put in
+        self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5(tokens)")
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, ids: List[str], documents: List[Document]):
+        """Upserts chunks into the index."""
+        with self._lock:
+            self._delete(ids)
+            for chunk_id, doc in zip(ids, documents):
+                cursor = self._conn.execute(
+                    "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                    (chunk_id, doc.page_content, json.dumps(doc.metadata)),
+                )
+                self._conn.execute(
+                    "INSERT INTO chunk_terms (rowid, tokens) VALUES (?, ?)",
+                    (cursor.lastrowid, " ".join(tokenize(doc.page_content))),
+                )
+            self._conn.commit()
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._delete(ids)
+            self._conn.commit()
+
+    def _delete(self, ids: List[str]):
+        for chunk_id in ids:
+            row = self._conn.execute("SELECT rowid FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM chunk_terms WHERE rowid = ?", row)
+                self._conn.execute("DELETE FROM chunks WHERE rowid = ?", row)
+
+    def search(self, query: str, k: int = 20, where: Optional[dict] = None) -> List[Tuple[str, float]]:
+        """Returns (chunk_id, bm25_score) pairs, best first. Higher scores are better.
+
+        `where` is a Chroma-style metadata filter, applied inside the query so
+        the LIMIT counts only matching chunks.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        condition, params = where_to_sql(where)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunks.id, bm25(chunk_terms) AS score FROM chunk_terms "
+                "JOIN chunks ON chunks.rowid = chunk_terms.rowid "
+                f"WHERE chunk_terms MATCH ? AND ({condition}) ORDER BY score LIMIT ?",
+                (match, *params, k),
+            ).fetchall()
+        # FTS5's bm25() is negated so that ascending order is best-first
+        return [(chunk_id, -score) for chunk_id, score in rows]
+
+    def get_documents(self, ids: List[str]) -> Dict[str, Document]:
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})", ids
+            ).fetchall()
+        return {
+            chunk_id: Document(id=chunk_id, page_content=text, metadata=json.loads(meta))
+            for chunk_id, text, meta in rows
+        }
+
+
+def reciprocal_rank_fusion(rankings: List[Tuple[List[str], float]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuses several ranked id lists; each ranking carries its own weight."""
+    scores = {}
+    for ids, weight in rankings:
+        for rank, chunk_id in enumerate(ids):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import heapq
+import json
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from app.services.metrics import LLM_QUEUE_SECONDS, LLM_SCHEDULER_EVENTS
+
+# LLM calls in flight per worker process; the rest queue by priority
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+# Answer 503 + Retry-After rather than queue a call for longer than this
+LLM_QUEUE_BUDGET_SECONDS = float(os.environ.get("LLM_QUEUE_BUDGET_SECONDS", "10"))
+# Retries of rate-limited (429) calls, with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_SECONDS = float(os.environ.get("LLM_RETRY_BASE_SECONDS", "1.0"))
+LLM_RETRY_MAX_SECONDS = float(os.environ.get("LLM_RETRY_MAX_SECONDS", "20"))
+
+# Lower runs first: a developer waiting on /explain beats context-card summaries
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+# Seconds per call assumed until real calls have been timed
+_INITIAL_CALL_SECONDS = 2.0
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing past the wait budget; `retry_after` is the expected wait in seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM capacity exhausted, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Whether an LLM client error is a 429 (Gemini reports it as RESOURCE_EXHAUSTED)."""
+    code = getattr(error, "code", None)
+    if code == 429 or getattr(error, "status_code", None) == 429:
+        return True
+    text = str(error)
+    return (type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+            or "429" in text or "RESOURCE_EXHAUSTED" in text or "rate limit" in text.lower())
+
+
+def request_key(purpose: str, payload) -> str:
+    """Coalescing key: identical prompts share one in-flight call."""
+    return f"{purpose}:{hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()}"
+
+
+class LLMScheduler:
+    """Bounded, prioritized pool for LLM calls with request coalescing, 429 retries and load shedding.
+
+    A call waits for one of `max_concurrency` slots; waiters are served by
+    priority, then arrival. A call whose expected wait (queue ahead of it x
+    smoothed call time / slots) exceeds `queue_budget` is rejected up front
+    with Overloaded, and so is one still waiting when the budget runs out,
+    so clients get a fast 503 instead of a timeout.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, queue_budget: float = LLM_QUEUE_BUDGET_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES, retry_base: float = LLM_RETRY_BASE_SECONDS,
+                 retry_max: float = LLM_RETRY_MAX_SECONDS):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_budget = queue_budget
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._active = 0
+        # (priority, arrival, future resolved when a slot is handed over)
+        self._waiters: list = []
+        self._arrivals = 0
+        self._call_seconds = _INITIAL_CALL_SECONDS
+        # coalescing key -> task of the call in flight
+        self._in_flight = {}
+
+    # --- slots ---------------------------------------------------------------
+
+    def _queued(self, priority: int = None) -> int:
+        return sum(1 for p, _, future in self._waiters if not future.done() and (priority is None or p <= priority))
+
+    def estimated_wait(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """Seconds a call of this priority would wait for a slot right now."""
+        if self._active < self.max_concurrency and not self._queued():
+            return 0.0
+        return (self._queued(priority) + 1) * self._call_seconds / self.max_concurrency
+
+    def admit(self, priority: int = PRIORITY_INTERACTIVE):
+        """Raises Overloaded if a new call would wait past the budget (checked before a response starts)."""
+        wait = self.estimated_wait(priority)
+        if wait > self.queue_budget:
+            LLM_SCHEDULER_EVENTS.inc(event="shed", priority=PRIORITY_NAMES[priority])
+            raise Overloaded(wait)
+
+    async def _acquire(self, priority: int):
+        started = time.perf_counter()
+        if self._active < self.max_concurrency and not self._queued():
+            self._active += 1
+        else:
+            self.admit(priority)
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, self._arrivals, future))
+            self._arrivals += 1
+            try:
+                await asyncio.wait_for(future, self.queue_budget)
+            except BaseException as e:
+                if future.done() and not future.cancelled():
+                    # The slot arrived just as we gave up: pass it on
+                    self._release()
+                else:
+                    future.cancel()
+                if isinstance(e, asyncio.TimeoutError):
+                    LLM_SCHEDULER_EVENTS.inc(event="shed", priority=PRIORITY_NAMES[priority])
+                    raise Overloaded(self.estimated_wait(priority)) from None
+                raise
+        LLM_QUEUE_SECONDS.observe(time.perf_counter() - started, priority=PRIORITY_NAMES[priority])
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight over, so no newcomer can jump the queue
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        """Holds one concurrency slot for the duration of the block."""
+        await self._acquire(priority)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Smoothed slot holding time, for wait estimates
+            self._call_seconds = 0.8 * self._call_seconds + 0.2 * (time.perf_counter() - started)
+            self._release()
+
+    async def _backoff(self, attempt: int, priority: int):
+        LLM_SCHEDULER_EVENTS.inc(event="retry", priority=PRIORITY_NAMES[priority])
+        # Full jitter: clients that got 429 together don't retry together
+        await asyncio.sleep(random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt)))
+
+    # --- calls ---------------------------------------------------------------
+
+    async def _call(self, call: Callable[[], Awaitable], priority: int):
+        for attempt in range(self.max_retries + 1):
+            # The slot is given up while backing off
+            async with self.slot(priority):
+                try:
+                    return await call()
+                except Exception as e:
+                    if not is_rate_limited(e) or attempt == self.max_retries:
+                        raise
+            await self._backoff(attempt, priority)
+
+    async def run(self, call: Callable[[], Awaitable], priority: int = PRIORITY_INTERACTIVE, key: Optional[str] = None):
+        """Runs `call()` in a slot; concurrent runs with the same `key` share a single call."""
+        if key is None:
+            return await self._call(call, priority)
+        task = self._in_flight.get(key)
+        if task is None:
+            # A task of its own, so a caller that disconnects doesn't cancel the others' result
+            task = self._in_flight[key] = asyncio.ensure_future(self._call(call, priority))
+            task.add_done_callback(lambda t: self._in_flight.pop(key, None) if self._in_flight.get(key) is t else None)
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        else:
+            LLM_SCHEDULER_EVENTS.inc(event="coalesced", priority=PRIORITY_NAMES[priority])
+        return await asyncio.shield(task)
+
+    async def stream(self, make_stream: Callable[[], AsyncIterator], priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator:
+        """Yields from `make_stream()` while holding a slot; a 429 is retried only before the first item."""
+        for attempt in range(self.max_retries + 1):
+            started_output = False
+            async with self.slot(priority):
+                try:
+                    async for item in make_stream():
+                        started_output = True
+                        yield item
+                    return
+                except Exception as e:
+                    if started_output or not is_rate_limited(e) or attempt == self.max_retries:
+                        raise
+            await self._backoff(attempt, priority)
+
+    def stats(self) -> dict:
+        return {"active": self._active, "queued": self._queued(), "max_concurrency": self.max_concurrency,
+                "call_seconds": round(self._call_seconds, 3)}
+
+    def collect(self) -> List[str]:
+        """Slot usage as Prometheus gauges (for metrics.REGISTRY.add_collector)."""
+        stats = self.stats()
+        return [
+            "# TYPE contextsync_llm_slots_active gauge", f"contextsync_llm_slots_active {stats['active']}",
+            "# TYPE contextsync_llm_queued gauge", f"contextsync_llm_queued {stats['queued']}",
+        ]
+
+
+# One pool per worker process, shared by every request
+scheduler = LLMScheduler()
@@ -0,0 +1,189 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+# Attach a Server-Timing header with per-stage durations to every response
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+# Seconds; spans from sub-millisecond cache lookups up to slow LLM generations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Per-request list of (stage, seconds); set by the HTTP middleware
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _labels_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition format."""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_labels_text(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels_text(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_labels_text(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds metrics plus collectors that report externally tracked values at scrape time."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "contextsync_stage_duration_seconds", "Time spent in each retrieval, generation and sync stage.", ("stage",)
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "contextsync_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")
+)
+LLM_CALLS = REGISTRY.counter("contextsync_llm_calls_total", "LLM invocations by purpose.", ("purpose",))
+TOKENS = REGISTRY.counter(
+    "contextsync_tokens_total", "Tokens sent to / received from the LLM (estimated with the context packer's tokenizer).",
+    ("purpose", "direction")
+)
+LLM_QUEUE_SECONDS = REGISTRY.histogram(
+    "contextsync_llm_queue_wait_seconds", "Time LLM calls waited for a concurrency slot.", ("priority",)
+)
+LLM_SCHEDULER_EVENTS = REGISTRY.counter(
+    "contextsync_llm_scheduler_events_total", "LLM calls coalesced, retried after 429s or shed under load.",
+    ("event", "priority")
+)
+SYNC_RUNS = REGISTRY.counter("contextsync_sync_runs_total", "Sync passes by outcome.", ("status",))
+SYNC_ITEMS = REGISTRY.counter("contextsync_sync_items_total", "Items fetched and chunks written by sync.", ("kind",))
+
+
+def _record(stage: str, elapsed: float):
+    STAGE_SECONDS.observe(elapsed, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, elapsed))
+
+
+@contextmanager
+def span(stage: str):
+    """Times a block into the stage histogram and the current request's Server-Timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(stage, time.perf_counter() - start)
+
+
+def start_request_timings() -> list:
+    """Begins collecting spans for the current request; returns the list spans are appended to."""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Formats spans as `stage;dur=ms`, summing repeated stages (e.g. batched requests)."""
+    totals = {}
+    for stage, elapsed in timings:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items())
+
+
+def cache_collector(stats_fn: Callable[[], Dict[str, dict]]) -> Callable[[], List[str]]:
+    """Exposes caches' existing stats() dicts ({cache: {hits, misses, ...}}) as gauges."""
+    def collect() -> List[str]:
+        stats = stats_fn()
+        lines = []
+        for field in ("hits", "misses", "entries", "evictions", "hit_rate"):
+            metric = f"contextsync_cache_{field}"
+            series = [f'{metric}{{cache="{name}"}} {values[field]}' for name, values in stats.items() if field in values]
+            if series:
+                lines.append(f"# TYPE {metric} gauge")
+                lines.extend(series)
+        return lines
+    return collect
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, List, Tuple
+
+from app.services.metrics import span
+
+# Tunables for the fetch -> chunk/embed -> write pipeline
+FETCH_CONCURRENCY = int(os.environ.get("PIPELINE_FETCH_CONCURRENCY", "8"))
+QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "32"))
+BATCH_SIZE = int(os.environ.get("PIPELINE_BATCH_SIZE", "64"))
+EMBED_WORKERS = int(os.environ.get("PIPELINE_EMBED_WORKERS", "4"))
+
+_DONE = object()
+
+# A fetch job is (key, blocking callable returning (documents, cursor))
+FetchJob = Tuple[str, Callable[[], Tuple[list, Any]]]
+
+
+class IngestionPipeline:
+    """Concurrent fetchers feeding batched chunk/embed workers and a single Chroma writer.
+
+    Blocking client calls run in worker threads so one slow API never stalls
+    the event loop or the other sources. Queues are bounded, so a slow
+    embedding API applies back-pressure to the fetchers instead of buffering
+    the whole backlog in memory.
+    """
+
+    def __init__(self, rag_service, fetch_concurrency: int = FETCH_CONCURRENCY, queue_size: int = QUEUE_SIZE,
+                 batch_size: int = BATCH_SIZE, embed_workers: int = EMBED_WORKERS):
+        self.rag_service = rag_service
+        self.fetch_concurrency = fetch_concurrency
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.embed_workers = embed_workers
+
+    async def run(self, jobs: List[FetchJob]) -> dict:
+        """Runs every job through the pipeline; returns stats and the cursors of jobs that succeeded."""
+        fetch_queue = asyncio.Queue(maxsize=self.queue_size)
+        write_queue = asyncio.Queue(maxsize=self.queue_size)
+        fetch_slots = asyncio.Semaphore(self.fetch_concurrency)
+        stats = {"items_fetched": 0, "chunks_written": 0, "chunks_deleted": 0, "failed_sources": [], "cursors": {},
+                 "written_ids": [], "deleted_ids": []}
+        started = time.perf_counter()
+
+        async def fetch(key, fetch_fn):
+            async with fetch_slots:
+                try:
+                    with span("sync_fetch"):
+                        docs, cursor = await asyncio.to_thread(fetch_fn)
+                except Exception as e:
+                    print(f"Fetch failed for {key}: {e}")
+                    stats["failed_sources"].append(key)
+                    return
+            stats["items_fetched"] += len(docs)
+            for start in range(0, len(docs), self.batch_size):
+                await fetch_queue.put(docs[start:start + self.batch_size])
+            stats["cursors"][key] = cursor
+
+        async def produce():
+            await asyncio.gather(*(fetch(key, fn) for key, fn in jobs))
+            for _ in range(self.embed_workers):
+                await fetch_queue.put(_DONE)
+
+        async def embed_worker():
+            while True:
+                batch = await fetch_queue.get()
+                if batch is _DONE:
+                    return
+                with span("sync_split"):
+                    ids, chunks, stale_ids = await asyncio.to_thread(self.rag_service.prepare_chunks, batch)
+                vectors = []
+                if chunks:
+                    with span("sync_embed"):
+                        vectors = await asyncio.to_thread(self.rag_service.embed_chunks, chunks)
+                if chunks or stale_ids:
+                    await write_queue.put((ids, chunks, vectors, stale_ids))
+
+        async def close_writer(workers):
+            await asyncio.gather(*workers)
+            await write_queue.put(_DONE)
+
+        async def write():
+            # Single writer: Chroma's SQLite backend does not like concurrent writers
+            while True:
+                item = await write_queue.get()
+                if item is _DONE:
+                    return
+                ids, chunks, vectors, stale_ids = item
+                with span("sync_write"):
+                    await asyncio.to_thread(self.rag_service.write_chunks, ids, chunks, vectors, stale_ids)
+                stats["chunks_written"] += len(ids)
+                stats["chunks_deleted"] += len(stale_ids)
+                stats["written_ids"].extend(ids)
+                stats["deleted_ids"].extend(stale_ids)
+
+        workers = [asyncio.create_task(embed_worker()) for _ in range(self.embed_workers)]
+        tasks = [asyncio.create_task(produce()), asyncio.create_task(close_writer(workers)), asyncio.create_task(write())]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed worker or writer must not leave fetchers blocked on a full queue
+            for task in tasks + workers:
+                task.cancel()
+            raise
+        stats["seconds"] = time.perf_counter() - started
+        stats["chunks_per_second"] = stats["chunks_written"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
@@ -0,0 +1,495 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from app.services.filters import where_to_sql
+
+# IVF lists; 0 picks ~sqrt(rows) when the index is trained
+QUANTIZED_NLIST = int(os.environ.get("QUANTIZED_NLIST", "0"))
+# Lists scanned per query; more is slower but closer to exact
+QUANTIZED_NPROBE = int(os.environ.get("QUANTIZED_NPROBE", "16"))
+# Shortlist size (as a multiple of k) re-scored against the full-precision vectors
+QUANTIZED_RESCORE_FACTOR = int(os.environ.get("QUANTIZED_RESCORE_FACTOR", "4"))
+# Below this many rows every query is a flat int8 scan (no IVF training)
+QUANTIZED_IVF_MIN_ROWS = int(os.environ.get("QUANTIZED_IVF_MIN_ROWS", "20000"))
+# On-disk full-precision copy the shortlist is re-scored against: float16 (half of float32's disk, no
+# measurable recall cost), float32 (exact) or none (int8 scores are final; disk shrinks ~3x further, recall drops)
+QUANTIZED_RESCORE_DTYPE = os.environ.get("QUANTIZED_RESCORE_DTYPE", "float16")
+
+# Metadata held as in-memory columns so filtered queries never touch SQLite
+CATEGORICAL_COLUMNS = ("source", "channel", "status")
+NUMERIC_COLUMNS = ("timestamp_epoch",)
+# Filters matching at most this many rows skip the IVF probe and scan exactly those rows
+FILTERED_SCAN_ROWS = 50000
+_BLOCK_ROWS = 65536
+_SQL_VARS = 900
+
+
+class _Mapped:
+    """A growable raw array file, memory-mapped."""
+
+    def __init__(self, path: str, dtype, width: int = None, fill=0):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.fill = fill
+        self.array = None
+
+    def _row_bytes(self) -> int:
+        return self.dtype.itemsize * (self.width or 1)
+
+    def capacity(self) -> int:
+        return os.path.getsize(self.path) // self._row_bytes() if os.path.exists(self.path) else 0
+
+    def open(self, capacity: int):
+        old = self.capacity()
+        if capacity > old:
+            with open(self.path, "ab") as f:
+                f.truncate(capacity * self._row_bytes())
+        capacity = max(capacity, old)
+        shape = (capacity, self.width) if self.width else (capacity,)
+        # np.memmap refuses empty files
+        self.array = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=shape) if capacity else np.zeros(shape, self.dtype)
+        if capacity > old and self.fill != 0:
+            self.array[old:] = self.fill
+
+    def flush(self):
+        if isinstance(self.array, np.memmap):
+            self.array.flush()
+
+
+class QuantizedVectorStore:
+    """Chroma-collection-compatible store of int8-quantized vectors in memory-mapped files.
+
+    Per chunk it keeps a `dim`-byte int8 code plus one float32 scale in RAM
+    (4x smaller than float32; 3072-dim Gemini vectors drop from 12 KB to 3 KB),
+    a full-precision copy on disk that only the shortlisted candidates are
+    read from, and filterable metadata as columns. Documents and full
+    metadata live in a SQLite side table. With the default float16 copy the
+    files total 3 bytes per dimension, i.e. only 25% less disk than float32;
+    QUANTIZED_RESCORE_DTYPE=none drops the copy (1 byte per dimension) and
+    ranks by the int8 scores alone.
+
+    Search: an IVF coarse quantizer (k-means centroids, trained once the store
+    holds QUANTIZED_IVF_MIN_ROWS) picks QUANTIZED_NPROBE lists, their int8
+    codes are scored, and the top k * QUANTIZED_RESCORE_FACTOR are re-scored
+    exactly. Vectors are L2-normalized and distances are cosine (1 - cos).
+
+    Implements the subset of the Chroma collection API RAGService uses:
+    query, get, upsert, delete, count and metadata.
+    """
+
+    metadata = {"hnsw:space": "cosine"}
+
+    def __init__(self, path: str):
+        if np is None:
+            raise ImportError("VECTOR_BACKEND=quantized requires `pip install numpy`")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._arrays = None
+        self._conn = sqlite3.connect(os.path.join(path, "rows.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT NOT NULL)"
+        )
+        # prepare_chunks looks chunks up by source_id on every write batch
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rows_source_id ON rows(json_extract(metadata, '$.source_id'))")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._load()
+
+    # --- storage -------------------------------------------------------------
+
+    def _state(self, key: str, default=None):
+        row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_state(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        self.dim = self._state("dim")
+        # Fixed when the first vector arrives: a copy that was never written can't be turned on later
+        self.rescore_dtype = self._state("rescore_dtype", QUANTIZED_RESCORE_DTYPE)
+        self.size = self._state("size", 0)
+        self.vocab: Dict[str, List[str]] = self._state("vocab", {field: [] for field in CATEGORICAL_COLUMNS})
+        self._codes_of = {field: {value: i + 1 for i, value in enumerate(values)} for field, values in self.vocab.items()}
+        self.trained_rows = self._state("trained_rows", 0)
+        centroids_path = self._file("centroids.npy")
+        self.centroids = np.load(centroids_path) if self.trained_rows and os.path.exists(centroids_path) else None
+        self._lists = None
+        if self.dim is not None:
+            self._open_arrays(max(self.size, 1))
+
+    def _open_arrays(self, capacity: int):
+        if self._arrays is None:
+            self._arrays = {
+                "codes": _Mapped(self._file("codes.i8"), np.int8, self.dim),
+                "scales": _Mapped(self._file("scales.f4"), np.float32),
+                **({"full": _Mapped(self._file(f"full.{self.rescore_dtype}"), self.rescore_dtype, self.dim)}
+                   if self.rescore_dtype != "none" else {}),
+                "alive": _Mapped(self._file("alive.u1"), np.uint8),
+                "assign": _Mapped(self._file("assign.i4"), np.int32, fill=-1),
+                **{f"cat_{f}": _Mapped(self._file(f"cat_{f}.i4"), np.int32) for f in CATEGORICAL_COLUMNS},
+                **{f"num_{f}": _Mapped(self._file(f"num_{f}.f8"), np.float64, fill=np.nan) for f in NUMERIC_COLUMNS},
+            }
+        for mapped in self._arrays.values():
+            mapped.open(capacity)
+
+    def _ensure_capacity(self, rows: int):
+        capacity = self._arrays["codes"].capacity()
+        if rows > capacity:
+            # Double, so appends stay amortized O(1)
+            self._open_arrays(max(rows, capacity * 2, 1024))
+
+    def _array(self, name: str):
+        mapped = self._arrays.get(name)
+        return mapped.array if mapped else None
+
+    def reset(self):
+        """Drops every vector (e.g. before re-embedding with a model of another dimension)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM rows")
+            self._conn.execute("DELETE FROM state")
+            self._conn.commit()
+            for name in os.listdir(self.path):
+                if not name.startswith("rows.sqlite3"):
+                    os.remove(self._file(name))
+            self._arrays = None
+            self._load()
+
+    # --- writes --------------------------------------------------------------
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _category(self, field: str, value) -> int:
+        if value is None:
+            return 0
+        value = str(value)
+        code = self._codes_of[field].get(value)
+        if code is None:
+            self.vocab[field].append(value)
+            code = self._codes_of[field][value] = len(self.vocab[field])
+        return code
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str] = None, metadatas: List[dict] = None):
+        if not ids:
+            return
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._set_state("dim", self.dim)
+                self._set_state("rescore_dtype", self.rescore_dtype)
+                self._open_arrays(1024)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dim}")
+
+            # Existing IDs are rewritten in place; a batch repeating an ID keeps its last occurrence
+            slots = self._rows_for(ids)
+            positions = {}
+            for position, chunk_id in enumerate(ids):
+                if chunk_id not in slots:
+                    slots[chunk_id] = self.size
+                    self.size += 1
+                positions[chunk_id] = position
+            self._ensure_capacity(self.size)
+            keep = sorted(positions.values())
+            rows = np.array([slots[ids[p]] for p in keep], dtype=np.int64)
+            vectors = vectors[keep]
+
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._array("codes")[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._array("scales")[rows] = scales
+            if self._array("full") is not None:
+                self._array("full")[rows] = vectors.astype(self._array("full").dtype)
+            self._array("alive")[rows] = 1
+            for field in CATEGORICAL_COLUMNS:
+                self._array(f"cat_{field}")[rows] = [self._category(field, (metadatas[p] or {}).get(field)) for p in keep]
+            for field in NUMERIC_COLUMNS:
+                self._array(f"num_{field}")[rows] = [
+                    float(value) if (value := (metadatas[p] or {}).get(field)) is not None else np.nan for p in keep
+                ]
+            if self.centroids is not None:
+                self._array("assign")[rows] = self._nearest_centroids(vectors)
+                self._lists = None
+
+            for mapped in self._arrays.values():
+                mapped.flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rows (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(int(slots[ids[p]]), ids[p], documents[p], json.dumps(metadatas[p] or {})) for p in keep],
+            )
+            self._set_state("size", self.size)
+            self._set_state("vocab", self.vocab)
+            self._conn.commit()
+
+            alive = self.count()
+            if (self.centroids is None and alive >= QUANTIZED_IVF_MIN_ROWS) or \
+                    (self.centroids is not None and alive >= 4 * self.trained_rows):
+                self.train()
+
+    def delete(self, ids: List[str] = None):
+        if not ids:
+            return
+        with self._lock:
+            rows = list(self._rows_for(ids).values())
+            if not rows:
+                return
+            self._array("alive")[np.array(rows, dtype=np.int64)] = 0
+            self._arrays["alive"].flush()
+            for start in range(0, len(ids), _SQL_VARS):
+                batch = ids[start:start + _SQL_VARS]
+                self._conn.execute(f"DELETE FROM rows WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+
+    # --- IVF -----------------------------------------------------------------
+
+    def _nearest_centroids(self, vectors) -> "np.ndarray":
+        result = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), _BLOCK_ROWS):
+            block = vectors[start:start + _BLOCK_ROWS]
+            result[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return result
+
+    def _dequantized(self, rows) -> "np.ndarray":
+        return self._array("codes")[rows].astype(np.float32) * self._array("scales")[rows][:, None]
+
+    def train(self, iterations: int = 10, sample_size: int = 65536, seed: int = 0):
+        """(Re)trains the IVF centroids with spherical k-means and reassigns every row."""
+        with self._lock:
+            alive_rows = np.flatnonzero(self._array("alive")[:self.size])
+            if len(alive_rows) == 0:
+                return
+            nlist = QUANTIZED_NLIST or max(1, int(np.sqrt(len(alive_rows))))
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(alive_rows, size=min(sample_size, len(alive_rows)), replace=False))
+            sample = self._normalize(self._dequantized(sample_rows))
+            centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, sample)
+                empty = np.bincount(assignment, minlength=len(centroids)) == 0
+                # Empty lists are reseeded from random sample points
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+                centroids = self._normalize(sums)
+            self.centroids = centroids.astype(np.float32)
+            np.save(self._file("centroids.npy"), self.centroids)
+
+            assign = self._array("assign")
+            for start in range(0, self.size, _BLOCK_ROWS):
+                end = min(start + _BLOCK_ROWS, self.size)
+                assign[start:end] = self._nearest_centroids(self._dequantized(np.arange(start, end)))
+            self._arrays["assign"].flush()
+            self._lists = None
+            self.trained_rows = len(alive_rows)
+            self._set_state("trained_rows", self.trained_rows)
+            self._conn.commit()
+            print(f"Quantized store: trained {len(self.centroids)} IVF lists on {len(alive_rows)} vectors.")
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            assign = self._array("assign")[:self.size]
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, bounds)
+        return self._lists
+
+    # --- reads ---------------------------------------------------------------
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def _rows_for(self, ids: List[str]) -> Dict[str, int]:
+        found = {}
+        for start in range(0, len(ids), _SQL_VARS):
+            batch = ids[start:start + _SQL_VARS]
+            found.update(self._conn.execute(
+                f"SELECT id, row FROM rows WHERE id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        return found
+
+    def _field_mask(self, field: str, condition):
+        operator, expected = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+        if field in CATEGORICAL_COLUMNS and operator in ("$eq", "$ne", "$in"):
+            values = expected if operator == "$in" else [expected]
+            codes = [self._codes_of[field][str(v)] for v in values if str(v) in self._codes_of[field]]
+            mask = np.isin(self._array(f"cat_{field}")[:self.size], codes)
+            return ~mask if operator == "$ne" else mask
+        if field in NUMERIC_COLUMNS and operator not in ("$in",):
+            column = self._array(f"num_{field}")[:self.size]
+            compare = {"$eq": np.equal, "$ne": np.not_equal, "$gt": np.greater, "$gte": np.greater_equal,
+                       "$lt": np.less, "$lte": np.less_equal}[operator]
+            return compare(column, float(expected))
+        # Anything else is answered by the metadata table
+        sql, params = where_to_sql({field: condition}, column="metadata")
+        mask = np.zeros(self.size, dtype=bool)
+        rows = [row for row, in self._conn.execute(f"SELECT row FROM rows WHERE {sql}", params)]
+        mask[rows] = True
+        return mask
+
+    def _where_mask(self, where: dict):
+        mask = None
+        for key, value in where.items():
+            if key == "$and":
+                part = np.logical_and.reduce([self._where_mask(clause) for clause in value])
+            elif key == "$or":
+                part = np.logical_or.reduce([self._where_mask(clause) for clause in value])
+            else:
+                part = self._field_mask(key, value)
+            mask = part if mask is None else mask & part
+        return mask
+
+    def _snapshot(self, where: Optional[dict]) -> dict:
+        """Everything a query scans, taken under the lock so the scan itself can run without it.
+
+        Writers replace these arrays rather than resizing them in place, so the
+        snapshot stays valid; a row rewritten mid-scan may score from a mix of
+        its old and new vector, which a search can tolerate.
+        """
+        alive = self._array("alive")[:self.size].astype(bool)
+        if where:
+            alive &= self._where_mask(where)
+        return {
+            "alive": alive, "filtered": bool(where), "centroids": self.centroids,
+            "lists": self._inverted_lists() if self.centroids is not None else None,
+            "codes": self._array("codes"), "scales": self._array("scales"), "full": self._array("full"),
+        }
+
+    @staticmethod
+    def _candidates(query, snapshot: dict) -> "np.ndarray":
+        alive = snapshot["alive"]
+        if snapshot["filtered"] and alive.sum() <= FILTERED_SCAN_ROWS:
+            # Selective filter: scanning just the matching rows beats probing (and never misses any)
+            return np.flatnonzero(alive)
+        if snapshot["centroids"] is None:
+            return np.flatnonzero(alive)
+        order, bounds = snapshot["lists"]
+        probe = np.argsort(-(snapshot["centroids"] @ query))[:QUANTIZED_NPROBE]
+        rows = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in probe])
+        return rows[alive[rows]]
+
+    def _search(self, query, k: int, snapshot: dict):
+        rows = self._candidates(query, snapshot)
+        if len(rows) == 0:
+            return rows, np.empty(0, dtype=np.float32)
+        # Approximate scores from the int8 codes, block by block to bound temporaries
+        approx = np.empty(len(rows), dtype=np.float32)
+        codes, scales, full = snapshot["codes"], snapshot["scales"], snapshot["full"]
+        for start in range(0, len(rows), _BLOCK_ROWS):
+            block = rows[start:start + _BLOCK_ROWS]
+            approx[start:start + len(block)] = (codes[block].astype(np.float32) @ query) * scales[block]
+        shortlist_size = min(len(rows), k * QUANTIZED_RESCORE_FACTOR if full is not None else k)
+        picked = np.argpartition(-approx, shortlist_size - 1)[:shortlist_size]
+        if full is None:
+            # No full-precision copy: the int8 scores are final
+            top = picked[np.argsort(-approx[picked])]
+            return rows[top], 1.0 - approx[top]
+        # Sorted, so the exact re-scoring below reads the full-precision file front to back
+        shortlist = np.sort(rows[picked])
+        exact = full[shortlist].astype(np.float32) @ query
+        top = np.argsort(-exact)[:k]
+        return shortlist[top], 1.0 - exact[top]
+
+    def _fetch(self, rows: List[int], include) -> Dict[int, tuple]:
+        found = {}
+        for start in range(0, len(rows), _SQL_VARS):
+            batch = rows[start:start + _SQL_VARS]
+            for row, chunk_id, document, meta in self._conn.execute(
+                f"SELECT row, id, document, metadata FROM rows WHERE row IN ({','.join('?' * len(batch))})", batch
+            ):
+                found[row] = (chunk_id, document, json.loads(meta))
+        return found
+
+    def query(self, query_embeddings, n_results: int = 10, where: dict = None,
+              include=("documents", "metadatas", "distances")) -> dict:
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            if not self.dim:
+                return {key: [[] for _ in query_embeddings] for key in result}
+            snapshot = self._snapshot(where)
+        # The scan runs unlocked, so writes (and other queries' row fetches) aren't held up by it
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+        searched = [self._search(query, n_results, snapshot) for query in queries]
+        with self._lock:
+            for rows, distances in searched:
+                found = self._fetch([int(r) for r in rows], include)
+                hits = [(found[int(r)], float(d)) for r, d in zip(rows, distances) if int(r) in found]
+                result["ids"].append([chunk_id for (chunk_id, _, _), _ in hits])
+                result["documents"].append([document for (_, document, _), _ in hits])
+                result["metadatas"].append([meta for (_, _, meta), _ in hits])
+                result["distances"].append([distance for _, distance in hits])
+        return result
+
+    def get(self, ids: List[str] = None, where: dict = None, limit: int = None, offset: int = None,
+            include=("documents", "metadatas")) -> dict:
+        conditions, params = [], []
+        if where:
+            sql, where_params = where_to_sql(where, column="metadata")
+            conditions.append(sql)
+            params.extend(where_params)
+        with self._lock:
+            if ids is not None:
+                rows = []
+                for start in range(0, len(ids), _SQL_VARS):
+                    batch = ids[start:start + _SQL_VARS]
+                    batch_sql = " AND ".join(conditions + [f"id IN ({','.join('?' * len(batch))})"])
+                    rows.extend(self._conn.execute(
+                        f"SELECT row, id, document, metadata FROM rows WHERE {batch_sql} ORDER BY row", params + batch
+                    ).fetchall())
+            else:
+                sql = f"SELECT row, id, document, metadata FROM rows WHERE {' AND '.join(conditions) or '1'} ORDER BY row"
+                if limit is not None:
+                    sql += f" LIMIT {int(limit)} OFFSET {int(offset or 0)}"
+                rows = self._conn.execute(sql, params).fetchall()
+            result = {
+                "ids": [chunk_id for _, chunk_id, _, _ in rows],
+                "documents": [document for _, _, document, _ in rows] if "documents" in include else None,
+                "metadatas": [json.loads(meta) for _, _, _, meta in rows] if "metadatas" in include else None,
+            }
+            if "embeddings" in include:
+                row_numbers = np.array([row for row, _, _, _ in rows], dtype=np.int64)
+                if not len(row_numbers):
+                    result["embeddings"] = []
+                elif self._array("full") is not None:
+                    result["embeddings"] = self._array("full")[row_numbers].astype(np.float32).tolist()
+                else:
+                    result["embeddings"] = self._normalize(self._dequantized(row_numbers)).tolist()
+        return result
+
+    # --- accounting ----------------------------------------------------------
+
+    def nbytes(self) -> dict:
+        """Bytes on disk per component, and the part that has to stay resident for fast search."""
+        if self._arrays is None:
+            # Nothing stored yet
+            return {"disk": 0, "resident": 0}
+        sizes = {name: os.path.getsize(mapped.path) for name, mapped in self._arrays.items() if os.path.exists(mapped.path)}
+        sizes["sqlite"] = sum(os.path.getsize(self._file(n)) for n in os.listdir(self.path) if n.startswith("rows.sqlite3"))
+        resident = sum(size for name, size in sizes.items() if name not in ("full", "sqlite"))
+        return {"disk": sum(sizes.values()), "resident": resident, **sizes}
+
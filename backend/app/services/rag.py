@@ -1,138 +1,808 @@
 # app/services/rag.py
 
+import asyncio
+import contextvars
+import hashlib
+import json
+import math
 import os
 import re
-from functools import lru_cache
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_chroma import Chroma
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
-from app.models import ContextObject
-from typing import List
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.models import ContextObject, RetrievalFilters
+from app.services.answer_cache import AnswerCache, normalize_snippet
+from app.services.code_index import CodeIndex
+from app.services.context_packer import count_tokens, pack_context
+from app.services.embedding_cache import content_hash
+from app.services.embeddings import build_embeddings
+from app.services.filters import PARTITION_PREFIX, RETRIEVAL_PARTITIONS, filter_key, matches, partitions_for, route, to_where
+from app.services.llm_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, request_key, scheduler
+from app.services.metrics import LLM_CALLS, TOKENS, span
+from app.services.quantized_store import QuantizedVectorStore
+from app.services.lexical import LexicalIndex, STOP_WORDS, reciprocal_rank_fusion
+from app.services.rerank import build_reranker
+from app.services.snapshots import INDEX_MEMORY_DIR, copy_to_memory, current_generation, prune_memory_copies, resolve_db_path
+from app.services.summary_store import SummaryStore, build_batch_prompt, parse_batch_response
+from typing import List, Optional, Tuple
+
+# Retrieval (query embedding + vector search) is blocking, so it runs on its own pool
+RETRIEVAL_THREADS = int(os.environ.get("RETRIEVAL_THREADS", "8"))
+RETRIEVAL_CONCURRENCY = int(os.environ.get("RETRIEVAL_CONCURRENCY", "16"))
+
+# Hybrid retrieval: BM25 and vector rankings fused with reciprocal rank fusion
+HYBRID_LEXICAL_WEIGHT = float(os.environ.get("HYBRID_LEXICAL_WEIGHT", "1.0"))
+HYBRID_VECTOR_WEIGHT = float(os.environ.get("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", "60"))
+LEXICAL_CANDIDATES = int(os.environ.get("LEXICAL_CANDIDATES", "20"))
+
+# Relevance cutoff (0-1, higher is closer) and adaptive k: drop anything this far below the best hit
+MIN_RELEVANCE_SCORE = float(os.environ.get("MIN_RELEVANCE_SCORE", "0.35"))
+RELEVANCE_MARGIN = float(os.environ.get("RELEVANCE_MARGIN", "0.2"))
+# With no context above the bar, answer without calling the LLM
+SKIP_LLM_WITHOUT_CONTEXT = os.environ.get("SKIP_LLM_WITHOUT_CONTEXT", "true").lower() == "true"
+
+# chroma (HNSW over float32) or quantized (int8 memmap + IVF, see quantized_store.py)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma").lower()
+
+EXPLAIN_SYSTEM_PROMPT = """You are ContextSync, an AI assistant that bridges the gap between Code and Context (Slack/Jira).
+
+### 🧠 Reasoning Loop
+Before answering, analyze the provided CONTEXT against the CODE SNIPPET.
+1.  **Analyze Intent**: What is the code trying to do?
+2.  **Verify Match**: Does the Slack thread or Jira ticket explicitly mention this feature, variable, or bug?
+3.  **Filter Noise**: Ignore context that is about a different part of the system, even if keywords match.
+
+### 📝 Output Format (Markdown)
+
+## ⚡ Context Analysis
+* **Relevance**: [High/Medium/Low] - [One sentence explanation]
+
+## 💡 Intent & Backstory
+[Explain *why* this code exists based on the filtered context]
+
+### 🔍 Decision Trail
+- **[Source: Date/Author]**: [Key insight directly related to this code]
+
+### 🔗 References
+- [Link/ID] - [Title]
+
+If NO relevant context is found, state: "No direct Slack/Jira context found for this logic." and provide a technical explanation only.
+"""
+
+EXPLAIN_USER_PROMPT = "Context:\n{context}\n\nCode ({file_path}:{line_numbers}):\n```python\n{code}\n```"
+
+NO_CONTEXT_MARKDOWN = """## ⚡ Context Analysis
+* **Relevance**: Low - No direct Slack/Jira context found for this logic.
+"""
+
+# Max documents summarized by one multi-document LLM call
+SUMMARY_BATCH_SIZE = int(os.environ.get("SUMMARY_BATCH_SIZE", "10"))
+
+# Write path: texts per embedding request (Gemini's batchEmbedContents takes up to 100),
+# requests in flight at once, and records per Chroma upsert
+EMBED_REQUEST_SIZE = int(os.environ.get("EMBED_REQUEST_SIZE", "100"))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+WRITE_BATCH_SIZE = int(os.environ.get("WRITE_BATCH_SIZE", "1000"))
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+
+# Stable chunk IDs; anything else is an MD5 content key from before them
+_CHUNK_ID_RE = re.compile(r"^[^:]+:.+:\d+$")
+
+
+def source_id_of(doc: Document) -> str:
+    """Identifies the ticket/message/thread a document came from."""
+    source_id = doc.metadata.get("source_id")
+    if source_id:
+        return source_id
+    # Ad-hoc documents without a natural ID are keyed by their content
+    return hashlib.md5(doc.page_content.encode()).hexdigest()
+
+
+def split_documents(documents: List[Document], text_splitter) -> dict:
+    """Splits documents into {chunk_id: chunk} with stable `source:source_id:chunk_index` IDs.
+
+    Pure function of its input, so bulk imports can run it in worker processes.
+    """
+    # The newest version of each source item wins if a batch holds several
+    latest = {}
+    for doc in documents:
+        latest[(doc.metadata.get("source", "unknown"), source_id_of(doc))] = doc
+
+    by_id = {}
+    for (source, source_id), doc in latest.items():
+        # Metadata is part of the hash: a status change must reach the filterable copy too
+        meta_json = json.dumps(doc.metadata, sort_keys=True, default=str)
+        for index, text in enumerate(text_splitter.split_text(doc.page_content)):
+            metadata = {**doc.metadata, "source_id": source_id, "chunk_index": index,
+                        "content_hash": content_hash(f"{text}\n{meta_json}")}
+            by_id[f"{source}:{source_id}:{index}"] = Document(page_content=text, metadata=metadata)
+    return by_id
 
 class RAGService:
-    def __init__(self):
-        self._init_resources()
+    def __init__(self, db_path: str = None, embeddings=None, llm=None, read_only: bool = False):
+        # Optional overrides let benchmarks run against local fakes
+        self._embeddings_override = embeddings
+        # Query workers share the leader's index and must never write (or backfill) it
+        self.read_only = read_only
+        self._llm_override = llm
+        self._retrieval_executor = ThreadPoolExecutor(
+            max_workers=RETRIEVAL_THREADS, thread_name_prefix="retrieval"
+        )
+        # event loop -> its retrieval semaphore (a semaphore binds to the first loop it waits on)
+        self._retrieval_slots = weakref.WeakKeyDictionary()
+        self.answer_cache = AnswerCache()
+        self.summary_store = SummaryStore()
+        # content hash -> future of the batch currently summarizing it
+        self._summaries_in_flight = {}
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        self._embed_executor = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY, thread_name_prefix="embed")
+        # partition name -> raw Chroma collection
+        self._partitions = {}
+        self._partitioned = False
+        # Requests running on this instance; one replaced by a reload is closed once none are left
+        self.users = 0
+        # Recency/status reranking over an over-fetched candidate set (None = fused order)
+        self.reranker = build_reranker()
+        self._init_resources(db_path)
     
     @lru_cache(maxsize=1)
     def _get_embeddings(self):
-        return GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001")
+        if self._embeddings_override is not None:
+            return self._embeddings_override
+        # Provider comes from EMBEDDING_PROVIDER; remote/model-backed ones are cached on disk
+        return build_embeddings()
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters for the embedding, answer and summary caches."""
+        embeddings = self._get_embeddings()
+        stats = {
+            "answers": self.answer_cache.stats(),
+            "summaries": self.summary_store.stats()
+        }
+        # Providers that are cheaper to recompute (hashing) run without the embedding cache
+        if hasattr(embeddings, "cache"):
+            stats["embeddings"] = embeddings.cache.stats()
+        return stats
 
-    def _init_resources(self):
+    def _init_resources(self, db_path: str = None):
         """Initialize ChromaDB and LLM."""
-        # Calculate absolute path to backend root
-        current_dir = os.path.dirname(os.path.abspath(__file__)) # app/services
-        backend_root = os.path.dirname(os.path.dirname(current_dir)) # backend
-        db_path = os.path.join(backend_root, "chroma_db")
+        if db_path is None:
+            # The promoted index generation (or the legacy backend/chroma_db)
+            db_path = resolve_db_path()
+        self.db_path = db_path
         
         try:
-            self.db = Chroma(
-                persist_directory=db_path, 
+            if self.read_only and INDEX_MEMORY_DIR and db_path == resolve_db_path() and current_generation() is not None:
+                # Query workers serve a RAM copy of the promoted generation; nothing writes to either
+                db_path = copy_to_memory(db_path)
+                prune_memory_copies()
+            # Directory actually opened (the RAM copy, if any), for close()
+            self._opened_path = db_path
+            if VECTOR_BACKEND == "quantized":
+                self.db = QuantizedVectorStore(os.path.join(db_path, "quantized"))
+                self.store = self.db
+            else:
+                self.db = Chroma(
+                    persist_directory=db_path, 
+                    embedding_function=self._get_embeddings()
+                )
+                # Raw collection: ids, vectors and where filters without LangChain's wrapping
+                self.store = self.db._collection
+            # The quantized store filters on in-memory columns, so it needs no partition copies
+            self._partitioned = bool(RETRIEVAL_PARTITIONS) and VECTOR_BACKEND != "quantized"
+            # BM25 index lives inside the Chroma directory so the two are rebuilt/copied together
+            self.lexical = LexicalIndex(os.path.join(db_path, "lexical_index.sqlite3"))
+            if not self.read_only and self.lexical.count() == 0 and self.store.count() > 0:
+                self._rebuild_lexical_index()
+            if not self.read_only and self._partitioned and not self._partition_names() and self.store.count() > 0:
+                self._rebuild_partitions()
+            # Workspace code units get their own collection, linked to discussion chunks
+            code_units = Chroma(
+                collection_name="code_units",
+                persist_directory=db_path,
                 embedding_function=self._get_embeddings()
             )
-            self.llm = ChatGoogleGenerativeAI(
+            self.code_units = code_units
+            self.code_index = CodeIndex(os.path.join(db_path, "code_index.sqlite3"), code_units._collection, self)
+            self.llm = self._llm_override or ChatGoogleGenerativeAI(
                 model="gemini-3-pro-preview",
                 temperature=0.2,
+                # The LLM scheduler retries 429s itself (giving up its slot while it backs off)
+                max_retries=1,
                 convert_system_message_to_human=True
             )
+            # Built once; each request only fills in the variables
+            self.explain_prompt = ChatPromptTemplate.from_messages([
+                ("system", EXPLAIN_SYSTEM_PROMPT),
+                ("user", EXPLAIN_USER_PROMPT)
+            ])
+            self.explain_chain = self.explain_prompt | self.llm | StrOutputParser()
             print("RAG Service Initialized.")
         except Exception as e:
             print(f"Failed to initialize RAG Service: {e}")
             self.db = None
+            self.store = None
+            self.lexical = None
+            self.code_index = None
             self.llm = None
 
+    @contextmanager
+    def in_use(self):
+        """Marks a request as running on this instance (see `users`)."""
+        self.users += 1
+        try:
+            yield self
+        finally:
+            self.users -= 1
+
+    def close(self):
+        """Releases the index handles and worker threads of an instance a reload has replaced."""
+        self._retrieval_executor.shutdown(wait=False)
+        self._embed_executor.shutdown(wait=False)
+        for resource in (self.lexical, self.code_index, self.store if VECTOR_BACKEND == "quantized" else None):
+            if resource is not None:
+                resource.close()
+        if self.db is not None and VECTOR_BACKEND != "quantized":
+            try:
+                # Chroma keeps one system (and its in-memory HNSW segments) per directory for the life of the process
+                from chromadb.api.client import SharedSystemClient
+                system = SharedSystemClient._identifier_to_system.pop(self._opened_path, None)
+                if system is not None:
+                    system.stop()
+            except (ImportError, AttributeError) as e:
+                print(f"Could not release Chroma client for {self._opened_path}: {e}")
+
+    def warm_up(self):
+        """Runs one throwaway query per store so the first real request doesn't pay for loading them."""
+        if not self.db:
+            return
+        started = time.perf_counter()
+        try:
+            sample = self.store.get(limit=1, include=["embeddings"])
+            if sample["ids"]:
+                # Loads the HNSW segment into memory
+                self.store.query(query_embeddings=[list(sample["embeddings"][0])], n_results=1)
+                self.lexical.search("warm up", k=1)
+        except Exception as e:
+            print(f"Index warm-up failed: {e}")
+            return
+        print(f"Index warmed up in {time.perf_counter() - started:.2f}s.")
+
+    def _rebuild_lexical_index(self, page_size: int = 1000):
+        """Backfills the BM25 index from chunks already stored in Chroma."""
+        print("Building lexical index from existing vector store...")
+        offset = 0
+        while True:
+            page = self.store.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+            if not page["ids"]:
+                break
+            self.lexical.add(page["ids"], [
+                Document(page_content=text, metadata=meta or {})
+                for text, meta in zip(page["documents"], page["metadatas"])
+            ])
+            offset += len(page["ids"])
+        print(f"Lexical index built with {offset} chunks.")
+
+    def _partition_names(self) -> List[str]:
+        # Newer Chroma lists names, older versions Collection objects
+        names = [getattr(c, "name", c) for c in self.db._client.list_collections()]
+        return [name for name in names if name.startswith(f"{PARTITION_PREFIX}_")]
+
+    def _partition(self, name: str, create: bool = False):
+        """Raw Chroma collection holding the chunks of one partition; None if it doesn't exist.
+
+        Only the writer passes `create`, so queries never add collections to
+        the index (read-only replicas may not write to it at all).
+        """
+        collection = self._partitions.get(name)
+        if collection is None:
+            try:
+                if create:
+                    collection = self.db._client.get_or_create_collection(
+                        name, metadata=self.store.metadata, embedding_function=None
+                    )
+                else:
+                    collection = self.db._client.get_collection(name, embedding_function=None)
+            except Exception:
+                # Chroma versions differ in what they raise for a missing collection
+                return None
+            self._partitions[name] = collection
+        return collection
+
+    def _write_partitions(self, ids: List[str], chunks: List[Document], vectors: List[List[float]]):
+        """Copies chunks into the partition collections their metadata routes them to."""
+        grouped = {}
+        for chunk_id, doc, vector in zip(ids, chunks, vectors):
+            for name in partitions_for(doc.metadata):
+                group = grouped.setdefault(name, ([], [], [], []))
+                for values, value in zip(group, (chunk_id, vector, doc.page_content, doc.metadata)):
+                    values.append(value)
+        for name, (group_ids, group_vectors, texts, metadatas) in grouped.items():
+            for start in range(0, len(group_ids), WRITE_BATCH_SIZE):
+                end = start + WRITE_BATCH_SIZE
+                self._partition(name, create=True).upsert(
+                    ids=group_ids[start:end], embeddings=group_vectors[start:end],
+                    documents=texts[start:end], metadatas=metadatas[start:end]
+                )
+
+    def _delete_from_partitions(self, ids: List[str]):
+        # A chunk's partitions follow from its metadata, so look it up before the main copy goes
+        stored = self.store.get(ids=ids, include=["metadatas"])
+        grouped = {}
+        for chunk_id, meta in zip(stored["ids"], stored["metadatas"]):
+            for name in partitions_for(meta or {}):
+                grouped.setdefault(name, []).append(chunk_id)
+        for name, chunk_ids in grouped.items():
+            partition = self._partition(name)
+            if partition is not None:
+                partition.delete(ids=chunk_ids)
+
+    def _rebuild_partitions(self, page_size: int = 1000):
+        """(Re)creates the partition collections from the main collection."""
+        print(f"Building retrieval partitions ({', '.join(RETRIEVAL_PARTITIONS)}) from existing vector store...")
+        for name in self._partition_names():
+            self.db._client.delete_collection(name)
+        self._partitions = {}
+        offset = 0
+        while True:
+            page = self.store.get(limit=page_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+            if not page["ids"]:
+                break
+            self._write_partitions(page["ids"], [
+                Document(page_content=text, metadata=meta or {})
+                for text, meta in zip(page["documents"], page["metadatas"])
+            ], [list(vector) for vector in page["embeddings"]])
+            offset += len(page["ids"])
+        print(f"Partitions built with {offset} chunks.")
+
     def _extract_keywords(self, code_snippet: str) -> str:
         """Extracts potential keywords (function names, variables) from code."""
         # Simple regex to find words that look like identifiers
         identifiers = re.findall(r'[a-zA-Z_][a-zA-Z0-9_]*', code_snippet)
-        # Filter out common keywords could be added here, but for now just unique them
-        unique_identifiers = list(set(identifiers))
-        return " ".join(unique_identifiers[:10]) # Limit to top 10 to avoid noise
-
-    def retrieve(self, query: str, k: int = 5):
-        """Hybrid-ish retrieval: simply uses the vector store for now."""
-        # In a real hybrid setup, we might combine BM25 with Vector search.
-        # For this MVP, we rely on the semantic power of the embedding model,
-        # but we augment the query with extracted code keywords to ensure specificity.
+        # Most frequent first (ties keep source order), skipping language noise
+        counts = {}
+        for ident in identifiers:
+            if len(ident) > 2 and ident.lower() not in STOP_WORDS:
+                counts[ident] = counts.get(ident, 0) + 1
+        ranked = sorted(counts, key=lambda ident: -counts[ident])
+        return " ".join(ranked[:10]) # Limit to top 10 to avoid noise
+
+    def _search_query(self, code_snippet: str) -> str:
+        # Augment the raw snippet with its most telling identifiers
+        with span("keyword_extraction"):
+            keywords = self._extract_keywords(code_snippet)
+        return f"{code_snippet}\nKeywords: {keywords}"
+
+    def _relevance(self, distance: float) -> float:
+        """Maps a Chroma distance to a 0-1 relevance score (same conventions as LangChain)."""
+        space = (self.store.metadata or {}).get("hnsw:space", "l2")
+        if space == "cosine":
+            return 1.0 - distance
+        if space == "ip":
+            return 1.0 - distance if distance > 0 else -distance
+        # Squared L2 between unit vectors lies in [0, 4]
+        return 1.0 - math.sqrt(max(distance, 0.0)) / math.sqrt(2)
+
+    def _distance(self, a: List[float], b: List[float]) -> float:
+        """Distance in the collection's space, for chunks that only the lexical stage found."""
+        space = (self.store.metadata or {}).get("hnsw:space", "l2")
+        dot = sum(x * y for x, y in zip(a, b))
+        if space == "l2":
+            return sum((x - y) ** 2 for x, y in zip(a, b))
+        if space == "ip":
+            return 1.0 - dot
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return 1.0 - (dot / norm if norm else 0.0)
+
+    def _vector_search(self, query_vector: List[float], k: int, where: dict = None, partitions: List[str] = None):
+        """Returns (id, Document, distance) triples, nearest first.
+
+        The `where` filter is applied inside Chroma's search rather than to its
+        top k, so a narrow filter still gets k hits. With `partitions`, only
+        those (smaller) collections are searched and their hits merged.
+        """
+        collections = [self.store] if partitions is None else [self._partition(name) for name in partitions]
+        if None in collections:
+            # A partition nobody has written to yet: the main collection, filtered by `where`, has the same hits
+            collections, partitions = [self.store], None
+        hits = []
+        for collection in collections:
+            if partitions is not None and collection.count() == 0:
+                continue
+            result = collection.query(
+                query_embeddings=[query_vector],
+                n_results=k,
+                where=where,
+                include=["documents", "metadatas", "distances"]
+            )
+            hits.extend(
+                (chunk_id, Document(id=chunk_id, page_content=text, metadata=meta or {}), distance)
+                for chunk_id, text, meta, distance in zip(
+                    result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0]
+                )
+            )
+        if len(collections) > 1:
+            hits = sorted(hits, key=lambda hit: hit[2])[:k]
+        return hits
+
+    def retrieve_with_scores(self, query: str, k: int = 5, query_vector: List[float] = None,
+                             filters: Optional[RetrievalFilters] = None) -> List[Tuple[Document, float]]:
+        """Hybrid retrieval: BM25 over chunk text fused with vector search via RRF.
+
+        Returns (Document, relevance) pairs in fused order. Relevance is the 0-1
+        vector similarity; candidates below MIN_RELEVANCE_SCORE, or more than
+        RELEVANCE_MARGIN below the best one, are dropped, so fewer than k (or
+        none) may come back. `filters` restrict both stages before ranking.
+        With a reranker configured, more candidates are fetched and the
+        survivors are reordered (and rescored) by recency and status.
+        """
+        # We augment the query with extracted code keywords to ensure specificity;
+        # exact identifier matches (e.g. `idempotency_key`) come from the lexical side.
         if not self.db:
             return []
-        return self.db.similarity_search(query, k=k)
+        if query_vector is None:
+            with span("query_embedding"):
+                query_vector = self._get_embeddings().embed_query(query)
 
-    async def explain_code(self, code_snippet: str, file_path: str, line_numbers: str) -> str:
-        if not self.db or not self.llm:
-            return "### Error\nContext Engine is not initialized. Please check server logs."
+        final_k = k
+        if self.reranker is not None:
+            # Over-fetch; the reranker picks the final k
+            k = self.reranker.candidate_count(k)
+        where = to_where(filters)
+        with span("lexical_search"):
+            lexical_hits = self.lexical.search(query, k=max(LEXICAL_CANDIDATES, k), where=where)
+        # If the cheap lexical stage already covers k, the vector stage only needs to
+        # contribute its top k; otherwise over-fetch so fusion has candidates to work with
+        vector_k = k if len(lexical_hits) >= k else k * 2
+        with span("vector_search"):
+            vector_hits = self._vector_search(query_vector, vector_k, where, route(filters) if self._partitioned else None)
 
-        # 1. Augment Query
-        keywords = self._extract_keywords(code_snippet)
-        search_query = f"{code_snippet}\nKeywords: {keywords}"
-        
-        # 2. Retrieve Context
-        print(f"Retrieving context for: {search_query[:50]}...")
-        docs = self.retrieve(search_query)
-        
-        context_str = "\n\n".join([
-            f"--- SOURCE: {doc.metadata.get('source', 'unknown')} ---\n"
-            f"{doc.page_content}" 
-            for doc in docs
-        ])
-
-        # 3. Construct Prompt
-        system_prompt = """You are ContextSync, an AI assistant that bridges the gap between Code and Context (Slack/Jira).
-
-        ### 🧠 Reasoning Loop
-        Before answering, analyze the provided CONTEXT against the CODE SNIPPET.
-        1.  **Analyze Intent**: What is the code trying to do?
-        2.  **Verify Match**: Does the Slack thread or Jira ticket explicitly mention this feature, variable, or bug?
-        3.  **Filter Noise**: Ignore context that is about a different part of the system, even if keywords match.
-
-        ### 📝 Output Format (Markdown)
-        
-        ## ⚡ Context Analysis
-        * **Relevance**: [High/Medium/Low] - [One sentence explanation]
-        
-        ## 💡 Intent & Backstory
-        [Explain *why* this code exists based on the filtered context]
+        fused = reciprocal_rank_fusion([
+            ([chunk_id for chunk_id, _ in lexical_hits], HYBRID_LEXICAL_WEIGHT),
+            ([chunk_id for chunk_id, _, _ in vector_hits], HYBRID_VECTOR_WEIGHT),
+        ], k=HYBRID_RRF_K)[:k]
 
-        ### 🔍 Decision Trail
-        - **[Source: Date/Author]**: [Key insight directly related to this code]
-        
-        ### 🔗 References
-        - [Link/ID] - [Title]
-        
-        If NO relevant context is found, state: "No direct Slack/Jira context found for this logic." and provide a technical explanation only.
+        docs = {chunk_id: doc for chunk_id, doc, _ in vector_hits}
+        distances = {chunk_id: distance for chunk_id, _, distance in vector_hits}
+        lexical_only = [chunk_id for chunk_id, _ in fused if chunk_id not in docs]
+        if lexical_only:
+            with span("rescore"):
+                docs.update(self.lexical.get_documents(lexical_only))
+                stored = self.store.get(ids=lexical_only, include=["embeddings"])
+                for chunk_id, vector in zip(stored["ids"], stored["embeddings"]):
+                    distances[chunk_id] = self._distance(query_vector, list(vector))
+
+        scored = [
+            (docs[chunk_id], self._relevance(distances[chunk_id]))
+            for chunk_id, _ in fused if chunk_id in docs and chunk_id in distances
+        ]
+        if not scored:
+            return []
+        best = max(score for _, score in scored)
+        floor = max(MIN_RELEVANCE_SCORE, best - RELEVANCE_MARGIN)
+        scored = [(doc, score) for doc, score in scored if score >= floor]
+        if self.reranker is None:
+            return scored
+        with span("rerank"):
+            return self.reranker.rerank(scored, final_k, query)
+
+    def retrieve(self, query: str, k: int = 5, query_vector: List[float] = None,
+                 filters: Optional[RetrievalFilters] = None) -> List[Document]:
+        return [doc for doc, _ in self.retrieve_with_scores(query, k, query_vector, filters)]
+
+    async def aretrieve(self, query: str, k: int = 5, query_vector: List[float] = None,
+                        filters: Optional[RetrievalFilters] = None) -> List[Tuple[Document, float]]:
+        """Non-blocking retrieve_with_scores: runs on the bounded retrieval pool, capped at RETRIEVAL_CONCURRENCY."""
+        loop = asyncio.get_running_loop()
+        slots = self._retrieval_slots.get(loop)
+        if slots is None:
+            slots = self._retrieval_slots[loop] = asyncio.Semaphore(RETRIEVAL_CONCURRENCY)
+        async with slots:
+            return await self._in_retrieval_pool(self.retrieve_with_scores, query, k, query_vector, filters)
+
+    async def _in_retrieval_pool(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        # run_in_executor drops contextvars; carry them so spans reach the request's Server-Timing
+        return await loop.run_in_executor(self._retrieval_executor, partial(contextvars.copy_context().run, fn, *args))
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        embeddings = self._get_embeddings()
+        with span("query_embedding"):
+            if hasattr(embeddings, "embed_queries"):
+                return embeddings.embed_queries(queries)
+            return [embeddings.embed_query(query) for query in queries]
+
+    async def aretrieve_many(self, queries: List[str], k: int = 5,
+                             filters: List[Optional[RetrievalFilters]] = None) -> List[List[Tuple[Document, float]]]:
+        """Retrieves for many queries: one batched embedding call, each distinct (query, filters) searched once.
+
+        `filters` holds one entry per query (None for unfiltered).
         """
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("user", f"Context:\n{context_str}\n\nCode ({file_path}:{line_numbers}):\n```python\n{code_snippet}\n```")
-        ])
-
-        # 4. Generate
-        chain = prompt | self.llm | StrOutputParser()
-        response = await chain.ainvoke({})
+        if not self.db:
+            return [[] for _ in queries]
+        filters = filters or [None] * len(queries)
+        keys = [(query, filter_key(f)) for query, f in zip(queries, filters)]
+        searches = dict(zip(keys, filters))
+        unique = list(dict.fromkeys(queries))
+        vectors = dict(zip(unique, await self._in_retrieval_pool(self._embed_queries, unique)))
+        results = await asyncio.gather(*(
+            self.aretrieve(query, k, vectors[query], f) for (query, _), f in searches.items()
+        ))
+        by_key = dict(zip(searches, results))
+        return [by_key[key] for key in keys]
+
+    async def _check_answer_cache(self, code_snippet: str, docs: List[Document], file_path: str = None):
+        """Returns (chunk_ids, snippet_vector, cached_answer_or_None) for a snippet and its context."""
+        # Same snippet (modulo whitespace/comments) over the same context -> same answer
+        chunk_ids = [doc.id for doc in docs]
+        snippet_vector = None
+        if self.answer_cache.near_duplicates_enabled:
+            snippet_vector = await asyncio.to_thread(
+                self._get_embeddings().embed_query, normalize_snippet(code_snippet, file_path)
+            )
+        cached = self.answer_cache.get(code_snippet, chunk_ids, snippet_vector, file_path)
+        if cached is not None:
+            print("Answer cache hit.")
+        return chunk_ids, snippet_vector, cached
+
+    def _explain_inputs(self, scored: List[Tuple[Document, float]], code_snippet: str, file_path: str, line_numbers: str) -> dict:
+        """Prompt variables; user code is passed as a value, never spliced into the template."""
+        with span("prompt_build"):
+            inputs = {
+                # Overlapping chunks merged, best-scored first, within CONTEXT_TOKEN_BUDGET
+                "context": pack_context(scored),
+                "file_path": file_path,
+                "line_numbers": line_numbers,
+                "code": code_snippet
+            }
+        return inputs
+
+    @staticmethod
+    def _count_explain_call(inputs: dict):
+        LLM_CALLS.inc(purpose="explain")
+        TOKENS.inc(count_tokens(inputs["context"]) + count_tokens(inputs["code"]), purpose="explain", direction="prompt")
+
+    async def _invoke_explain(self, inputs: dict) -> str:
+        self._count_explain_call(inputs)
+        return await self.explain_chain.ainvoke(inputs)
+
+    async def _answer(self, scored: List[Tuple[Document, float]], code_snippet: str, file_path: str, line_numbers: str) -> str:
+        """Explains a snippet given its retrieved context, via the answer cache."""
+        docs = [doc for doc, _ in scored]
+        if not docs and SKIP_LLM_WITHOUT_CONTEXT:
+            # Nothing cleared the relevance bar: one vector lookup, zero LLM calls
+            return NO_CONTEXT_MARKDOWN
+
+        chunk_ids, snippet_vector, cached = await self._check_answer_cache(code_snippet, docs, file_path)
+        if cached is not None:
+            return cached
+
+        # 3. Generate
+        inputs = self._explain_inputs(scored, code_snippet, file_path, line_numbers)
+        with span("llm_generation"):
+            # Identical prompts in flight (same snippet, same context) share one call
+            response = await scheduler.run(
+                partial(self._invoke_explain, inputs), PRIORITY_INTERACTIVE, key=request_key("explain", inputs)
+            )
+        TOKENS.inc(count_tokens(response), purpose="explain", direction="completion")
+        self.answer_cache.put(code_snippet, chunk_ids, response, snippet_vector, file_path)
         return response
 
+    def _linked_context(self, code_snippet: str, file_path: str, line_numbers: str,
+                        filters: Optional[RetrievalFilters] = None) -> List[Tuple[Document, float]]:
+        """Precomputed context for a selection inside an indexed code unit; [] if there is none."""
+        if not self.code_index or not file_path or not line_numbers:
+            return []
+        with span("code_link_lookup"):
+            unit = self.code_index.find_unit(code_snippet, file_path, line_numbers)
+            if unit is None:
+                return []
+            links = self.code_index.links_for(unit["id"])
+            docs = self.lexical.get_documents([chunk_id for chunk_id, _ in links])
+        where = to_where(filters)
+        scored = [(docs[chunk_id], score) for chunk_id, score in links
+                  if chunk_id in docs and matches(where, docs[chunk_id].metadata)]
+        if scored:
+            print(f"Resolved context for {unit['qualname']} from the code link table.")
+        return scored
+
+    async def _retrieve_for(self, code_snippet: str, file_path: str = None, line_numbers: str = None,
+                            filters: Optional[RetrievalFilters] = None) -> List[Tuple[Document, float]]:
+        """Context for a snippet: the code link table for known symbols, otherwise hybrid retrieval."""
+        scored = await self._in_retrieval_pool(self._linked_context, code_snippet, file_path, line_numbers, filters)
+        if scored:
+            return scored
+        # Augment the query with code keywords and search
+        search_query = self._search_query(code_snippet)
+        print(f"Retrieving context for: {search_query[:50]}...")
+        return await self.aretrieve(search_query, filters=filters)
+
+    async def _retrieve_many_for(self, requests: list) -> List[List[Tuple[Document, float]]]:
+        """_retrieve_for over many requests: known symbols come from the link table, the rest share one batched retrieval."""
+        doc_lists = list(await asyncio.gather(*(
+            self._in_retrieval_pool(self._linked_context, r.code_snippet, r.file_path, r.line_numbers, r.filters)
+            for r in requests
+        )))
+        unresolved = [position for position, scored in enumerate(doc_lists) if not scored]
+        retrieved = await self.aretrieve_many(
+            [self._search_query(requests[p].code_snippet) for p in unresolved],
+            filters=[requests[p].filters for p in unresolved]
+        )
+        for position, scored in zip(unresolved, retrieved):
+            doc_lists[position] = scored
+        return doc_lists
+
+    async def explain_code(self, code_snippet: str, file_path: str, line_numbers: str,
+                           filters: Optional[RetrievalFilters] = None) -> str:
+        if not self.db or not self.llm:
+            return "### Error\nContext Engine is not initialized. Please check server logs."
+
+        scored = await self._retrieve_for(code_snippet, file_path, line_numbers, filters)
+        return await self._answer(scored, code_snippet, file_path, line_numbers)
+
+    async def explain_many(self, requests: list):
+        """Explains many snippets; yields (index, markdown) in completion order."""
+        if not self.db or not self.llm:
+            for index in range(len(requests)):
+                yield index, "### Error\nContext Engine is not initialized. Please check server logs."
+            return
+
+        # Identical hunks (e.g. the same change in several files' diffs) are explained once
+        groups = {}
+        for index, r in enumerate(requests):
+            groups.setdefault((normalize_snippet(r.code_snippet, r.file_path), r.file_path, r.line_numbers, filter_key(r.filters)), []).append(index)
+        leaders = [indices[0] for indices in groups.values()]
+        doc_lists = await self._retrieve_many_for([requests[i] for i in leaders])
+
+        async def explain_one(position):
+            r = requests[leaders[position]]
+            markdown = await self._answer(doc_lists[position], r.code_snippet, r.file_path, r.line_numbers)
+            return position, markdown
+
+        indices_by_position = list(groups.values())
+        for next_done in asyncio.as_completed([explain_one(p) for p in range(len(leaders))]):
+            position, markdown = await next_done
+            for index in indices_by_position[position]:
+                yield index, markdown
+
+    @staticmethod
+    def _source_info(doc: Document, score: float) -> dict:
+        """Lightweight description of a retrieved doc, sent ahead of the streamed answer."""
+        return {
+            "id": doc.id,
+            "relevance_score": score,
+            "source": doc.metadata.get("source", "unknown"),
+            "title_or_user": doc.metadata.get("user") or doc.metadata.get("title") or doc.metadata.get("id") or "Unknown",
+            "url": doc.metadata.get("url")
+        }
+
+    async def astream_explain(self, code_snippet: str, file_path: str, line_numbers: str,
+                              filters: Optional[RetrievalFilters] = None):
+        """Like explain_code, but yields (event, data) pairs: sources first, then tokens as generated."""
+        if not self.db or not self.llm:
+            yield "error", {"message": "Context Engine is not initialized. Please check server logs."}
+            return
+
+        scored = await self._retrieve_for(code_snippet, file_path, line_numbers, filters)
+        yield "sources", [self._source_info(doc, score) for doc, score in scored]
+        docs = [doc for doc, _ in scored]
+
+        if not docs and SKIP_LLM_WITHOUT_CONTEXT:
+            yield "token", NO_CONTEXT_MARKDOWN
+            yield "done", {"cached": False}
+            return
+
+        chunk_ids, snippet_vector, cached = await self._check_answer_cache(code_snippet, docs, file_path)
+
+        if cached is not None:
+            yield "token", cached
+        else:
+            parts = []
+            inputs = self._explain_inputs(scored, code_snippet, file_path, line_numbers)
+            self._count_explain_call(inputs)
+            with span("llm_generation"):
+                async for token in scheduler.stream(partial(self.explain_chain.astream, inputs), PRIORITY_INTERACTIVE):
+                    parts.append(token)
+                    yield "token", token
+            answer = "".join(parts)
+            TOKENS.inc(count_tokens(answer), purpose="explain", direction="completion")
+            self.answer_cache.put(code_snippet, chunk_ids, answer, snippet_vector, file_path)
+
+        yield "done", {"cached": cached is not None}
+
+    async def _invoke_summary(self, prompt_text: str) -> str:
+        LLM_CALLS.inc(purpose="summary")
+        TOKENS.inc(count_tokens(prompt_text), purpose="summary", direction="prompt")
+        response = await self.llm.ainvoke(prompt_text)
+        TOKENS.inc(count_tokens(response.content), purpose="summary", direction="completion")
+        return response.content
+
+    async def _summary_call(self, prompt_text: str) -> str:
+        # Queued behind interactive explanations when LLM slots run short
+        return await scheduler.run(
+            partial(self._invoke_summary, prompt_text), PRIORITY_BACKGROUND, key=request_key("summary", prompt_text)
+        )
+
     async def _summarize_doc(self, content: str) -> str:
         """Summarizes a single document using the LLM."""
         prompt_text = f"Summarize this context in one concise sentence for a developer:\n\n{content}"
-        summary = await self.llm.ainvoke(prompt_text)
-        return f"**Summary**: {summary.content}\n\n**Raw Source**:\n{content}"
-
-    async def get_context_objects(self, code_snippet: str) -> List[ContextObject]:
-        """Retrieves structured context objects with LLM summaries."""
-        keywords = self._extract_keywords(code_snippet)
-        search_query = f"{code_snippet}\nKeywords: {keywords}"
-        docs = self.retrieve(search_query)
-        
-        import asyncio
-        
-        # Summarize in parallel
-        summary_tasks = [self._summarize_doc(doc.page_content) for doc in docs]
-        summaries = await asyncio.gather(*summary_tasks)
-        
+        return await self._summary_call(prompt_text)
+
+    async def _summarize_batch(self, contents: List[str]) -> List[str]:
+        """Summarizes several documents with a single LLM call."""
+        if len(contents) == 1:
+            return [await self._summarize_doc(contents[0])]
+        response = await self._summary_call(build_batch_prompt(contents))
+        parsed = parse_batch_response(response, len(contents))
+        # The model occasionally drops an item; fill those in one by one
+        missing = [i for i in range(len(contents)) if i not in parsed]
+        if missing:
+            retried = await asyncio.gather(*(self._summarize_doc(contents[i]) for i in missing))
+            parsed.update(zip(missing, retried))
+        return [parsed[i] for i in range(len(contents))]
+
+    async def _compute_summaries(self, to_compute: dict) -> dict:
+        """Summarizes {content hash: text} in batches and stores the results."""
+        keys = list(to_compute)
+        batches = [keys[i:i + SUMMARY_BATCH_SIZE] for i in range(0, len(keys), SUMMARY_BATCH_SIZE)]
+        results = await asyncio.gather(*(
+            self._summarize_batch([to_compute[h] for h in batch]) for batch in batches
+        ))
+        fresh = {h: summary for batch, batch_summaries in zip(batches, results)
+                 for h, summary in zip(batch, batch_summaries)}
+        self.summary_store.put_many(fresh)
+        return fresh
+
+    async def _get_summaries(self, docs: List[Document]) -> List[str]:
+        """Summaries for docs, served from the summary store; cold misses are batched."""
+        hashes = [content_hash(doc.page_content) for doc in docs]
+        summaries = self.summary_store.get_many(hashes)
+
+        to_compute, waiting = {}, {}
+        for h, doc in zip(hashes, docs):
+            if h in summaries or h in to_compute:
+                continue
+            if h in self._summaries_in_flight:
+                # Another request is already summarizing this chunk
+                waiting[h] = self._summaries_in_flight[h]
+            else:
+                to_compute[h] = doc.page_content
+
+        if to_compute:
+            # Its own task, so a request that disconnects doesn't strand the others waiting on it
+            task = asyncio.ensure_future(self._compute_summaries(to_compute))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            for h in to_compute:
+                self._summaries_in_flight[h] = task
+
+            def forget(t):
+                for h in to_compute:
+                    if self._summaries_in_flight.get(h) is t:
+                        del self._summaries_in_flight[h]
+            task.add_done_callback(forget)
+            summaries.update(await asyncio.shield(task))
+
+        for h, task in waiting.items():
+            summaries[h] = (await asyncio.shield(task))[h]
+
+        return [summaries[h] for h in hashes]
+
+    def _to_context_objects(self, scored: List[Tuple[Document, float]], summaries: List[Optional[str]]) -> List[ContextObject]:
+        related = self.code_index.files_for_chunks([doc.id for doc, _ in scored]) if self.code_index else {}
         objects = []
-        for doc, summary in zip(docs, summaries):
+        for (doc, score), summary in zip(scored, summaries):
             # Map Chroma metadata to ContextObject
             source = doc.metadata.get("source", "unknown")
             title_or_user = doc.metadata.get("user") or doc.metadata.get("title") or doc.metadata.get("id") or "Unknown"
@@ -141,28 +811,197 @@ class RAGService:
                 source=source,
                 title_or_user=title_or_user,
                 url=doc.metadata.get("url"), 
-                content_summary=summary,
-                relevance_score=0.0, # Placeholder, would need vector score
-                related_code_files=[]
+                content_summary=(f"**Summary**: {summary}\n\n" if summary is not None else "") + f"**Raw Source**:\n{doc.page_content}",
+                relevance_score=round(score, 4),
+                related_code_files=related.get(doc.id, [])
             )
             objects.append(obj)
         return objects
 
-    def add_documents(self, documents: List[Document]):
-        """Adds new documents to the vector store."""
-        if not self.db:
-            return
-        
-        # Split text (reuse same splitter logic)
-        from langchain_text_splitters import RecursiveCharacterTextSplitter
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        splits = text_splitter.split_documents(documents)
+    async def get_context_objects(self, code_snippet: str, file_path: str = None, line_numbers: str = None,
+                                  filters: Optional[RetrievalFilters] = None, summarize: bool = True) -> List[ContextObject]:
+        """Retrieves structured context objects with LLM summaries (only already stored ones unless `summarize`)."""
+        scored = await self._retrieve_for(code_snippet, file_path, line_numbers, filters)
         
-        if splits:
-            import hashlib
-            # Generate deterministic IDs based on content hash to prevent duplicates
-            ids = [hashlib.md5(doc.page_content.encode()).hexdigest() for doc in splits]
-            
-            print(f"Adding/Updating {len(splits)} chunks in Vector Store...")
-            self.db.add_documents(splits, ids=ids)
+        if not summarize:
+            stored = self.summary_store.get_many([content_hash(doc.page_content) for doc, _ in scored])
+            return self._to_context_objects(scored, [stored.get(content_hash(doc.page_content)) for doc, _ in scored])
+        # Summaries depend only on chunk content, so most come straight from the store
+        with span("summarization"):
+            summaries = await self._get_summaries([doc for doc, _ in scored])
+        return self._to_context_objects(scored, summaries)
+
+    async def get_context_objects_many(self, requests: list):
+        """Context cards for many snippets (same cards as get_context_objects); yields (index, objects) per snippet.
+
+        Chunks shared between snippets are summarized once.
+        """
+        scored_lists = await self._retrieve_many_for(requests)
+
+        unique_docs = list({doc.id: doc for scored in scored_lists for doc, _ in scored}.values())
+        with span("summarization"):
+            summaries = dict(zip((doc.id for doc in unique_docs), await self._get_summaries(unique_docs)))
+
+        for index, scored in enumerate(scored_lists):
+            yield index, self._to_context_objects(scored, [summaries[doc.id] for doc, _ in scored])
+
+    def prepare_chunks(self, documents: List[Document], split: dict = None):
+        """Splits documents into stably-identified chunks and diffs them against the store.
+
+        Chunk IDs are `source:source_id:chunk_index`, so a re-fetched ticket or
+        thread overwrites its own chunks. Returns (ids, chunks, stale_ids):
+        chunks whose text or metadata changed (or are new) and still need writing, plus
+        IDs of chunks the new version no longer has. `split` is the output of
+        split_documents() when the caller already split `documents` elsewhere.
+        """
+        if not self.db:
+            return [], [], []
+
+        by_id = split if split is not None else split_documents(documents, self.text_splitter)
+        if not by_id:
+            return [], [], []
+
+        # Existing chunks of these items: unchanged ones are skipped, leftovers are stale
+        existing = self.store.get(
+            where={"source_id": {"$in": sorted({doc.metadata["source_id"] for doc in by_id.values()})}},
+            include=["metadatas"]
+        )
+        stored_hashes = {
+            chunk_id: (meta or {}).get("content_hash")
+            for chunk_id, meta in zip(existing["ids"], existing["metadatas"])
+        }
+        new_ids = [
+            chunk_id for chunk_id, doc in by_id.items()
+            if stored_hashes.get(chunk_id) != doc.metadata["content_hash"]
+        ]
+        stale_ids = [chunk_id for chunk_id in stored_hashes if chunk_id not in by_id]
+        return new_ids, [by_id[chunk_id] for chunk_id in new_ids], stale_ids
+
+    def embed_chunks(self, chunks: List[Document]) -> List[List[float]]:
+        """Embeds chunks in API-sized requests, several in flight at once."""
+        texts = [doc.page_content for doc in chunks]
+        embeddings = self._get_embeddings()
+        requests = [texts[i:i + EMBED_REQUEST_SIZE] for i in range(0, len(texts), EMBED_REQUEST_SIZE)]
+        if len(requests) <= 1:
+            return embeddings.embed_documents(texts)
+        vectors = []
+        for batch_vectors in self._embed_executor.map(embeddings.embed_documents, requests):
+            vectors.extend(batch_vectors)
+        return vectors
+
+    def write_chunks(self, ids: List[str], chunks: List[Document], vectors: List[List[float]], stale_ids: List[str] = ()):
+        """Upserts pre-embedded chunks into Chroma and the BM25 index, then drops stale ones."""
+        # Chroma rejects None metadata values (e.g. bot messages without a user)
+        chunks = [
+            Document(page_content=doc.page_content, metadata={k: v for k, v in doc.metadata.items() if v is not None})
+            for doc in chunks
+        ]
+        for start in range(0, len(ids), WRITE_BATCH_SIZE):
+            end = start + WRITE_BATCH_SIZE
+            self.store.upsert(
+                ids=ids[start:end],
+                embeddings=vectors[start:end],
+                documents=[doc.page_content for doc in chunks[start:end]],
+                metadatas=[doc.metadata for doc in chunks[start:end]]
+            )
+        if ids:
+            self.lexical.add(ids, chunks)
+            if self._partitioned:
+                self._write_partitions(ids, chunks, vectors)
+        stale_ids = list(stale_ids)
+        if stale_ids:
+            # e.g. a ticket whose description got shorter and now splits into fewer chunks
+            if self._partitioned:
+                self._delete_from_partitions(stale_ids)
+            self.store.delete(ids=stale_ids)
+            self.lexical.delete(stale_ids)
+        # New IDs change retrieved sets (and thus cache keys) on their own; rewritten/removed IDs must be purged
+        self.answer_cache.invalidate_chunks(ids + stale_ids)
+
+    def drop_legacy_chunks(self, page_size: int = 1000) -> int:
+        """Deletes chunks stored under pre-`source:source_id:chunk_index` (MD5) IDs; returns how many.
+
+        prepare_chunks finds a source's old chunks by `source_id`, which these never
+        had, so without this every re-fetched item would sit in the index twice.
+        """
+        if not self.db:
+            return 0
+        legacy, offset = [], 0
+        while True:
+            page = self.store.get(limit=page_size, offset=offset, include=[])
+            if not page["ids"]:
+                break
+            legacy.extend(chunk_id for chunk_id in page["ids"] if not _CHUNK_ID_RE.match(chunk_id))
+            offset += len(page["ids"])
+        for start in range(0, len(legacy), WRITE_BATCH_SIZE):
+            batch = legacy[start:start + WRITE_BATCH_SIZE]
+            if self._partitioned:
+                self._delete_from_partitions(batch)
+            self.store.delete(ids=batch)
+            self.lexical.delete(batch)
+        self.answer_cache.invalidate_chunks(legacy)
+        return len(legacy)
+
+    def reembed_collection(self, batch_size: int = 256) -> int:
+        """Re-embeds every stored chunk with the current provider, keeping IDs, text and metadata."""
+        if not self.db:
+            return 0
+        ids, texts, metadatas = [], [], []
+        offset = 0
+        while True:
+            page = self.store.get(limit=1000, offset=offset, include=["documents", "metadatas"])
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            texts.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            offset += len(page["ids"])
+        if not ids:
+            return 0
+
+        # Embed everything before touching the collection, so a failed run leaves it intact
+        embeddings = self._get_embeddings()
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+            print(f"Re-embedded {len(vectors)}/{len(texts)} chunks...")
+
+        old_dim = len(self.store.get(ids=ids[:1], include=["embeddings"])["embeddings"][0])
+        if old_dim != len(vectors[0]):
+            # Chroma fixes a collection's dimension on first insert
+            print(f"Embedding dimension changed ({old_dim} -> {len(vectors[0])}), recreating collection.")
+            if VECTOR_BACKEND == "quantized":
+                self.store.reset()
+            else:
+                self.db.reset_collection()
+                self.store = self.db._collection
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            self.store.upsert(
+                ids=ids[start:end], embeddings=vectors[start:end],
+                documents=texts[start:end], metadatas=metadatas[start:end]
+            )
+        self.answer_cache.invalidate_chunks(ids)
+        if self._partitioned:
+            self._rebuild_partitions()
+        # Code units are re-parsed and re-embedded by the next code index refresh
+        self.code_units.reset_collection()
+        self.code_index.clear(self.code_units._collection)
+        return len(ids)
+
+    def add_documents(self, documents: List[Document]) -> int:
+        """Adds or updates documents in the vector store; returns the number of chunks embedded."""
+        if not self.db:
+            return 0
+
+        started = time.perf_counter()
+        ids, chunks, stale_ids = self.prepare_chunks(documents)
+        if not chunks and not stale_ids:
+            print("All chunks already indexed, nothing to embed.")
+            return 0
 
+        print(f"Writing {len(chunks)} new or changed chunks to Vector Store ({len(stale_ids)} stale removed)...")
+        self.write_chunks(ids, chunks, self.embed_chunks(chunks), stale_ids)
+        elapsed = time.perf_counter() - started
+        print(f"Wrote {len(chunks)} chunks in {elapsed:.2f}s ({len(chunks) / elapsed:.1f} chunks/s).")
+        return len(chunks)
@@ -0,0 +1,132 @@
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+try:
+    # Always present alongside chromadb; the fallback only keeps the module importable without it
+    import numpy as np
+except ImportError:
+    np = None
+
+RERANK_ENABLED = os.environ.get("RERANK_ENABLED", "false").lower() == "true"
+# Candidates pulled from hybrid retrieval before reranking down to k
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "30"))
+# Age at which a chunk's time-decay factor halves; 0 disables decay
+RERANK_HALF_LIFE_DAYS = float(os.environ.get("RERANK_HALF_LIFE_DAYS", "90"))
+# Lowest decay factor, so old-but-only context can still win
+RERANK_DECAY_FLOOR = float(os.environ.get("RERANK_DECAY_FLOOR", "0.5"))
+# Jira status multipliers; unlisted statuses (and Slack) weigh 1.0
+RERANK_STATUS_WEIGHTS = os.environ.get(
+    "RERANK_STATUS_WEIGHTS", "Done:0.8,Closed:0.7,Resolved:0.8,Won't Do:0.5,Duplicate:0.5"
+)
+# Optional local cross-encoder (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2); empty disables
+RERANK_CROSS_ENCODER = os.environ.get("RERANK_CROSS_ENCODER", "")
+# Share of the base score taken from the cross-encoder when one is configured
+RERANK_CROSS_ENCODER_WEIGHT = float(os.environ.get("RERANK_CROSS_ENCODER_WEIGHT", "0.5"))
+
+
+def parse_status_weights(spec: str) -> Dict[str, float]:
+    """`Done:0.8,Closed:0.7` -> {"done": 0.8, "closed": 0.7} (case-insensitive lookups)."""
+    weights = {}
+    for item in spec.split(","):
+        status, _, weight = item.rpartition(":")
+        if status.strip():
+            weights[status.strip().lower()] = float(weight)
+    return weights
+
+
+def _epoch(metadata: dict) -> Optional[float]:
+    value = metadata.get("timestamp_epoch")
+    if value is None and metadata.get("source") == "slack":
+        # Chunks written before timestamp_epoch existed still have the raw Slack ts
+        value = metadata.get("timestamp")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class Reranker:
+    """Rescores retrieved candidates by recency, Jira status and (optionally) a cross-encoder.
+
+    score = base * decay * status_weight, where base is the retrieval relevance
+    (blended with the cross-encoder's when configured) and decay falls from 1
+    to RERANK_DECAY_FLOOR with the chunk's age. Undated chunks are not decayed.
+    """
+
+    def __init__(self, candidates: int = RERANK_CANDIDATES, half_life_days: float = RERANK_HALF_LIFE_DAYS,
+                 decay_floor: float = RERANK_DECAY_FLOOR, status_weights: str = RERANK_STATUS_WEIGHTS,
+                 cross_encoder: str = RERANK_CROSS_ENCODER, cross_encoder_weight: float = RERANK_CROSS_ENCODER_WEIGHT):
+        self.candidates = candidates
+        self.half_life_seconds = half_life_days * 86400
+        self.decay_floor = decay_floor
+        self.status_weights = parse_status_weights(status_weights)
+        self.cross_encoder_weight = cross_encoder_weight
+        self.cross_encoder = None
+        if cross_encoder:
+            try:
+                from sentence_transformers import CrossEncoder
+            except ImportError as e:
+                raise ImportError("RERANK_CROSS_ENCODER requires `pip install sentence-transformers`") from e
+            self.cross_encoder = CrossEncoder(cross_encoder, device="cpu")
+            self._lock = threading.Lock()
+
+    def candidate_count(self, k: int) -> int:
+        return max(k, self.candidates)
+
+    def _cross_scores(self, query: str, docs: List[Document]) -> List[float]:
+        # One batched forward pass over all (query, chunk) pairs; logits squashed to 0-1
+        with self._lock:
+            logits = self.cross_encoder.predict([(query, doc.page_content) for doc in docs], show_progress_bar=False)
+        return [1.0 / (1.0 + math.exp(-float(logit))) for logit in logits]
+
+    def _features(self, scored: List[Tuple[Document, float]], query: str):
+        base = [score for _, score in scored]
+        if self.cross_encoder is not None:
+            cross = self._cross_scores(query, [doc for doc, _ in scored])
+            w = self.cross_encoder_weight
+            base = [(1 - w) * b + w * c for b, c in zip(base, cross)]
+        epochs = [_epoch(doc.metadata) for doc, _ in scored]
+        status = [
+            self.status_weights.get(str(doc.metadata.get("status", "")).lower(), 1.0)
+            if doc.metadata.get("source") == "jira" else 1.0
+            for doc, _ in scored
+        ]
+        return base, epochs, status
+
+    def scores(self, scored: List[Tuple[Document, float]], query: str = "", now: float = None) -> List[float]:
+        """Reranked score per candidate, in input order."""
+        if not scored:
+            return []
+        now = time.time() if now is None else now
+        base, epochs, status = self._features(scored, query)
+        if np is not None:
+            base = np.asarray(base, dtype=np.float64)
+            ages = now - np.asarray([now if e is None else e for e in epochs], dtype=np.float64)
+            decay = np.ones_like(base)
+            if self.half_life_seconds > 0:
+                decay = self.decay_floor + (1 - self.decay_floor) * np.exp2(-np.maximum(ages, 0.0) / self.half_life_seconds)
+            return (base * decay * np.asarray(status, dtype=np.float64)).tolist()
+
+        results = []
+        for b, e, s in zip(base, epochs, status):
+            decay = 1.0
+            if self.half_life_seconds > 0 and e is not None:
+                decay = self.decay_floor + (1 - self.decay_floor) * 2 ** (-max(now - e, 0.0) / self.half_life_seconds)
+            results.append(b * decay * s)
+        return results
+
+    def rerank(self, scored: List[Tuple[Document, float]], k: int, query: str = "", now: float = None) -> List[Tuple[Document, float]]:
+        """Top k candidates by reranked score, best first."""
+        new_scores = self.scores(scored, query, now)
+        order = sorted(range(len(scored)), key=lambda i: new_scores[i], reverse=True)[:k]
+        return [(scored[i][0], new_scores[i]) for i in order]
+
+
+def build_reranker() -> Optional[Reranker]:
+    """The configured reranking stage, or None when RERANK_ENABLED is off."""
+    return Reranker() if RERANK_ENABLED else None
@@ -0,0 +1,270 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+from typing import List, Optional
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Pre-generation location, still served when no generation has been built yet
+LEGACY_DB_PATH = os.path.join(BACKEND_ROOT, "chroma_db")
+
+# <INDEX_ROOT>/generations/<id>/ holds complete stores; <INDEX_ROOT>/current points at the live one
+INDEX_ROOT = os.environ.get("INDEX_ROOT") or os.path.join(BACKEND_ROOT, "index")
+# Previous generations kept for rollback (the live one is never pruned)
+INDEX_KEEP_GENERATIONS = int(os.environ.get("INDEX_KEEP_GENERATIONS", "3"))
+# The sync leader publishes its working store as a new generation at most this often (each publish copies the store)
+INDEX_PUBLISH_SECONDS = float(os.environ.get("INDEX_PUBLISH_SECONDS", "300"))
+# Copy the live generation into RAM (e.g. /dev/shm) when query workers start; empty disables
+INDEX_MEMORY_DIR = os.environ.get("INDEX_MEMORY_DIR", "")
+
+MANIFEST = "generation.json"
+# In a working store: the generation it was seeded from or last published as
+WORKING_BASE = "working_base.json"
+# Never part of a snapshot: SQLite side files (the backup API reads through them) and half-written files
+_SKIPPED_SUFFIXES = ("-wal", "-shm", "-journal", ".tmp")
+
+
+def generations_dir(root: str = INDEX_ROOT) -> str:
+    return os.path.join(root, "generations")
+
+
+def current_link(root: str = INDEX_ROOT) -> str:
+    return os.path.join(root, "current")
+
+
+def working_dir(root: str = INDEX_ROOT) -> str:
+    return os.path.join(root, "working")
+
+
+def current_generation(root: str = INDEX_ROOT) -> Optional[str]:
+    """Name of the live generation, or None if none has been promoted."""
+    link = current_link(root)
+    if not os.path.islink(link):
+        return None
+    return os.path.basename(os.readlink(link))
+
+
+def resolve_db_path(root: str = INDEX_ROOT) -> str:
+    """Directory of the live store: the current generation, else the legacy chroma_db."""
+    name = current_generation(root)
+    if name is None:
+        return LEGACY_DB_PATH
+    return os.path.join(generations_dir(root), name)
+
+
+def list_generations(root: str = INDEX_ROOT) -> List[dict]:
+    """Generations oldest first, with their manifests."""
+    directory = generations_dir(root)
+    if not os.path.isdir(directory):
+        return []
+    current = current_generation(root)
+    result = []
+    for name in sorted(os.listdir(directory)):
+        manifest = {}
+        try:
+            with open(os.path.join(directory, name, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+        result.append({"name": name, "current": name == current, **manifest})
+    return result
+
+
+def _is_sqlite(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(16) == b"SQLite format 3\x00"
+
+
+def snapshot_store(src: str, dst: str):
+    """Copies a store directory consistently: SQLite databases through the backup API, other files as they are.
+
+    The backup API copies committed state, WAL included, even while the
+    database is open elsewhere. The other files (HNSW segments, memory-mapped
+    vectors) must not be written meanwhile; the sync leader only publishes
+    under its sync lock.
+    """
+    for dirpath, _, filenames in os.walk(src):
+        target_dir = os.path.join(dst, os.path.relpath(dirpath, src))
+        os.makedirs(target_dir, exist_ok=True)
+        for filename in filenames:
+            if filename.endswith(_SKIPPED_SUFFIXES) or filename in (MANIFEST, WORKING_BASE):
+                continue
+            source, target = os.path.join(dirpath, filename), os.path.join(target_dir, filename)
+            if not _is_sqlite(source):
+                shutil.copy2(source, target)
+                continue
+            source_conn, target_conn = sqlite3.connect(source, timeout=30), sqlite3.connect(target)
+            try:
+                source_conn.backup(target_conn)
+            finally:
+                target_conn.close()
+                source_conn.close()
+
+
+def _new_name() -> str:
+    # Sortable by creation time (to the millisecond, as one process may publish twice a second);
+    # the PID keeps concurrent builds apart
+    now = time.time()
+    return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}-{os.getpid()}"
+
+
+def new_generation(root: str = INDEX_ROOT, copy_from: str = None) -> str:
+    """Creates an empty (or copied) generation directory to build into; not live until promoted."""
+    path = os.path.join(generations_dir(root), _new_name())
+    # Fails rather than mixing two builds if the name is taken
+    os.makedirs(path)
+    if copy_from and os.path.isdir(copy_from):
+        snapshot_store(copy_from, path)
+    return path
+
+
+def promote(path: str, root: str = INDEX_ROOT, **manifest) -> str:
+    """Atomically makes `path` the live generation, then prunes old ones beyond INDEX_KEEP_GENERATIONS."""
+    name = os.path.basename(os.path.normpath(path))
+    with open(os.path.join(path, MANIFEST), "w") as f:
+        json.dump({"promoted_at": time.time(), **manifest}, f, indent=2)
+    # rename(2) over the old symlink is atomic: readers see the old or the new target, never nothing
+    tmp_link = f"{current_link(root)}.{os.getpid()}.tmp"
+    os.symlink(os.path.join("generations", name), tmp_link)
+    os.replace(tmp_link, current_link(root))
+    prune(root)
+    return name
+
+
+def rollback(root: str = INDEX_ROOT) -> Optional[str]:
+    """Points `current` back at the generation before it; returns its name (None if there is none)."""
+    names = [g["name"] for g in list_generations(root)]
+    current = current_generation(root)
+    if current not in names or names.index(current) == 0:
+        return None
+    previous = names[names.index(current) - 1]
+    tmp_link = f"{current_link(root)}.{os.getpid()}.tmp"
+    os.symlink(os.path.join("generations", previous), tmp_link)
+    os.replace(tmp_link, current_link(root))
+    return previous
+
+
+def prune(root: str = INDEX_ROOT, keep: int = INDEX_KEEP_GENERATIONS):
+    """Deletes all but the newest `keep` generations older than the live one."""
+    names = [g["name"] for g in list_generations(root)]
+    current = current_generation(root)
+    if current not in names:
+        return
+    older = names[:names.index(current)]
+    for name in older[:max(len(older) - keep, 0)]:
+        shutil.rmtree(os.path.join(generations_dir(root), name), ignore_errors=True)
+        print(f"Pruned index generation {name}.")
+
+
+def discard(path: str):
+    """Removes a generation whose build failed before promotion."""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def working_base(path: str):
+    """Generation a working store is based on (None: the legacy store; False: unknown)."""
+    try:
+        with open(os.path.join(path, WORKING_BASE)) as f:
+            return json.load(f).get("generation")
+    except (OSError, ValueError):
+        return False
+
+
+def _set_working_base(path: str, generation: Optional[str]):
+    tmp_path = os.path.join(path, f"{WORKING_BASE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"generation": generation, "updated_at": time.time()}, f)
+    os.replace(tmp_path, os.path.join(path, WORKING_BASE))
+
+
+def working_copy(root: str = INDEX_ROOT) -> str:
+    """The sync leader's writable store: reused while it is based on the live generation, else seeded from it.
+
+    Readers never open it; they see its contents once `publish` snapshots it
+    into a generation. A working store whose base is no longer live (a
+    rebuild or rollback promoted another generation) is not reused.
+    """
+    base = current_generation(root)
+    directory = working_dir(root)
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory), reverse=True):
+            path = os.path.join(directory, name)
+            if not name.endswith(".tmp") and working_base(path) == base:
+                return path
+    # A new directory each time: Chroma caches its client per path for the life of the process
+    path = os.path.join(directory, _new_name())
+    tmp_path = f"{path}.tmp"
+    seed = resolve_db_path(root)
+    if os.path.isdir(seed):
+        snapshot_store(seed, tmp_path)
+    else:
+        os.makedirs(tmp_path)
+    _set_working_base(tmp_path, base)
+    os.rename(tmp_path, path)
+    print(f"Seeded working store {path} from {seed}.")
+    return path
+
+
+def publish(working: str, root: str = INDEX_ROOT, **manifest) -> Optional[str]:
+    """Snapshots the leader's working store into a new generation and promotes it; returns its name.
+
+    Returns None (promoting nothing) if another generation went live since the
+    working store's base, e.g. a rebuild: that one must not be overwritten.
+    """
+    base = working_base(working)
+    path = new_generation(root, copy_from=working)
+    if current_generation(root) != base:
+        discard(path)
+        return None
+    name = promote(path, root, **manifest)
+    _set_working_base(working, name)
+    return name
+
+
+def prune_working(keep: str, root: str = INDEX_ROOT):
+    """Deletes working stores other than `keep` (superseded bases, interrupted seeds)."""
+    directory = working_dir(root)
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        path = os.path.join(directory, name)
+        if os.path.normpath(path) != os.path.normpath(keep):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def copy_to_memory(db_path: str, memory_dir: str = INDEX_MEMORY_DIR) -> str:
+    """Copies a promoted generation into a RAM-backed directory; returns the copy.
+
+    Generations never change once promoted, so one copy per generation is
+    shared by every worker and reused across restarts.
+    """
+    name = os.path.basename(os.path.normpath(db_path))
+    target = os.path.join(memory_dir, f"contextsync-{name}")
+    if not os.path.isdir(target):
+        started = time.perf_counter()
+        # Copy then rename, so a worker starting concurrently never opens a half-copied store
+        tmp_target = f"{target}.{os.getpid()}.tmp"
+        # Other workers may have the generation open, so its SQLite files go through the backup API
+        snapshot_store(db_path, tmp_target)
+        try:
+            os.rename(tmp_target, target)
+        except OSError:
+            # Another worker won the race
+            shutil.rmtree(tmp_target, ignore_errors=True)
+        print(f"Copied index {name} to {target} in {time.perf_counter() - started:.1f}s.")
+    else:
+        # Unchanged generation (a restart, or a rollback to it): reuse the copy, and keep pruning off it
+        os.utime(target)
+    return target
+
+
+def prune_memory_copies(memory_dir: str = INDEX_MEMORY_DIR, keep: int = 2):
+    """Frees RAM held by old copies, keeping the newest `keep` (workers may still be switching over)."""
+    if not memory_dir or not os.path.isdir(memory_dir):
+        return
+    copies = [
+        os.path.join(memory_dir, entry) for entry in os.listdir(memory_dir)
+        if entry.startswith("contextsync-") and not entry.endswith(".tmp")
+    ]
+    copies.sort(key=os.path.getmtime)
+    for path in copies[:max(len(copies) - keep, 0)]:
+        shutil.rmtree(path, ignore_errors=True)
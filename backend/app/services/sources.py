@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_SOURCES_PATH = os.path.join(BACKEND_ROOT, "sources.json")
+
+# Conservative defaults: Slack's conversations.* methods are Tier 3 (~50/min)
+DEFAULT_RATE_LIMITS = {"slack": 50, "jira": 100}
+
+
+class SourceConfig(BaseModel):
+    kind: str  # "slack" or "jira"
+    channel_id: Optional[str] = None
+    jql: Optional[str] = None
+    name: Optional[str] = None
+    rate_limit_per_minute: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        """Stable identifier, also used as the sync cursor key."""
+        return f"{self.kind}:{self.channel_id if self.kind == 'slack' else self.jql}"
+
+
+def load_sources(path: str = None) -> List[SourceConfig]:
+    """Loads the source registry from SOURCES_FILE (JSON list of SourceConfig)."""
+    path = path or os.environ.get("SOURCES_FILE", DEFAULT_SOURCES_PATH)
+    with open(path) as f:
+        entries = json.load(f)
+
+    sources = []
+    for entry in entries:
+        source = SourceConfig(**entry)
+        if source.kind == "slack" and not source.channel_id:
+            raise ValueError(f"Slack source is missing 'channel_id': {entry}")
+        if source.kind == "jira" and not source.jql:
+            raise ValueError(f"Jira source is missing 'jql': {entry}")
+        if source.kind not in DEFAULT_RATE_LIMITS:
+            raise ValueError(f"Unknown source kind '{source.kind}': {entry}")
+        sources.append(source)
+    return sources
+
+
+class RateLimiter:
+    """Spaces out API calls to at most `per_minute`; safe to share across threads."""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_allowed = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_allowed - now
+            self._next_allowed = max(now, self._next_allowed) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def limiter_for(source: SourceConfig) -> RateLimiter:
+    return RateLimiter(source.rate_limit_per_minute or DEFAULT_RATE_LIMITS[source.kind])
@@ -0,0 +1,77 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_SUMMARY_PATH = os.path.join(BACKEND_ROOT, "summary_cache.sqlite3")
+
+_NUMBERED_LINE_RE = re.compile(r"^\s*\[?(\d+)[\].):]\s*(.+?)\s*$")
+
+
+class SummaryStore:
+    """Persistent one-sentence summaries keyed by chunk content hash."""
+
+    def __init__(self, path: str = DEFAULT_SUMMARY_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries (hash TEXT PRIMARY KEY, summary TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, hashes: List[str]) -> Dict[str, str]:
+        unique = list(dict.fromkeys(hashes))
+        if not unique:
+            return {}
+        placeholders = ",".join("?" * len(unique))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT hash, summary FROM summaries WHERE hash IN ({placeholders})", unique
+            ).fetchall()
+            found = dict(rows)
+            self.hits += sum(1 for h in unique if h in found)
+            self.misses += sum(1 for h in unique if h not in found)
+        return found
+
+    def put_many(self, summaries: Dict[str, str]):
+        if not summaries:
+            return
+        with self._lock:
+            now = time.time()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO summaries (hash, summary, created) VALUES (?, ?, ?)",
+                [(h, summary, now) for h, summary in summaries.items()],
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+def build_batch_prompt(contents: List[str]) -> str:
+    """One prompt that asks for a numbered one-sentence summary per item."""
+    items = "\n\n".join(f"[{i}]\n{content}" for i, content in enumerate(contents, start=1))
+    return (
+        f"Summarize each of the following {len(contents)} context items in one concise sentence for a developer.\n"
+        f"Reply with exactly {len(contents)} lines, one per item, formatted as `[n] summary`.\n\n{items}"
+    )
+
+
+def parse_batch_response(text: str, count: int) -> Dict[int, str]:
+    """Maps 0-based item index to its summary; items the model skipped are absent."""
+    parsed = {}
+    for line in text.splitlines():
+        match = _NUMBERED_LINE_RE.match(line)
+        if match:
+            index = int(match.group(1)) - 1
+            if 0 <= index < count and index not in parsed:
+                parsed[index] = match.group(2)
+    return parsed
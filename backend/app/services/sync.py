@@ -0,0 +1,159 @@
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List
+
+from app.services.data_processing import parse_jira_time, process_slack_data, process_slack_thread, process_jira_data
+from app.services.pipeline import IngestionPipeline
+from app.services.sources import SourceConfig, limiter_for
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_STATE_PATH = os.path.join(BACKEND_ROOT, "sync_state.json")
+# Cursors live inside the store they describe, so generations and rebuilds carry them along with the data
+STATE_FILE = "sync_state.json"
+
+# How far back the very first sync of a source reaches
+INITIAL_LOOKBACK_DAYS = int(os.environ.get("SYNC_INITIAL_LOOKBACK_DAYS", "30"))
+# Re-read a little before the Jira cursor; minute-granular JQL and clock skew would otherwise drop edits
+JIRA_OVERLAP_MINUTES = int(os.environ.get("SYNC_JIRA_OVERLAP_MINUTES", "5"))
+# Threads started within this window are re-checked for new replies
+SLACK_THREAD_LOOKBACK_DAYS = int(os.environ.get("SLACK_THREAD_LOOKBACK_DAYS", "14"))
+# ...but only this often: re-paging the whole window costs many history calls, so other syncs read new messages only
+SLACK_THREAD_RESCAN_MINUTES = int(os.environ.get("SLACK_THREAD_RESCAN_MINUTES", "60"))
+# Reply fetches in flight per channel; the channel's rate limiter still paces them
+SLACK_THREAD_CONCURRENCY = int(os.environ.get("SLACK_THREAD_CONCURRENCY", "4"))
+
+
+class SyncState:
+    """Persisted high-water marks, one per source key."""
+
+    def __init__(self, path: str = DEFAULT_STATE_PATH):
+        # path=None keeps cursors in memory only (one-shot rebuilds)
+        self.path = path
+        self.cursors = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.cursors = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read sync state, starting fresh: {e}")
+
+    def get(self, key: str):
+        return self.cursors.get(key)
+
+    def set(self, key: str, value):
+        self.cursors[key] = value
+
+    def save(self):
+        if not self.path:
+            return
+        # Write-then-rename so a crash never leaves a half-written state file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.cursors, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def store_state(db_path: str) -> SyncState:
+    """Cursors of the store at `db_path`; a store from before they moved in starts from the global file."""
+    state = SyncState(os.path.join(db_path, STATE_FILE))
+    if not os.path.exists(state.path) and os.path.isdir(db_path) and os.listdir(db_path):
+        state.cursors = SyncState(DEFAULT_STATE_PATH).cursors
+    return state
+
+
+class SyncEngine:
+    """Fetches only what changed since the last sync, for every registered source."""
+
+    def __init__(self, integration_service, rag_service, sources: List[SourceConfig], state: SyncState = None):
+        self.integration_service = integration_service
+        self.rag_service = rag_service
+        self.sources = sources
+        self.state = state or SyncState()
+        # Limiters outlive a single run so back-to-back syncs still respect API quotas
+        self.limiters = {source.key: limiter_for(source) for source in sources}
+
+    def _fetch_slack(self, source: SourceConfig):
+        """Fetches new top-level messages plus every thread whose latest reply moved."""
+        channel_id = source.channel_id
+        now = time.time()
+        cursor = self.state.get(source.key) or {}
+        if isinstance(cursor, str):
+            # State written before thread tracking was just the newest message ts
+            cursor = {"ts": cursor, "threads": {}}
+        last_ts = cursor.get("ts")
+        known_threads = cursor.get("threads", {})
+        rescanned = cursor.get("rescanned", 0)
+
+        # Now and then reach back far enough to see reply activity on recent threads, not just new messages
+        thread_window = now - SLACK_THREAD_LOOKBACK_DAYS * 86400
+        if not last_ts:
+            oldest, rescanned = str(now - INITIAL_LOOKBACK_DAYS * 86400), now
+        elif now - rescanned >= SLACK_THREAD_RESCAN_MINUTES * 60:
+            oldest, rescanned = str(min(float(last_ts), thread_window)), now
+        else:
+            oldest = last_ts
+        throttle = self.limiters[source.key].wait
+        messages = self.integration_service.fetch_channel_history(
+            channel_id, limit=200, oldest=oldest, throttle=throttle
+        )
+
+        singles, changed = [], []
+        for msg in messages:
+            ts = msg.get("ts")
+            if msg.get("thread_ts") and msg.get("thread_ts") != ts:
+                continue  # broadcast reply, indexed as part of its thread
+            if msg.get("reply_count"):
+                if known_threads.get(ts) != msg.get("latest_reply"):
+                    changed.append(msg)
+            elif not last_ts or float(ts) > float(last_ts):
+                singles.append(msg)
+
+        docs = process_slack_data(singles, channel_id)
+        threads = {ts: latest for ts, latest in known_threads.items() if float(ts) >= thread_window}
+        if changed:
+            with ThreadPoolExecutor(max_workers=SLACK_THREAD_CONCURRENCY) as pool:
+                fetched = pool.map(
+                    lambda msg: self.integration_service.get_slack_thread(channel_id, msg["ts"], throttle=throttle),
+                    changed,
+                )
+                for msg, thread in zip(changed, fetched):
+                    # A failed fetch leaves the thread unrecorded so the next sync retries it
+                    if thread:
+                        docs.append(process_slack_thread(thread, channel_id))
+                        threads[msg["ts"]] = msg.get("latest_reply")
+            print(f"Slack {channel_id}: expanded {len(changed)} new or updated threads")
+
+        newest = max((m["ts"] for m in messages if m.get("ts")), key=float, default=last_ts)
+        return docs, {"ts": newest, "threads": threads, "rescanned": rescanned} if newest else None
+
+    def _fetch_jira(self, source: SourceConfig):
+        cursor = self.state.get(source.key)
+        if cursor:
+            elapsed = time.time() - parse_jira_time(cursor)
+            window = max(math.ceil(elapsed / 60), 0) + JIRA_OVERLAP_MINUTES
+        else:
+            window = INITIAL_LOOKBACK_DAYS * 24 * 60
+        tickets = self.integration_service.search_jira_tickets(
+            source.jql, limit=100, updated_within_minutes=window, throttle=self.limiters[source.key].wait
+        )
+        docs = process_jira_data(tickets)
+        updated = [t["updated"] for t in tickets if t.get("updated")]
+        newest = max(updated, key=parse_jira_time) if updated else None
+        return docs, newest
+
+    async def run(self) -> dict:
+        """Runs one incremental sync pass over every source through the ingestion pipeline."""
+        fetchers = {"slack": self._fetch_slack, "jira": self._fetch_jira}
+        jobs = [(source.key, partial(fetchers[source.kind], source)) for source in self.sources]
+        stats = await IngestionPipeline(self.rag_service).run(jobs)
+
+        # Only advance cursors once the data is safely in the vector store
+        for key, newest in stats.pop("cursors").items():
+            if newest:
+                self.state.set(key, newest)
+        self.state.save()
+        return stats
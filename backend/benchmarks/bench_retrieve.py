@@ -0,0 +1,85 @@
+"""Concurrent /context/retrieve latency, blocking vs. executor-backed retrieval.
+
+Run from backend/:  python -m benchmarks.bench_retrieve --requests 64 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app import main
+from app.services.rag import RAGService
+from app.services.summary_store import SummaryStore
+from benchmarks.fakes import FakeEmbeddings, percentile
+
+
+def build_service(latency: float) -> RAGService:
+    workdir = tempfile.mkdtemp(prefix="bench_retrieve_")
+    service = RAGService(
+        db_path=os.path.join(workdir, "chroma_db"),
+        embeddings=FakeEmbeddings(latency=latency),
+        llm=FakeListChatModel(responses=["Summary."]),
+    )
+    # Keep benchmark summaries out of the real cache file
+    service.summary_store = SummaryStore(path=os.path.join(workdir, "summary_cache.sqlite3"))
+    with open("data/mock_slack.json") as f:
+        docs = [Document(page_content=m["message"], metadata={"source": "slack", "user": m["user"]}) for m in json.load(f)]
+    service.add_documents(docs)
+    return service
+
+
+async def blocking_aretrieve(service, query, k=5, query_vector=None, filters=None):
+    # The pre-change behaviour: the sync call runs directly on the event loop
+    return service.retrieve_with_scores(query, k, query_vector, filters)
+
+
+async def run_burst(n: int) -> list:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            payload = {"code_snippet": f"def retry_payment_{i}(): pass", "file_path": "x.py", "line_numbers": "1-1"}
+            start = time.perf_counter()
+            response = await client.post("/context/retrieve", json=payload)
+            response.raise_for_status()
+            return time.perf_counter() - start
+        return await asyncio.gather(*(one(i) for i in range(n)))
+
+
+def report(label: str, samples: list) -> dict:
+    result = {
+        "mode": label,
+        "requests": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+    print(f"{label:>9}: p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms")
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=64, help="concurrent requests per burst")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake embedding latency in seconds")
+    args = parser.parse_args()
+
+    service = build_service(args.latency)
+    main.rag_service = service
+
+    results = []
+    service.aretrieve = lambda query, k=5, query_vector=None, filters=None: blocking_aretrieve(
+        service, query, k, query_vector, filters)
+    results.append(report("blocking", asyncio.run(run_burst(args.requests))))
+
+    del service.aretrieve
+    results.append(report("executor", asyncio.run(run_burst(args.requests))))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,165 @@
+"""End-to-end benchmark against local fakes: ingest throughput, retrieval and /explain latency.
+
+Nothing here touches Slack, Jira or Gemini. The corpus is the mock data in
+data/ scaled up synthetically; results are written as JSON so runs from
+different commits can be diffed.
+
+Run from backend/:  python -m benchmarks.bench_suite --items 10000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import httpx
+
+from app import main
+from app.services.integrations import IntegrationService
+from app.services.rag import RAGService
+from app.services.sources import SourceConfig
+from app.services.summary_store import SummaryStore
+from app.services.sync import SyncEngine, SyncState
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings, FakeJira, FakeSlackClient, percentile, synthetic_corpus
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# Fakes never rate limit, so neither should the sync engine
+UNLIMITED = 10 ** 9
+
+QUERIES = [
+    "def process_payment(order_id, amount):\n    for attempt in range(3):\n        return gateway_v2.charge(order_id, amount)",
+    "idempotency_key = request.headers.get('Idempotency-Key')",
+    "def cleanup_legacy_v1_adapter(): pass",
+    "refund = ledger.reverse(charge_id)",
+    "webhook_retry_policy = ExponentialBackoff(max_attempts=5)",
+]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def latency_stats(samples: list, wall: float) -> dict:
+    return {
+        "requests": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0,
+        "throughput_rps": len(samples) / wall if wall else 0.0,
+    }
+
+
+def bench_ingest(args, workdir: str) -> tuple:
+    corpus = synthetic_corpus(args.items, channels=args.channels, seed=args.seed)
+    slack = FakeSlackClient(corpus["channels"], corpus["threads"], latency=args.api_latency)
+    jira = FakeJira(corpus["issues"], latency=args.api_latency)
+    integrations = IntegrationService(slack_client=slack, jira=jira)
+
+    service = RAGService(
+        db_path=os.path.join(workdir, "chroma_db"),
+        embeddings=FakeEmbeddings(dim=args.dim, latency=args.embed_latency),
+        llm=FakeChatModel(responses=["## ⚡ Context Analysis\n* **Relevance**: High - benchmark."], latency=args.llm_latency),
+    )
+    # Keep benchmark summaries out of the real cache file
+    service.summary_store = SummaryStore(path=os.path.join(workdir, "summary_cache.sqlite3"))
+
+    sources = [SourceConfig(kind="slack", channel_id=cid, rate_limit_per_minute=UNLIMITED) for cid in corpus["channels"]]
+    sources.append(SourceConfig(kind="jira", jql="project = BENCH", rate_limit_per_minute=UNLIMITED))
+    engine = SyncEngine(integrations, service, sources, state=SyncState(path=None))
+
+    start = time.perf_counter()
+    stats = asyncio.run(engine.run())
+    elapsed = time.perf_counter() - start
+    result = {
+        "items_fetched": stats["items_fetched"],
+        "chunks_written": stats["chunks_written"],
+        "failed_sources": stats["failed_sources"],
+        "seconds": elapsed,
+        "chunks_per_second": stats["chunks_written"] / elapsed if elapsed else 0.0,
+        "api_calls": {"slack": slack.calls, "jira": jira.calls},
+    }
+    print(f"   ingest: {result['chunks_written']} chunks in {elapsed:.1f}s ({result['chunks_per_second']:.0f} chunks/s)")
+    return service, result
+
+
+async def bench_retrieval(service: RAGService, requests: int, concurrency: int) -> dict:
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with slots:
+            start = time.perf_counter()
+            await service.aretrieve(f"{QUERIES[i % len(QUERIES)]}  # {i}")
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    samples = await asyncio.gather(*(one(i) for i in range(requests)))
+    return latency_stats(samples, time.perf_counter() - start)
+
+
+async def bench_explain(requests: int, concurrency: int) -> dict:
+    slots = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i):
+            # Distinct snippets, so the answer cache doesn't turn this into a cache benchmark
+            payload = {"code_snippet": f"{QUERIES[i % len(QUERIES)]}\nrequest_{i} = {i}",
+                       "file_path": "payment_processor.py", "line_numbers": "1-3"}
+            async with slots:
+                start = time.perf_counter()
+                response = await client.post("/explain", json=payload)
+                response.raise_for_status()
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(one(i) for i in range(requests)))
+    return latency_stats(samples, time.perf_counter() - start)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10000, help="synthetic Slack messages + Jira tickets (roughly chunks)")
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=256, help="fake embedding dimension")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--requests", type=int, default=200, help="requests per latency phase")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds per fake Slack/Jira call")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds per fake embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as workdir:
+        service, ingest = bench_ingest(args, workdir)
+        main.rag_service = service
+
+        retrieval = asyncio.run(bench_retrieval(service, args.requests, args.concurrency))
+        print(f"retrieval: p50={retrieval['p50_ms']:.1f}ms p99={retrieval['p99_ms']:.1f}ms")
+        explain = asyncio.run(bench_explain(args.requests, args.concurrency))
+        print(f"  explain: p50={explain['p50_ms']:.1f}ms p99={explain['p99_ms']:.1f}ms")
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "ingest": ingest,
+        "retrieval": retrieval,
+        "explain": explain,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main_cli()
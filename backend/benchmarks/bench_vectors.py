@@ -0,0 +1,155 @@
+"""Vector store comparison: Chroma (HNSW, float32) vs. the quantized store (int8 memmap + IVF).
+
+Synthetic clustered unit vectors stand in for chunk embeddings; ground truth
+is an exact float32 scan. Each backend is built and queried in its own
+process so resident memory is measured without the other one loaded.
+
+Run from backend/:  python -m benchmarks.bench_vectors --rows 200000 --dim 768
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fakes import percentile
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+CHANNELS = 20
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def corpus(rows: int, dim: int, queries: int, seed: int):
+    """Clustered vectors (like topics in a Slack/Jira corpus), metadata and held-out queries."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(rows // 500, 8), dim)).astype(np.float32)
+
+    def sample(n):
+        points = centers[rng.integers(len(centers), size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    vectors, query_vectors = sample(rows), sample(queries)
+    channels = rng.integers(CHANNELS, size=rows)
+    metadatas = [
+        {"source": "slack" if c else "jira", "channel": f"c{c}", "source_id": f"item-{i // 3}", "timestamp_epoch": float(i)}
+        for i, c in enumerate(channels)
+    ]
+    return vectors, metadatas, query_vectors
+
+
+def ground_truth(vectors, metadatas, query_vectors, k: int, where: dict):
+    allowed = np.array([all(meta.get(f) == v for f, v in (where or {}).items()) for meta in metadatas])
+    truth = []
+    for query in query_vectors:
+        scores = vectors @ query
+        scores[~allowed] = -np.inf
+        truth.append(set(np.argsort(-scores)[:k].tolist()))
+    return truth
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def open_backend(backend: str, path: str):
+    if backend == "quantized":
+        from app.services.quantized_store import QuantizedVectorStore
+        return QuantizedVectorStore(path)
+    import chromadb
+    client = chromadb.PersistentClient(path=path)
+    return client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"}, embedding_function=None)
+
+
+def run_backend(args) -> dict:
+    vectors, metadatas, query_vectors = corpus(args.rows, args.dim, args.queries, args.seed)
+    path = os.path.join(args.workdir, args.backend)
+    ids = [f"chunk-{i}" for i in range(args.rows)]
+
+    store = open_backend(args.backend, path)
+    start = time.perf_counter()
+    for offset in range(0, args.rows, args.batch):
+        end = offset + args.batch
+        store.upsert(ids=ids[offset:end], embeddings=vectors[offset:end].tolist(),
+                     documents=[f"chunk {i}" for i in range(offset, min(end, args.rows))], metadatas=metadatas[offset:end])
+    build_seconds = time.perf_counter() - start
+    del store
+
+    # Reopen, as a freshly started worker would
+    baseline = rss_bytes()
+    store = open_backend(args.backend, path)
+    result = {"backend": args.backend, "build_seconds": build_seconds, "disk_bytes": dir_bytes(path)}
+    for label, where in (("unfiltered", None), ("filtered", {"channel": "c3"})):
+        truth = ground_truth(vectors, metadatas, query_vectors, args.k, where)
+        latencies, recalls = [], []
+        for query, expected in zip(query_vectors, truth):
+            start = time.perf_counter()
+            hits = store.query(query_embeddings=[query.tolist()], n_results=args.k, where=where, include=["distances"])
+            latencies.append(time.perf_counter() - start)
+            found = {int(chunk_id.split("-")[1]) for chunk_id in hits["ids"][0]}
+            recalls.append(len(found & expected) / max(len(expected), 1))
+        result[label] = {
+            f"recall_at_{args.k}": sum(recalls) / len(recalls),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    result["resident_bytes_after_queries"] = rss_bytes() - baseline
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=5000, help="vectors per upsert")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--backends", default="chroma,quantized")
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_vectors_")
+    report = {"commit": git_commit(), "rows": args.rows, "dim": args.dim, "k": args.k, "backends": []}
+    for backend in args.backends.split(","):
+        output = subprocess.check_output([
+            sys.executable, "-m", "benchmarks.bench_vectors", "--backend", backend, "--workdir", workdir,
+            "--rows", str(args.rows), "--dim", str(args.dim), "--queries", str(args.queries),
+            "--k", str(args.k), "--batch", str(args.batch), "--seed", str(args.seed),
+        ], text=True)
+        result = json.loads(output.strip().splitlines()[-1])
+        report["backends"].append(result)
+        print(f"{backend:>9}: build {result['build_seconds']:.1f}s, disk {result['disk_bytes'] / 2 ** 20:.0f} MiB, "
+              f"resident +{result['resident_bytes_after_queries'] / 2 ** 20:.0f} MiB, "
+              f"recall@{args.k} {result['unfiltered'][f'recall_at_{args.k}']:.3f} "
+              f"(filtered {result['filtered'][f'recall_at_{args.k}']:.3f}), "
+              f"p50 {result['unfiltered']['p50_ms']:.2f}ms p99 {result['unfiltered']['p99_ms']:.2f}ms")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = os.path.join(RESULTS_DIR, f"vectors-{report['commit']}-{args.rows}x{args.dim}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.services.embeddings import HashingEmbeddings
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+class FakeEmbeddings(HashingEmbeddings):
+    """Hashing embedder; `latency` simulates a blocking network round trip."""
+
+    def __init__(self, dim: int = 64, latency: float = 0.0):
+        super().__init__(dim)
+        self.latency = latency
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.latency:
+            time.sleep(self.latency)
+        return super().embed_query(text)
+
+class FakeChatModel(FakeListChatModel):
+    """Canned-answer chat model; `latency` simulates the LLM round trip."""
+
+    latency: float = 0.0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return super()._generate(messages, stop=stop, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        # Sleep on the event loop, like a real async HTTP client would wait
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return super()._generate(messages, stop=stop, **kwargs)
+
+
+class FakeSlackClient:
+    """Stands in for slack_sdk.WebClient: conversations.history/replies with cursor paging."""
+
+    def __init__(self, channels: Dict[str, List[dict]], threads: Dict[str, List[dict]], latency: float = 0.0):
+        # Slack returns history newest first
+        self.channels = {cid: sorted(msgs, key=lambda m: float(m["ts"]), reverse=True) for cid, msgs in channels.items()}
+        self.threads = threads
+        self.latency = latency
+        self.calls = 0
+
+    def _page(self, items: List[dict], limit: int, cursor: str = None) -> dict:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        start = int(cursor or 0)
+        page = items[start:start + limit]
+        has_more = start + limit < len(items)
+        return {
+            "ok": True,
+            "messages": page,
+            "has_more": has_more,
+            "response_metadata": {"next_cursor": str(start + limit) if has_more else ""},
+        }
+
+    def conversations_history(self, channel: str, limit: int = 100, oldest: str = None, cursor: str = None, **kwargs):
+        messages = self.channels.get(channel, [])
+        if oldest:
+            messages = [m for m in messages if float(m["ts"]) > float(oldest)]
+        return self._page(messages, limit, cursor)
+
+    def conversations_replies(self, channel: str, ts: str, limit: int = 100, cursor: str = None, **kwargs):
+        return self._page(self.threads.get(ts, []), limit, cursor)
+
+
+class _ResultList(list):
+    """jira.client.ResultList: a list that also knows the total hit count."""
+
+    def __init__(self, items, total):
+        super().__init__(items)
+        self.total = total
+
+
+class FakeJira:
+    """Stands in for jira.JIRA; ignores the JQL and pages through every issue."""
+
+    def __init__(self, issues: List[dict], latency: float = 0.0):
+        self.issues = [self._to_issue(issue) for issue in issues]
+        self.latency = latency
+        self.calls = 0
+
+    @staticmethod
+    def _to_issue(issue: dict):
+        fields = SimpleNamespace(
+            summary=issue["title"],
+            description=issue["description"],
+            status=SimpleNamespace(name=issue["status"]),
+            creator=SimpleNamespace(displayName=issue.get("creator", "Bench Bot")),
+            updated=issue["updated"],
+        )
+        return SimpleNamespace(key=issue["id"], fields=fields)
+
+    def search_issues(self, jql: str, startAt: int = 0, maxResults: int = 50, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return _ResultList(self.issues[startAt:startAt + maxResults], len(self.issues))
+
+
+def _jira_time(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+
+
+def synthetic_corpus(items: int, channels: int = 4, thread_every: int = 10, seed: int = 7,
+                     data_dir: str = DATA_DIR) -> dict:
+    """Scales the mock Slack/Jira seed data up to roughly `items` documents.
+
+    Returns {"channels": {id: messages}, "threads": {ts: messages}, "issues": [...]}.
+    Every `thread_every`-th Slack message gets a thread of replies. Text is
+    recombined from the seed messages plus vocabulary and identifiers, so
+    lexical and vector search have realistic near-duplicates to separate.
+    """
+    rng = random.Random(seed)
+    with open(os.path.join(data_dir, "mock_slack.json")) as f:
+        slack_seed = json.load(f)
+    with open(os.path.join(data_dir, "mock_jira.json")) as f:
+        jira_seed = json.load(f)
+    vocabulary = sorted({w.strip(".,:;!?()`'\"") for m in slack_seed for w in m["message"].split()} - {""})
+    users = sorted({m["user"] for m in slack_seed})
+
+    def sentence(base: str, n: int) -> str:
+        extra = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(4, 12)))
+        return f"{base} [{n}] `{rng.choice(['retry', 'charge', 'refund', 'ledger', 'webhook'])}_{n % 97}` {extra}"
+
+    now = time.time()
+    # Spread over 20 days so the default 30-day initial sync sees everything
+    span = 20 * 86400
+    jira_count = max(1, items // 5)
+    slack_count = items - jira_count
+    channel_ids = [f"CBENCH{i:03d}" for i in range(channels)]
+    corpus = {"channels": {cid: [] for cid in channel_ids}, "threads": {}, "issues": []}
+
+    for n in range(slack_count):
+        seed_msg = slack_seed[n % len(slack_seed)]
+        ts = f"{now - span + span * n / max(slack_count, 1):.6f}"
+        message = {"ts": ts, "user": rng.choice(users), "text": sentence(seed_msg["message"], n)}
+        if thread_every and n % thread_every == 0:
+            replies = [
+                {"ts": f"{float(ts) + r + 1:.6f}", "thread_ts": ts, "user": rng.choice(users),
+                 "text": sentence(rng.choice(slack_seed)["message"], n)}
+                for r in range(rng.randint(2, 5))
+            ]
+            message.update(thread_ts=ts, reply_count=len(replies), latest_reply=replies[-1]["ts"])
+            corpus["threads"][ts] = [message] + replies
+        corpus["channels"][channel_ids[n % channels]].append(message)
+
+    for n in range(jira_count):
+        seed_issue = jira_seed[n % len(jira_seed)]
+        corpus["issues"].append({
+            "id": f"BENCH-{n + 1}",
+            "title": seed_issue["title"],
+            "description": sentence(seed_issue["description"], n),
+            "status": seed_issue["status"],
+            "updated": _jira_time(now - span + span * n / jira_count),
+        })
+    return corpus
+
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
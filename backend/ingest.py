@@ -1,109 +1,168 @@
-import json
+import argparse
+import asyncio
 import os
-import shutil
 from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 load_dotenv()
 
-DB_PATH = "backend/chroma_db"
-
+from app.services import snapshots
+from app.services.bulk_import import BulkImporter
+from app.services.code_index import CODE_INDEX_ROOT
+from app.services.embeddings import EMBEDDING_PROVIDER
 from app.services.integrations import IntegrationService
+from app.services.leader import LeaderLock, bump_generation
+from app.services.rag import RAGService
+from app.services.sources import load_sources
+from app.services.sync import SyncEngine, SyncState, store_state
 
-# User Configuration
-SLACK_CHANNEL_ID = "C0AF6J4ELGG"
-JIRA_JQL = "text ~ 'Gateway V2' ORDER BY created DESC"
-
-def load_real_data():
-    """Fetches real data from Slack and Jira."""
-    service = IntegrationService()
-    
-    print(f"Fetching Slack messages from {SLACK_CHANNEL_ID}...")
-    slack_data = service.fetch_channel_history(SLACK_CHANNEL_ID, limit=50)
-    
-    print(f"Fetching Jira tickets ({JIRA_JQL})...")
-    jira_data = service.search_jira_tickets(JIRA_JQL, limit=50)
-    
-    return slack_data, jira_data
+def reembed():
+    """Re-embeds a copy of the leader's store with the configured EMBEDDING_PROVIDER, then promotes it."""
+    if not os.path.exists(snapshots.resolve_db_path()):
+        print(f"Error: Database path {snapshots.resolve_db_path()} does not exist. Run ingest.py first.")
+        return
+    # Work on a copy (of the working store, which may hold writes not yet published): the live generation keeps serving
+    path = snapshots.new_generation(copy_from=snapshots.working_copy())
+    try:
+        rag_service = RAGService(db_path=path)
+        count = rag_service.reembed_collection()
+    except Exception as e:
+        snapshots.discard(path)
+        print(f"Error during re-embedding, live index unchanged: {e}")
+        return
+    name = snapshots.promote(path, kind="reembed", provider=EMBEDDING_PROVIDER, chunks=count)
+    bump_generation()
+    print(f"Success! Re-embedded {count} chunks into generation {name} with provider '{EMBEDDING_PROVIDER}'")
 
-def process_slack_data(data):
-    """Converts Slack messages into documents with metadata."""
-    documents = []
-    for msg in data:
-        # Skip messages without text (e.g. join events)
-        if "text" not in msg:
-            continue
-            
-        # Create "Meta-Chunk": Prepend Date and Author
-        # Note: Slack API returns 'ts' (timestamp) and 'user' (user ID)
-        content = f"Date: {msg.get('ts')} | Author: {msg.get('user')} | Channel: {SLACK_CHANNEL_ID}\nMessage: {msg.get('text')}"
-        meta = {
-            "source": "slack",
-            "user": msg.get('user'),
-            "channel": SLACK_CHANNEL_ID,
-            "timestamp": msg.get('ts'),
-            "url": f"https://slack.com/archives/{SLACK_CHANNEL_ID}/p{msg.get('ts').replace('.', '')}" if msg.get('ts') else None
-        }
-        documents.append(Document(page_content=content, metadata=meta))
-    return documents
+def bulk_import(paths, fresh: bool = False):
+    """Imports Slack workspace exports and Jira JSON/CSV exports into the leader's store, then publishes it (no API calls)."""
+    if EMBEDDING_PROVIDER == "google" and not os.getenv("GOOGLE_API_KEY"):
+        print("CRITICAL: GOOGLE_API_KEY not found in environment variables. Please set it in a .env file.")
+        return
+    # Generations are immutable: write where the sync leader does, then publish a new one
+    db_path = snapshots.working_copy()
+    rag_service = RAGService(db_path=db_path)
+    stats = BulkImporter(rag_service, fresh=fresh).run(paths)
+    rag_service.close()
+    name = snapshots.publish(db_path, kind="import", items=stats["items_imported"], chunks=stats["chunks_written"])
+    if name is None:
+        # The import (and its checkpoints) stay in a superseded working store that gets pruned
+        print("Error: another generation went live during the import (a rebuild?); nothing was published. "
+              "Run the import again.")
+        raise SystemExit(1)
+    bump_generation()
+    print(f"Success! Imported {stats['items_imported']} items ({stats['items_skipped']} already done) from "
+          f"{stats['sources']} sources into generation {name}: {stats['chunks_written']} chunks in {stats['seconds']:.1f}s "
+          f"({stats['chunks_per_second']:.1f} chunks/s)")
 
-def process_jira_data(data):
-    """Converts Jira tickets into documents with metadata."""
-    documents = []
-    for ticket in data:
-        # Create "Meta-Chunk"
-        content = f"Ticket: {ticket['key']} | Title: {ticket['summary']}\nDescription: {ticket['description'] or 'No description'}"
-        meta = {
-            "source": "jira",
-            "id": ticket['key'],
-            "title": ticket['summary'],
-            "status": ticket['status'],
-            "creator": ticket['creator']
-        }
-        documents.append(Document(page_content=content, metadata=meta))
-    return documents
+def ingest(code_root: str = CODE_INDEX_ROOT, allow_partial: bool = False, from_scratch: bool = False):
+    """Main ingestion function: builds a new index generation and promotes it once complete.
 
-def ingest():
-    """Main ingestion function."""
-    # Check for API KEY
-    if not os.getenv("GOOGLE_API_KEY"):
+    The build starts from a copy of the live generation (history beyond the
+    lookback window and bulk imports included) and re-reads the lookback window
+    on top of it; `from_scratch` starts empty instead.
+    """
+    # Check for API KEY (only the Google provider needs it to embed)
+    if EMBEDDING_PROVIDER == "google" and not os.getenv("GOOGLE_API_KEY"):
         print("CRITICAL: GOOGLE_API_KEY not found in environment variables. Please set it in a .env file.")
         return
 
-    print("Loading REAL data from Integrations...")
-    slack_data, jira_data = load_real_data()
-    
-    docs = []
-    docs.extend(process_slack_data(slack_data))
-    docs.extend(process_jira_data(jira_data))
-    print(f"Loaded {len(docs)} documents ({len(slack_data)} Slack, {len(jira_data)} Jira).")
+    # Same source registry as the live service (sources.json or SOURCES_FILE)
+    sources = load_sources()
+    print(f"Loading REAL data from {len(sources)} sources...")
 
-    # Chunking
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    splits = text_splitter.split_documents(docs)
-    print(f"Created {len(splits)} text chunks.")
-
-    # Embedding & Storage
-    print("Initializing Vector Store (ChromaDB)...")
+    # Build next to the live index rather than over it: it keeps serving until the swap
+    path = snapshots.new_generation(copy_from=None if from_scratch else snapshots.resolve_db_path())
     try:
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001")
-        
-        # Reset DB if exists to avoid duplicates in this simple script
-        if os.path.exists(DB_PATH):
-            shutil.rmtree(DB_PATH)
+        print(f"Initializing Vector Store (ChromaDB) in {path}...")
+        rag_service = RAGService(db_path=path)
+        if not from_scratch:
+            # Stores from before stable chunk IDs: the re-fetched items would otherwise be indexed twice
+            dropped = rag_service.drop_legacy_chunks()
+            if dropped:
+                print(f"Dropped {dropped} chunks with pre-stable (MD5) IDs; items older than the lookback "
+                      f"window must be re-imported with --import.")
+
+        # Fresh in-memory cursors: a rebuild re-reads the full lookback window.
+        # Embeddings still come from the shared on-disk cache, so unchanged chunks are free.
+        fetched = SyncState(path=None)
+        engine = SyncEngine(IntegrationService(), rag_service, sources, state=fetched)
+        stats = asyncio.run(engine.run())
+        # The generation carries its cursors; the copied ones stay for sources that had nothing new (or failed).
+        # Whatever the sync leader fetched meanwhile is newer than them, so it syncs it again once this is live.
+        state = store_state(path)
+        state.cursors.update(fetched.cursors)
+        state.save()
 
-        vectorstore = Chroma.from_documents(
-            documents=splits,
-            embedding=embeddings,
-            persist_directory=DB_PATH
-        )
-        print(f"Success! Ingested {len(splits)} chunks into {DB_PATH}")
+        print(f"Ingested {stats['chunks_written']} chunks from {stats['items_fetched']} items "
+              f"in {stats['seconds']:.1f}s ({stats['chunks_per_second']:.1f} chunks/s)")
+        if stats["failed_sources"] and not allow_partial:
+            raise RuntimeError(f"failed sources {stats['failed_sources']} (use --allow-partial to promote anyway)")
+        if code_root and rag_service.code_index:
+            # After the discussions, so every code unit links against the full corpus
+            rag_service.code_index.refresh(code_root, stats["written_ids"], stats["deleted_ids"])
+        cache = getattr(rag_service._get_embeddings(), "cache", None)
+        if cache:
+            print(f"Embedding cache: {cache.stats()}")
     except Exception as e:
-        print(f"Error during ingestion: {e}")
+        snapshots.discard(path)
+        print(f"Error during ingestion, live index unchanged: {e}")
+        return
+
+    name = snapshots.promote(path, kind="rebuild", provider=EMBEDDING_PROVIDER,
+                             items=stats["items_fetched"], chunks=stats["chunks_written"])
+    # Running servers reopen the new generation
+    bump_generation()
+    print(f"Success! Generation {name} is now live.")
+
+def list_generations():
+    for generation in snapshots.list_generations():
+        marker = "*" if generation["current"] else " "
+        details = ", ".join(f"{k}={v}" for k, v in generation.items() if k not in ("name", "current"))
+        print(f"{marker} {generation['name']}  {details}")
+
+def rollback():
+    name = snapshots.rollback()
+    if name is None:
+        print("Error: no previous generation to roll back to.")
+        return
+    bump_generation()
+    print(f"Rolled back; generation {name} is now live.")
 
 if __name__ == "__main__":
-    ingest()
+    parser = argparse.ArgumentParser(description="Build the ContextSync vector store.")
+    parser.add_argument("--reembed", action="store_true",
+                        help="re-embed the existing collection from its stored text instead of re-fetching sources")
+    parser.add_argument("--import", dest="import_paths", nargs="+", metavar="PATH",
+                        help="bulk-import Slack workspace exports (dir or .zip) and Jira JSON/NDJSON/CSV exports "
+                             "into the existing store; interrupted imports resume from their checkpoint")
+    parser.add_argument("--fresh", action="store_true", help="with --import: ignore checkpoints and re-import everything")
+    parser.add_argument("--code-root", default=CODE_INDEX_ROOT,
+                        help="workspace whose Python code is indexed and linked to the discussions (default: CODE_INDEX_ROOT)")
+    parser.add_argument("--allow-partial", action="store_true",
+                        help="promote a rebuild even if some sources failed to fetch")
+    parser.add_argument("--from-scratch", action="store_true",
+                        help="rebuild from the sources' lookback window only, dropping older history and bulk imports")
+    parser.add_argument("--list-generations", action="store_true", help="list index generations (* = live)")
+    parser.add_argument("--rollback", action="store_true", help="make the previous index generation live again")
+    args = parser.parse_args()
 
+    if args.list_generations:
+        list_generations()
+    elif args.rollback:
+        rollback()
+    elif args.reembed or args.import_paths:
+        # These modify (a copy of) the live store; the server's sync leader must not write meanwhile
+        lock = LeaderLock()
+        if not lock.try_acquire():
+            print(f"Error: another process (a server's sync leader?) holds {lock.path}. Stop it first.")
+            raise SystemExit(1)
+        try:
+            if args.reembed:
+                reembed()
+            else:
+                bulk_import(args.import_paths, args.fresh)
+        finally:
+            lock.release()
+    else:
+        # A rebuild only touches its own new generation, so it runs alongside a live server
+        ingest(args.code_root, args.allow_partial, args.from_scratch)
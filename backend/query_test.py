@@ -1,11 +1,14 @@
 import os
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
 load_dotenv()
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "chroma_db")
+from app.services.embeddings import build_embeddings
+from app.services.snapshots import resolve_db_path
+
+# The live index generation (or the legacy backend/chroma_db)
+DB_PATH = resolve_db_path()
 
 def test_query():
     print("Initializing Vector Store for testing...")
@@ -15,7 +18,7 @@ def test_query():
         return
 
     try:
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/gemini-embedding-001")
+        embeddings = build_embeddings()
         vectorstore = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
         
         query = "billing"
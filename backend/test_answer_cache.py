@@ -0,0 +1,24 @@
+from app.services.answer_cache import AnswerCache, normalize_snippet
+
+
+def test_floor_division_is_not_a_comment():
+    cache = AnswerCache()
+    assert cache._key("a // 100", "ctx", "pay.py") != cache._key("a // 1000", "ctx", "pay.py")
+    assert cache._key("a // 100", "ctx") != cache._key("a // 1000", "ctx")
+
+
+def test_comment_markers_inside_strings_are_kept():
+    assert normalize_snippet('u = "https://a/x"', "a.py") != normalize_snippet('u = "https://b/x"', "a.py")
+    assert normalize_snippet('c = "#fff"', "a.py") != normalize_snippet('c = "#000"', "a.py")
+    assert normalize_snippet('const u = "https://a/x";', "a.ts") != normalize_snippet('const u = "https://b/x";', "a.ts")
+
+
+def test_comments_and_whitespace_are_cosmetic():
+    assert normalize_snippet("def f(x):  # halve\n    return x // 2\n", "a.py") == \
+        normalize_snippet("def f(x):\n  return x//2", "a.py")
+    assert normalize_snippet("if (a) {  // why\n   b();  /* note */ }", "a.js") == \
+        normalize_snippet("if (a) {\n b(); }", "a.js")
+
+
+def test_python_indentation_is_significant():
+    assert normalize_snippet("if x:\n    a\nb", "a.py") != normalize_snippet("if x:\n    a\n    b", "a.py")
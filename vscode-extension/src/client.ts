@@ -0,0 +1,202 @@
+import * as vscode from 'vscode';
+import * as http from 'http';
+import * as crypto from 'crypto';
+
+const HOST = '127.0.0.1';
+const PORT = 8000;
+const CACHE_STATE_KEY = 'contextsync.results';
+const CACHE_MAX_ENTRIES = 100;
+
+// One pool of persistent sockets instead of a TCP handshake per command
+const agent = new http.Agent({ keepAlive: true, maxSockets: 8 });
+
+export class RequestCancelledError extends Error {
+    constructor() {
+        super('Request cancelled');
+    }
+}
+
+export class ServerError extends Error {
+    // Seconds, from Retry-After on a 503 when the server sheds load
+    public readonly retryAfter?: number;
+
+    constructor(public readonly statusCode: number, retryAfterHeader?: string | string[]) {
+        super(`Server returned ${statusCode}`);
+        const seconds = Number(Array.isArray(retryAfterHeader) ? retryAfterHeader[0] : retryAfterHeader);
+        this.retryAfter = Number.isFinite(seconds) && seconds > 0 ? seconds : undefined;
+    }
+}
+
+interface InFlight {
+    promise: Promise<any>;
+    request: http.ClientRequest;
+    waiters: number;
+}
+
+interface CacheEntry {
+    at: number;
+    value: any;
+}
+
+/** Same snippet modulo surrounding and trailing whitespace, like the server's answer cache. */
+export function snippetHash(codeSnippet: string): string {
+    const normalized = codeSnippet.split('\n').map((line) => line.trimEnd()).join('\n').trim();
+    return crypto.createHash('sha256').update(normalized).digest('hex');
+}
+
+export class ContextSyncClient {
+    // Identical requests already on the wire: later callers wait on the first one
+    private _inFlight = new Map<string, InFlight>();
+
+    constructor(private readonly _state: vscode.Memento) { }
+
+    private get _cacheTtlMs(): number {
+        return vscode.workspace.getConfiguration('contextsync').get<number>('cacheTtlMinutes', 30) * 60 * 1000;
+    }
+
+    public cached<T>(key: string): T | undefined {
+        const entry = this._state.get<Record<string, CacheEntry>>(CACHE_STATE_KEY, {})[key];
+        if (entry && Date.now() - entry.at < this._cacheTtlMs) {
+            return entry.value as T;
+        }
+        return undefined;
+    }
+
+    public remember(key: string, value: any) {
+        const entries = { ...this._state.get<Record<string, CacheEntry>>(CACHE_STATE_KEY, {}) };
+        entries[key] = { at: Date.now(), value };
+        // Keep the newest entries only; workspaceState is persisted as a whole
+        const keys = Object.keys(entries).sort((a, b) => entries[b].at - entries[a].at);
+        for (const stale of keys.slice(CACHE_MAX_ENTRIES)) {
+            delete entries[stale];
+        }
+        void this._state.update(CACHE_STATE_KEY, entries);
+    }
+
+    public clearCache() {
+        void this._state.update(CACHE_STATE_KEY, undefined);
+    }
+
+    /**
+     * POSTs JSON and resolves with the parsed response. Results are cached per
+     * workspace under `cacheKey`; callers sharing a key also share the request.
+     * Aborting `signal` rejects with RequestCancelledError, and the request itself
+     * is dropped once no caller is waiting on it anymore.
+     */
+    public postJson<T>(path: string, payload?: object, cacheKey?: string, signal?: AbortSignal): Promise<T> {
+        if (cacheKey) {
+            const hit = this.cached<T>(cacheKey);
+            if (hit !== undefined) {
+                return Promise.resolve(hit);
+            }
+        }
+        const key = cacheKey ?? `${path}:${crypto.createHash('sha256').update(JSON.stringify(payload ?? null)).digest('hex')}`;
+        let entry = this._inFlight.get(key);
+        if (!entry) {
+            entry = this._send(path, payload, key, cacheKey);
+            this._inFlight.set(key, entry);
+        }
+        const shared = entry;
+        shared.waiters++;
+
+        return new Promise<T>((resolve, reject) => {
+            let settled = false;
+            const onAbort = () => {
+                if (settled) {
+                    return;
+                }
+                settled = true;
+                shared.waiters--;
+                if (shared.waiters === 0 && this._inFlight.get(key) === shared) {
+                    this._inFlight.delete(key);
+                    shared.request.destroy();
+                }
+                reject(new RequestCancelledError());
+            };
+            if (signal?.aborted) {
+                onAbort();
+                return;
+            }
+            signal?.addEventListener('abort', onAbort, { once: true });
+            shared.promise.then((value) => {
+                if (!settled) {
+                    settled = true;
+                    signal?.removeEventListener('abort', onAbort);
+                    resolve(value);
+                }
+            }, (error) => {
+                if (!settled) {
+                    settled = true;
+                    signal?.removeEventListener('abort', onAbort);
+                    reject(error);
+                }
+            });
+        });
+    }
+
+    private _send(path: string, payload: object | undefined, key: string, cacheKey?: string): InFlight {
+        const postData = payload === undefined ? '' : JSON.stringify(payload);
+        let request!: http.ClientRequest;
+        const promise = new Promise<any>((resolve, reject) => {
+            request = http.request({
+                hostname: HOST,
+                port: PORT,
+                path,
+                method: 'POST',
+                agent,
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Content-Length': Buffer.byteLength(postData)
+                }
+            }, (res) => {
+                let data = '';
+                res.setEncoding('utf8');
+                res.on('data', (chunk) => { data += chunk; });
+                res.on('end', () => {
+                    if (res.statusCode !== 200) {
+                        reject(new ServerError(res.statusCode ?? 0, res.headers['retry-after']));
+                        return;
+                    }
+                    try {
+                        resolve(JSON.parse(data));
+                    } catch (e) {
+                        reject(e);
+                    }
+                });
+            });
+            request.on('error', reject);
+            request.write(postData);
+            request.end();
+        });
+        promise.then((value) => {
+            if (cacheKey) {
+                this.remember(cacheKey, value);
+            }
+        }, () => undefined).finally(() => {
+            if (this._inFlight.get(key)?.promise === promise) {
+                this._inFlight.delete(key);
+            }
+        });
+        return { promise, request, waiters: 0 };
+    }
+
+    /** Opens a server-sent event stream; the caller parses events and destroys the request to cancel. */
+    public stream(path: string, payload: object, onResponse: (res: http.IncomingMessage) => void): http.ClientRequest {
+        const postData = JSON.stringify(payload);
+        const request = http.request({
+            hostname: HOST,
+            port: PORT,
+            path,
+            method: 'POST',
+            agent,
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+                'Content-Length': Buffer.byteLength(postData)
+            }
+        }, onResponse);
+        request.write(postData);
+        request.end();
+        return request;
+    }
+}
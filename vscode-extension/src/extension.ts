@@ -1,32 +1,73 @@
 import * as vscode from 'vscode';
 import { ContextSidebarProvider } from './sidebar';
+import { ContextSyncClient } from './client';
+
+const PREFETCH_DELAY_MS = 600;
+
+interface CodeTarget {
+    text: string;
+    filePath: string;
+    lineNumbers: string;
+}
+
+function innermostSymbol(symbols: vscode.DocumentSymbol[], position: vscode.Position): vscode.DocumentSymbol | undefined {
+    for (const symbol of symbols) {
+        if (symbol.range.contains(position)) {
+            return innermostSymbol(symbol.children, position) ?? symbol;
+        }
+    }
+    return undefined;
+}
+
+/** The highlighted code, or else the function/class around the cursor. */
+async function codeTarget(editor: vscode.TextEditor): Promise<CodeTarget | undefined> {
+    let range: vscode.Range = editor.selection;
+    if (editor.selection.isEmpty) {
+        const symbols = await vscode.commands.executeCommand<vscode.DocumentSymbol[]>(
+            'vscode.executeDocumentSymbolProvider', editor.document.uri
+        );
+        // Providers may answer with flat SymbolInformation, which has no ranges to nest
+        const symbol = Array.isArray(symbols) && symbols.length && 'children' in symbols[0]
+            ? innermostSymbol(symbols, editor.selection.active)
+            : undefined;
+        if (!symbol) {
+            return undefined;
+        }
+        range = symbol.range;
+    }
+    const text = editor.document.getText(range);
+    if (text.trim().length === 0) {
+        return undefined;
+    }
+    return {
+        text,
+        filePath: editor.document.fileName,
+        lineNumbers: `${range.start.line + 1}-${range.end.line + 1}`
+    };
+}
 
 export function activate(context: vscode.ExtensionContext) {
     console.log('ContextSync extension is activating...');
 
     try {
-        const sidebarProvider = new ContextSidebarProvider(context.extensionUri);
+        const client = new ContextSyncClient(context.workspaceState);
+        const sidebarProvider = new ContextSidebarProvider(context.extensionUri, client);
 
         context.subscriptions.push(
             vscode.window.registerWebviewViewProvider("contextSyncView", sidebarProvider)
         );
 
         context.subscriptions.push(
-            vscode.commands.registerCommand('contextsync.explain', () => {
+            vscode.commands.registerCommand('contextsync.explain', async () => {
                 const editor = vscode.window.activeTextEditor;
                 if (editor) {
-                    const selection = editor.selection;
-                    const text = editor.document.getText(selection);
-                    const filePath = editor.document.fileName;
-                    const lineNumbers = `${selection.start.line + 1}-${selection.end.line + 1}`;
-
-                    if (text.trim().length === 0) {
+                    const target = await codeTarget(editor);
+                    if (!target) {
                         vscode.window.showWarningMessage('Please highlight some code to explain.');
                         return;
                     }
 
-                    sidebarProvider.showLoading();
-                    sidebarProvider.explainCode(text, filePath, lineNumbers);
+                    sidebarProvider.explainCodeStream(target.text, target.filePath, target.lineNumbers);
 
                     // Focus the sidebar
                     vscode.commands.executeCommand('contextSyncView.focus');
@@ -37,21 +78,16 @@ export function activate(context: vscode.ExtensionContext) {
         );
 
         context.subscriptions.push(
-            vscode.commands.registerCommand('contextsync.showContext', () => {
+            vscode.commands.registerCommand('contextsync.showContext', async () => {
                 const editor = vscode.window.activeTextEditor;
                 if (editor) {
-                    const selection = editor.selection;
-                    const text = editor.document.getText(selection);
-                    const filePath = editor.document.fileName;
-                    const lineNumbers = `${selection.start.line + 1}-${selection.end.line + 1}`;
-
-                    if (text.trim().length === 0) {
+                    const target = await codeTarget(editor);
+                    if (!target) {
                         vscode.window.showWarningMessage('Please highlight some code to view context.');
                         return;
                     }
 
-                    sidebarProvider.showLoading();
-                    sidebarProvider.fetchContextObjects(text, filePath, lineNumbers);
+                    sidebarProvider.fetchContextObjects(target.text, target.filePath, target.lineNumbers);
 
                     // Focus the sidebar
                     vscode.commands.executeCommand('contextSyncView.focus');
@@ -61,6 +97,27 @@ export function activate(context: vscode.ExtensionContext) {
             })
         );
 
+        // Prefetch retrieval for the code under the cursor once it settles, so the commands find its embedding cached
+        let prefetchTimer: NodeJS.Timeout | undefined;
+        context.subscriptions.push(
+            vscode.window.onDidChangeTextEditorSelection((event) => {
+                const document = event.textEditor.document;
+                // Skip output panes and code that is mid-edit (it changes again before anyone asks)
+                if (document.uri.scheme !== 'file' || document.isDirty ||
+                    !vscode.workspace.getConfiguration('contextsync').get<boolean>('prefetch', true)) {
+                    return;
+                }
+                clearTimeout(prefetchTimer);
+                prefetchTimer = setTimeout(async () => {
+                    const target = await codeTarget(event.textEditor).catch(() => undefined);
+                    if (target) {
+                        sidebarProvider.prefetchContext(target.text, target.filePath, target.lineNumbers);
+                    }
+                }, PREFETCH_DELAY_MS);
+            }),
+            { dispose: () => clearTimeout(prefetchTimer) }
+        );
+
         console.log('ContextSync extension activated successfully!');
     } catch (error) {
         console.error('ContextSync activation error:', error);
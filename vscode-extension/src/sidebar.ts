@@ -1,12 +1,27 @@
 import * as vscode from 'vscode';
 import * as http from 'http';
+import { ContextSyncClient, RequestCancelledError, ServerError, snippetHash } from './client';
 
 export class ContextSidebarProvider implements vscode.WebviewViewProvider {
     public static readonly viewType = 'contextSyncView';
     private _view?: vscode.WebviewView;
 
+    // Streaming /explain state: tokens are buffered until the webview says it is ready
+    private _streamRequest?: http.ClientRequest;
+    private _streamText = '';
+    private _streamReady = false;
+    private _streamDone = false;
+    private _streamSources?: any[];
+    // Snippet key of the explanation being streamed (also its cache key)
+    private _streamKey?: string;
+    // Non-streaming request the sidebar is waiting on
+    private _pending?: AbortController;
+    // Background prefetch for the latest selection
+    private _prefetch?: AbortController;
+
     constructor(
         private readonly _extensionUri: vscode.Uri,
+        private readonly _client: ContextSyncClient,
     ) { }
 
     public resolveWebviewView(
@@ -27,6 +42,8 @@ export class ContextSidebarProvider implements vscode.WebviewViewProvider {
         webviewView.webview.onDidReceiveMessage(message => {
             if (message.command === 'sync') {
                 this.triggerSync();
+            } else if (message.command === 'ready') {
+                this.flushStream();
             } else if (message.command === 'copy') {
                 vscode.env.clipboard.writeText(message.text);
                 vscode.window.showInformationMessage('Copied to clipboard!');
@@ -59,122 +76,242 @@ export class ContextSidebarProvider implements vscode.WebviewViewProvider {
         }
     }
 
+    private cancelPending() {
+        // A new selection supersedes whatever the sidebar was waiting for
+        this._pending?.abort();
+        this._pending = undefined;
+        this._prefetch?.abort();
+        this._prefetch = undefined;
+        this._streamRequest?.destroy();
+        this._streamRequest = undefined;
+        this._streamKey = undefined;
+        this._streamSources = undefined;
+    }
+
+    private showRequestError(error: any) {
+        if (error instanceof RequestCancelledError) {
+            return;
+        }
+        if (error instanceof ServerError) {
+            this.showServerError(error);
+        } else if (error instanceof SyntaxError) {
+            this.showError("Failed to parse response.");
+        } else {
+            this.showError("Context Engine Disconnected. Is the Python server running?");
+        }
+    }
+
+    private showServerError(error: ServerError) {
+        if (error.statusCode === 503 && error.retryAfter) {
+            this.showError(`Context Engine is busy. Try again in ${error.retryAfter}s.`);
+        } else {
+            this.showError(`Error: Server returned ${error.statusCode}`);
+        }
+    }
+
     public explainCode(codeSnippet: string, filePath: string, lineNumbers: string) {
-        const postData = JSON.stringify({
-            code_snippet: codeSnippet,
-            file_path: filePath,
-            line_numbers: lineNumbers
-        });
+        this.cancelPending();
+        const controller = this._pending = new AbortController();
+        const payload = { code_snippet: codeSnippet, file_path: filePath, line_numbers: lineNumbers };
+        const key = `explain:${snippetHash(codeSnippet)}`;
+        if (this._client.cached(key) === undefined) {
+            this.showLoading();
+        }
+        this._client.postJson<{ markdown: string }>('/explain', payload, key, controller.signal).then(
+            (response) => this.updateContent(response.markdown),
+            (error) => this.showRequestError(error)
+        );
+    }
 
-        const options = {
-            hostname: '127.0.0.1',
-            port: 8000,
-            path: '/explain',
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Content-Length': Buffer.byteLength(postData)
+    public explainCodeStream(codeSnippet: string, filePath: string, lineNumbers: string) {
+        const key = `explain-stream:${snippetHash(codeSnippet)}`;
+        if (key === this._streamKey && this._streamRequest) {
+            // Same block highlighted again while its explanation is still streaming: keep it
+            if (this._streamSources) {
+                this.renderStreamingView();
+            }
+            return;
+        }
+        // Only one explanation renders at a time; drop any request still in progress
+        this.cancelPending();
+
+        const cached = this._client.cached<{ sources: any[], markdown: string }>(key);
+        if (cached) {
+            this.startStreamingView(cached.sources);
+            this._streamText = cached.markdown;
+            this._streamDone = true;
+            return;
+        }
+        this.showLoading();
+
+        const payload = { code_snippet: codeSnippet, file_path: filePath, line_numbers: lineNumbers };
+        const req: http.ClientRequest = this._client.stream('/explain/stream', payload, (res) => {
+            if (res.statusCode !== 200) {
+                res.resume();
+                if (req === this._streamRequest) {
+                    this._streamRequest = undefined;
+                    this.showServerError(new ServerError(res.statusCode ?? 0, res.headers['retry-after']));
+                }
+                return;
             }
-        };
 
-        const req = http.request(options, (res) => {
-            let data = '';
-            res.on('data', (chunk) => { data += chunk; });
+            res.setEncoding('utf8');
+            let buffer = '';
+            res.on('data', (chunk: string) => {
+                if (req !== this._streamRequest) {
+                    return;
+                }
+                buffer += chunk;
+                // SSE events are separated by a blank line
+                let boundary = buffer.indexOf('\n\n');
+                while (boundary !== -1) {
+                    this.handleStreamEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                    boundary = buffer.indexOf('\n\n');
+                }
+            });
             res.on('end', () => {
-                if (res.statusCode === 200) {
-                    try {
-                        const response = JSON.parse(data);
-                        this.updateContent(response.markdown);
-                    } catch (e) {
-                        this.showError("Failed to parse response.");
-                    }
-                } else {
-                    this.showError(`Error: Server returned ${res.statusCode}`);
+                if (req === this._streamRequest) {
+                    this._streamRequest = undefined;
                 }
             });
         });
 
         req.on('error', (e) => {
-            this.showError("Context Engine Disconnected. Is the Python server running?");
+            if (req === this._streamRequest) {
+                this._streamRequest = undefined;
+                this.showError("Context Engine Disconnected. Is the Python server running?");
+            }
         });
 
-        req.write(postData);
-        req.end();
+        this._streamRequest = req;
+        this._streamKey = key;
     }
 
-    public fetchContextObjects(codeSnippet: string, filePath: string, lineNumbers: string) {
-        const postData = JSON.stringify({
-            code_snippet: codeSnippet,
-            file_path: filePath,
-            line_numbers: lineNumbers
-        });
+    private handleStreamEvent(rawEvent: string) {
+        let event = 'message';
+        let data = '';
+        for (const line of rawEvent.split('\n')) {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                data += line.slice(5).trim();
+            }
+        }
 
-        const options = {
-            hostname: '127.0.0.1',
-            port: 8000,
-            path: '/context/retrieve',
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Content-Length': Buffer.byteLength(postData)
+        let payload: any;
+        try {
+            payload = data ? JSON.parse(data) : {};
+        } catch (e) {
+            this.showError("Failed to parse streamed response.");
+            return;
+        }
+
+        if (event === 'sources') {
+            this.startStreamingView(payload);
+        } else if (event === 'token') {
+            this._streamText += payload;
+            if (this._streamReady) {
+                this._view?.webview.postMessage({ type: 'token', text: payload });
             }
-        };
+        } else if (event === 'done') {
+            this._streamDone = true;
+            if (this._streamKey) {
+                this._client.remember(this._streamKey, { sources: this._streamSources, markdown: this._streamText });
+            }
+            if (this._streamReady) {
+                this._view?.webview.postMessage({ type: 'done' });
+            }
+        } else if (event === 'error') {
+            this.showError(payload.message || "Streaming failed.");
+        }
+    }
 
-        const req = http.request(options, (res) => {
-            let data = '';
-            res.on('data', (chunk) => { data += chunk; });
-            res.on('end', () => {
-                if (res.statusCode === 200) {
-                    try {
-                        const contextObjects = JSON.parse(data);
-                        this.renderContextCards(contextObjects);
-                    } catch (e) {
-                        this.showError("Failed to parse context response.");
-                    }
-                } else {
-                    this.showError(`Error: Server returned ${res.statusCode}`);
-                }
-            });
-        });
+    private startStreamingView(sources: any[]) {
+        this._streamText = '';
+        this._streamDone = false;
+        this._streamSources = sources;
+        this.renderStreamingView();
+    }
 
-        req.on('error', (e) => {
-            this.showError("Context Engine Disconnected. Is the Python server running?");
-        });
+    private renderStreamingView() {
+        this._streamReady = false;
+        if (this._view) {
+            const sourcesHtml = (this._streamSources || []).map((src) => {
+                const label = `${src.source.toUpperCase()} · ${this.escapeHtml(src.title_or_user)}`;
+                return src.url
+                    ? `<a href="${src.url}" class="source-chip ${src.source.toLowerCase()}">${label}</a>`
+                    : `<span class="source-chip ${src.source.toLowerCase()}">${label}</span>`;
+            }).join('');
 
-        req.write(postData);
-        req.end();
+            const html = `
+                <div class="explanation-container">
+                    <div class="sources-bar">${sourcesHtml || '<span class="source-chip">No matching context</span>'}</div>
+                    <div id="markdown-content"></div>
+                    <div id="stream-status" class="stream-status">Generating…</div>
+                    <div class="actions">
+                        <button onclick="copyText()" class="action-button">📋 Copy</button>
+                    </div>
+                </div>
+            `;
+            this._view.webview.html = this._getHtmlForWebview(html, false, false, "", true);
+        }
     }
 
-    public triggerSync() {
-        const options = {
-            hostname: '127.0.0.1',
-            port: 8000,
-            path: '/context/sync',
-            method: 'POST'
-        };
+    private flushStream() {
+        // The webview (re)loaded: replay everything received so far, then stream live
+        this._streamReady = true;
+        this._view?.webview.postMessage({ type: 'replace', text: this._streamText });
+        if (this._streamDone) {
+            this._view?.webview.postMessage({ type: 'done' });
+        }
+    }
 
-        const req = http.request(options, (res) => {
-            let data = '';
-            res.on('data', (chunk) => { data += chunk; });
-            res.on('end', () => {
-                if (res.statusCode === 200) {
-                    try {
-                        const result = JSON.parse(data);
-                        vscode.window.showInformationMessage(`Synced ${result.items_synced} items from Slack/Jira`);
-                    } catch (e) {
-                        vscode.window.showWarningMessage("Sync completed but response was invalid.");
-                    }
-                } else {
-                    vscode.window.showErrorMessage(`Sync failed: ${res.statusCode}`);
-                }
-            });
-        });
+    public fetchContextObjects(codeSnippet: string, filePath: string, lineNumbers: string) {
+        this.cancelPending();
+        const controller = this._pending = new AbortController();
+        const payload = { code_snippet: codeSnippet, file_path: filePath, line_numbers: lineNumbers };
+        const key = `retrieve:${snippetHash(codeSnippet)}`;
+        if (this._client.cached(key) === undefined) {
+            this.showLoading();
+        }
+        this._client.postJson<any[]>('/context/retrieve', payload, key, controller.signal).then(
+            (contextObjects) => this.renderContextCards(contextObjects),
+            (error) => this.showRequestError(error)
+        );
+    }
 
-        req.on('error', (e) => {
-            vscode.window.showErrorMessage("Sync failed: Server unreachable");
+    /** Warms the server's query embedding for a block the developer is likely to ask about. */
+    public prefetchContext(codeSnippet: string, filePath: string, lineNumbers: string) {
+        // summarize: false makes this retrieval only, with no LLM calls, so a wasted prefetch costs one embedding at most.
+        // Its cards lack fresh summaries, so they are not cached as the answer to the context command.
+        const payload = { code_snippet: codeSnippet, file_path: filePath, line_numbers: lineNumbers, summarize: false };
+        // Only the latest selection is worth warming
+        this._prefetch?.abort();
+        const controller = this._prefetch = new AbortController();
+        this._client.postJson('/context/retrieve', payload, undefined, controller.signal).catch(() => undefined).finally(() => {
+            if (this._prefetch === controller) {
+                this._prefetch = undefined;
+            }
         });
+    }
 
-        req.end();
+    public triggerSync() {
+        this._client.postJson<{ items_synced: number }>('/context/sync').then((result) => {
+            // Fresh Slack/Jira data can change any cached result
+            if (result.items_synced > 0) {
+                this._client.clearCache();
+            }
+            vscode.window.showInformationMessage(`Synced ${result.items_synced} items from Slack/Jira`);
+        }, (error) => {
+            if (error instanceof ServerError) {
+                vscode.window.showErrorMessage(`Sync failed: ${error.statusCode}`);
+            } else if (error instanceof SyntaxError) {
+                vscode.window.showWarningMessage("Sync completed but response was invalid.");
+            } else {
+                vscode.window.showErrorMessage("Sync failed: Server unreachable");
+            }
+        });
     }
 
     private renderContextCards(contextObjects: any[]) {
@@ -240,7 +377,7 @@ export class ContextSidebarProvider implements vscode.WebviewViewProvider {
         }
     }
 
-    private _getHtmlForWebview(content: string, isMarkdown: boolean = false, isContextCards: boolean = false, rawMarkdown: string = "") {
+    private _getHtmlForWebview(content: string, isMarkdown: boolean = false, isContextCards: boolean = false, rawMarkdown: string = "", isStreaming: boolean = false) {
         const script = `
         <script src="https://cdn.jsdelivr.net/npm/markdown-it@13.0.1/dist/markdown-it.min.js"></script>
         <script>
@@ -253,6 +390,38 @@ export class ContextSidebarProvider implements vscode.WebviewViewProvider {
                 document.getElementById('markdown-content').innerHTML = md.render(rawContent);
             }
 
+            // Streaming Markdown: re-render at most once per frame as tokens arrive
+            if (${isStreaming}) {
+                const md = window.markdownit();
+                const target = document.getElementById('markdown-content');
+                let streamed = '';
+                let scheduled = false;
+                const render = () => {
+                    scheduled = false;
+                    target.innerHTML = md.render(streamed);
+                };
+                const schedule = () => {
+                    if (!scheduled) {
+                        scheduled = true;
+                        requestAnimationFrame(render);
+                    }
+                };
+                window.addEventListener('message', (event) => {
+                    const msg = event.data;
+                    if (msg.type === 'replace') {
+                        streamed = msg.text;
+                        schedule();
+                    } else if (msg.type === 'token') {
+                        streamed += msg.text;
+                        schedule();
+                    } else if (msg.type === 'done') {
+                        document.getElementById('stream-status').style.display = 'none';
+                        render();
+                    }
+                });
+                vscode.postMessage({ command: 'ready' });
+            }
+
             // Sync Action
             function syncNow() {
                 vscode.postMessage({ command: 'sync' });
@@ -368,6 +537,20 @@ export class ContextSidebarProvider implements vscode.WebviewViewProvider {
                     border-radius: 3px;
                 }
 
+                /* Streaming */
+                .sources-bar { display: flex; flex-wrap: wrap; gap: 6px; margin-bottom: 12px; }
+                .source-chip {
+                    font-size: 0.8em;
+                    padding: 2px 8px;
+                    border-radius: 10px;
+                    border: 1px solid var(--vscode-widget-border);
+                    color: var(--vscode-descriptionForeground);
+                    text-decoration: none;
+                }
+                .source-chip.slack { border-color: #E01E5A; }
+                .source-chip.jira { border-color: #0052CC; }
+                .stream-status { opacity: 0.6; font-style: italic; margin-top: 8px; }
+
                 /* Buttons */
                 button {
                     background: var(--vscode-button-background);